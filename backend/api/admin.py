@@ -2,6 +2,7 @@
 
 All routes require the X-Admin-Key header matching ADMIN_API_KEY in settings.
 """
+import asyncio
 import uuid
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Security, Query
@@ -15,8 +16,12 @@ from services.scheduler import (
     build_playlist_job, start_stream_job, send_notifications_job,
     room_cleanup_job, daily_room_creation,
     set_scheduler_enabled, is_scheduler_enabled,
+    ROOM_TYPES, _get_juz_for_night,
 )
-from services.audio.stream_manager import get_stream_url
+from services.audio.stream_manager import get_stream_url, is_virtual_mode
+from services.audio.program_cache import ProgramKey, program_duration
+from services.audio.retention import get_storage_usage, retention_job
+from services.stream_control import room_stream_status, stop_room_stream, list_streamers, encode_queue_status
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 settings = get_settings()
@@ -33,18 +38,18 @@ async def require_admin_key(key: str = Security(_api_key_header)) -> None:
 
 @router.get("/scheduler", dependencies=[Depends(require_admin_key)])
 async def get_scheduler_status():
-    return {"enabled": is_scheduler_enabled()}
+    return {"enabled": await is_scheduler_enabled()}
 
 
 @router.post("/scheduler/enable", dependencies=[Depends(require_admin_key)])
 async def enable_scheduler():
-    set_scheduler_enabled(True)
+    await set_scheduler_enabled(True)
     return {"enabled": True}
 
 
 @router.post("/scheduler/disable", dependencies=[Depends(require_admin_key)])
 async def disable_scheduler():
-    set_scheduler_enabled(False)
+    await set_scheduler_enabled(False)
     return {"enabled": False}
 
 
@@ -130,6 +135,52 @@ async def all_rooms_status(db: AsyncSession = Depends(get_db)):
     ]
 
 
+@router.get("/program-durations", dependencies=[Depends(require_admin_key)])
+async def program_durations(
+    night: int = Query(..., ge=1, le=30, description="Ramadan night"),
+    reciter: str | None = Query(default=None),
+):
+    """Predicted program length per room type for a night (from the duration index)."""
+    reciter = reciter or settings.DEFAULT_RECITER
+    rows = []
+    for room_type in ROOM_TYPES:
+        juz_number, juz_half = _get_juz_for_night(night, room_type["juz_per_night"])
+        key = ProgramKey(reciter, juz_number, juz_half, room_type["rakats"], room_type["juz_per_night"])
+        seconds = await program_duration(key)
+        rows.append({
+            **room_type,
+            "juz_number": juz_number,
+            "juz_half": juz_half,
+            "duration_seconds": round(seconds, 1) if seconds is not None else None,
+            "duration_minutes": round(seconds / 60) if seconds is not None else None,
+        })
+    return {"night": night, "reciter": reciter, "rooms": rows}
+
+
+@router.get("/encode-queue", dependencies=[Depends(require_admin_key)])
+async def encode_queue():
+    """Per streamer node: renders holding the CPU budget, relays holding relay slots, and the jobs queued behind them."""
+    return await encode_queue_status()
+
+
+@router.get("/streamers", dependencies=[Depends(require_admin_key)])
+async def streamers_status():
+    """Streamer nodes with a recent heartbeat: their live rooms and encode load."""
+    return await list_streamers()
+
+
+@router.get("/storage", dependencies=[Depends(require_admin_key)])
+async def storage_usage():
+    """Disk used by room output and the program cache, against the budget and the volume."""
+    return await asyncio.to_thread(get_storage_usage)
+
+
+@router.post("/storage/gc", dependencies=[Depends(require_admin_key)])
+async def run_storage_gc():
+    result = await retention_job()
+    return {**result, "usage": await asyncio.to_thread(get_storage_usage)}
+
+
 @router.post("/trigger/daily-room-creation", dependencies=[Depends(require_admin_key)])
 async def trigger_daily():
     await daily_room_creation()
@@ -164,6 +215,17 @@ async def trigger_start(room_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
     return {"status": slot.status}
 
 
+@router.get("/rooms/{room_id}/stream-status", dependencies=[Depends(require_admin_key)])
+async def stream_status(room_id: uuid.UUID):
+    """FFmpeg relay health: speed, position, restarts and the last log lines."""
+    if is_virtual_mode():
+        raise HTTPException(status_code=400, detail="Rooms are virtual — no FFmpeg relay runs per room")
+    status = await room_stream_status(str(room_id))
+    if status is None:
+        raise HTTPException(status_code=404, detail="No supervised stream for this room")
+    return status
+
+
 @router.post("/rooms/{room_id}/force-start", dependencies=[Depends(require_admin_key)])
 async def force_start_room(room_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
     """Reset → build playlist → start stream in one step. Works from any status."""
@@ -198,8 +260,8 @@ async def force_start_room(room_id: uuid.UUID, db: AsyncSession = Depends(get_db
 
 @router.post("/rooms/{room_id}/send-notifications", dependencies=[Depends(require_admin_key)])
 async def trigger_notify(room_id: uuid.UUID):
-    await send_notifications_job(str(room_id))
-    return {"status": "ok"}
+    recipients = await send_notifications_job(str(room_id))
+    return {"status": "ok", "recipients": recipients}
 
 
 @router.post("/rooms/{room_id}/cleanup", dependencies=[Depends(require_admin_key)])
@@ -279,8 +341,7 @@ async def cleanup_test_rooms(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(RoomSlot).where(RoomSlot.ramadan_night == 0))
     test_rooms = result.scalars().all()
     for room in test_rooms:
-        from services.audio.stream_manager import stop_stream
-        await stop_stream(str(room.id))
+        await stop_room_stream(str(room.id))
         await db.delete(room)
     await db.commit()
     return {"deleted": len(test_rooms)}
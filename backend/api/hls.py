@@ -0,0 +1,242 @@
+"""HLS manifest routes.
+
+Registered ahead of the /hls StaticFiles mount so a room's playlists can be
+generated on the fly in virtual stream mode: stream.m3u8 is the master
+playlist and stream_<rendition>.m3u8 the live sliding-window media playlists
+(with EXT-X-SKIP delta updates, and LL-HLS blocking reload when
+HLS_LOW_LATENCY is set).  In ffmpeg mode the relay's own media playlists
+are served with the same delta updates added.  full.m3u8 / full_<rendition>.m3u8 list everything
+published so far for catch-up, in either mode.  Program segments are
+served as static files.
+
+With HLS_INGEST="memory", FFmpeg relays PUT their output to /hls-ingest and
+the room's playlists and segments are answered from the in-memory ring
+buffer (see segment_store) rather than from disk.
+"""
+import asyncio
+import hmac
+import time
+import uuid
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import get_settings
+from database import get_db
+from models import RoomSlot
+from services.audio.stream_manager import (
+    is_virtual_mode, get_m3u8_path, get_stream_dir, get_program_segment_prefix, STREAM_PLAYLIST_PREFIX,
+    get_ingest_key, notify_ingest,
+)
+from services.audio.segment_store import get_segment_store, is_memory_ingest, RING_SLACK_SEGMENTS
+from services.audio.renditions import RENDITION_NAMES, render_master_playlist
+from services.audio.virtual_stream import render_live_playlist, ll_last_msn, ll_publish_offset, add_delta_updates
+from utils.time_utils import utc_now
+
+settings = get_settings()
+
+router = APIRouter(prefix="/hls", tags=["hls"])
+ingest_router = APIRouter(prefix="/hls-ingest", include_in_schema=False)
+
+HLS_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+TS_MEDIA_TYPE = "video/mp2t"
+
+# A live segment never changes; it is only reachable while it is in the ring
+_SEGMENT_MAX_AGE = (settings.HLS_WINDOW_SEGMENTS + RING_SLACK_SEGMENTS) * 6
+_SEGMENT_CHUNK = 64 * 1024
+
+# Every listener polls the manifest every few seconds — cache the slot's
+# (program, started_at) briefly so that does not turn into a DB query each time.
+_LIVE_CACHE_TTL = 15.0
+_live_cache: dict[uuid.UUID, tuple[float, str, datetime]] = {}
+
+FULL_PLAYLIST_PREFIX = "full"               # full.m3u8 / full_<rendition>.m3u8
+
+# A blocking playlist reload (?_HLS_msn=) may ask for at most this many
+# segments past the last one published; anything further is a 400
+_MAX_BLOCKING_AHEAD = 2
+
+
+async def _get_live_program(room_id: uuid.UUID, db: AsyncSession) -> tuple[str, datetime] | None:
+    cached = _live_cache.get(room_id)
+    if cached and time.monotonic() - cached[0] < _LIVE_CACHE_TTL:
+        return cached[1], cached[2]
+
+    slot = await db.get(RoomSlot, room_id)
+    if not slot or slot.status != "live" or not slot.stream_path or not slot.started_at:
+        _live_cache.pop(room_id, None)
+        return None
+    _live_cache[room_id] = (time.monotonic(), slot.stream_path, slot.started_at)
+    return slot.stream_path, slot.started_at
+
+
+def _playlist_response(body: str) -> Response:
+    return Response(content=body, media_type=HLS_MEDIA_TYPE, headers={"Cache-Control": "no-cache"})
+
+
+def _file_response(path) -> Response:
+    if is_memory_ingest():
+        body = get_segment_store().get(path.parent.name, path.name)
+        if body is None:
+            raise HTTPException(status_code=404, detail="Stream not live")
+        return Response(content=body, media_type=HLS_MEDIA_TYPE, headers={"Cache-Control": "no-cache"})
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Stream not live")
+    return FileResponse(path, media_type=HLS_MEDIA_TYPE, headers={"Cache-Control": "no-cache"})
+
+
+def _relay_playlist(path) -> str:
+    """A media playlist written by the room's FFmpeg relay."""
+    if is_memory_ingest():
+        body = get_segment_store().get(path.parent.name, path.name)
+        if body is None:
+            raise HTTPException(status_code=404, detail="Stream not live")
+        return body.decode()
+    try:
+        return path.read_text()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Stream not live")
+
+
+@router.get("/{room_id}/stream.m3u8")
+async def room_manifest(room_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    if not is_virtual_mode():
+        return _file_response(get_m3u8_path(str(room_id)))
+
+    if not await _get_live_program(room_id, db):
+        raise HTTPException(status_code=404, detail="Stream not live")
+    return _playlist_response(render_master_playlist(STREAM_PLAYLIST_PREFIX))
+
+
+async def _block_until_published(
+    program_path: str, started_at: datetime, rendition: str, msn: int, part: int | None,
+) -> None:
+    """LL-HLS blocking reload: hold the request until segment msn / part exists."""
+    offset = ll_publish_offset(program_path, rendition, msn, part)
+    if offset is None:
+        return  # past the end of the program — the playlist already has ENDLIST
+    now = utc_now()
+    if msn > ll_last_msn(program_path, rendition, (now - started_at).total_seconds()) + _MAX_BLOCKING_AHEAD:
+        raise HTTPException(status_code=400, detail="Requested segment is too far in the future")
+    wait = (started_at + timedelta(seconds=offset) - now).total_seconds()
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+@router.get("/{room_id}/stream_{rendition}.m3u8")
+async def room_rendition_manifest(
+    room_id: uuid.UUID,
+    rendition: str,
+    hls_msn: int | None = Query(None, alias="_HLS_msn", ge=0),
+    hls_part: int | None = Query(None, alias="_HLS_part", ge=0),
+    hls_skip: str | None = Query(None, alias="_HLS_skip"),
+    db: AsyncSession = Depends(get_db),
+):
+    if rendition not in RENDITION_NAMES:
+        raise HTTPException(status_code=404, detail="Unknown rendition")
+    if not is_virtual_mode():
+        playlist = _relay_playlist(get_stream_dir(str(room_id)) / f"{STREAM_PLAYLIST_PREFIX}_{rendition}.m3u8")
+        return _playlist_response(add_delta_updates(playlist, skip=hls_skip == "YES"))
+
+    live = await _get_live_program(room_id, db)
+    if not live:
+        raise HTTPException(status_code=404, detail="Stream not live")
+    program_path, started_at = live
+
+    if settings.HLS_LOW_LATENCY and hls_msn is not None:
+        await db.close()  # don't hold a pooled connection while blocked
+        await _block_until_published(program_path, started_at, rendition, hls_msn, hls_part)
+
+    body = render_live_playlist(
+        program_path, started_at, utc_now(), get_program_segment_prefix(program_path), rendition,
+        skip=hls_skip == "YES",
+    )
+    return _playlist_response(body)
+
+
+# ── Catch-up playlists ────────────────────────────────────────────────────────
+# Every segment published so far (not just the live window), generated from
+# the cached program and started_at in either stream mode.
+
+@router.get("/{room_id}/full.m3u8")
+async def room_full_manifest(room_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    if not await _get_live_program(room_id, db):
+        raise HTTPException(status_code=404, detail="Stream not live")
+    return _playlist_response(render_master_playlist(FULL_PLAYLIST_PREFIX))
+
+
+@router.get("/{room_id}/full_{rendition}.m3u8")
+async def room_full_rendition_manifest(room_id: uuid.UUID, rendition: str, db: AsyncSession = Depends(get_db)):
+    if rendition not in RENDITION_NAMES:
+        raise HTTPException(status_code=404, detail="Unknown rendition")
+    live = await _get_live_program(room_id, db)
+    if not live:
+        raise HTTPException(status_code=404, detail="Stream not live")
+    program_path, started_at = live
+
+    body = render_live_playlist(
+        program_path, started_at, utc_now(), get_program_segment_prefix(program_path), rendition,
+        full=True,
+    )
+    return _playlist_response(body)
+
+
+# ── Relay segments ────────────────────────────────────────────────────────────
+
+def _buffer_response(data: bytes, media_type: str, headers: dict) -> StreamingResponse:
+    """Send a ring-buffer segment as memoryview slices of the stored bytes — no copy."""
+    view = memoryview(data)
+
+    async def chunks():
+        for start in range(0, len(view), _SEGMENT_CHUNK):
+            yield view[start:start + _SEGMENT_CHUNK]
+
+    return StreamingResponse(
+        chunks(), media_type=media_type, headers={**headers, "Content-Length": str(len(view))},
+    )
+
+
+@router.get("/{room_id}/seg_{segment}.ts")
+async def room_segment(room_id: uuid.UUID, segment: str):
+    name = f"seg_{segment}.ts"
+    headers = {"Cache-Control": f"public, max-age={_SEGMENT_MAX_AGE}"}
+    if is_memory_ingest():
+        body = get_segment_store().get(str(room_id), name)
+        if body is None:
+            raise HTTPException(status_code=404, detail="Segment not available")
+        return _buffer_response(body, TS_MEDIA_TYPE, headers)
+    path = get_stream_dir(str(room_id)) / name
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Segment not available")
+    return FileResponse(path, media_type=TS_MEDIA_TYPE, headers=headers)
+
+
+# ── Relay ingest (HLS_INGEST="memory") ────────────────────────────────────────
+# FFmpeg's HLS muxer with -method PUT writes every playlist and segment here;
+# with append_list (resuming a room) it also GETs the current playlists.
+
+def _check_ingest(request: Request, room_id: uuid.UUID, name: str) -> None:
+    if not is_memory_ingest():
+        raise HTTPException(status_code=404, detail="Memory ingest is disabled")
+    if not hmac.compare_digest(request.headers.get("X-Ingest-Key", ""), get_ingest_key()):
+        raise HTTPException(status_code=403, detail="Invalid ingest key")
+    if not name.endswith((".m3u8", ".ts")):
+        raise HTTPException(status_code=400, detail="Unsupported HLS file")
+
+
+@ingest_router.put("/{room_id}/{name}")
+async def ingest_put(room_id: uuid.UUID, name: str, request: Request):
+    _check_ingest(request, room_id, name)
+    get_segment_store().put(str(room_id), name, await request.body())
+    if name.endswith(".m3u8"):
+        notify_ingest(str(room_id))
+    return Response(status_code=204)
+
+
+@ingest_router.get("/{room_id}/{name}")
+async def ingest_get(room_id: uuid.UUID, name: str, request: Request):
+    _check_ingest(request, room_id, name)
+    body = get_segment_store().get(str(room_id), name)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return Response(content=body, media_type=HLS_MEDIA_TYPE)
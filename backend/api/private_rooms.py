@@ -218,8 +218,8 @@ async def delete_private_room(
     if slot.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Only the creator can delete")
 
-    from services.audio.stream_manager import stop_stream
-    await stop_stream(str(room_id))
+    from services.stream_control import stop_room_stream
+    await stop_room_stream(str(room_id))
     await db.delete(slot)
     await db.commit()
     return {"status": "deleted"}
@@ -6,9 +6,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from database import get_db
 from models import User, RoomSlot, UserIshaSchedule, RoomParticipant
-from schemas.room import TonightRoomsResponse, RoomSlotResponse, JoinRoomResponse
+from schemas.room import TonightRoomsResponse, RoomSlotResponse, JoinRoomResponse, RoomTimelineResponse
 from api.deps import get_current_user
 from services.audio.stream_manager import get_stream_url
+from services.audio.cue_sheet import load_cue_sheet
 from utils.time_utils import utc_now
 
 router = APIRouter(prefix="/rooms", tags=["rooms"])
@@ -80,6 +81,28 @@ async def get_room(
     return RoomSlotResponse.model_validate(slot)
 
 
+@router.get("/{room_id}/timeline", response_model=RoomTimelineResponse)
+async def get_room_timeline(
+    room_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+):
+    """Rakah cue sheet — clients derive progress locally from started_at + offsets."""
+    slot = await db.get(RoomSlot, room_id)
+    if not slot:
+        raise HTTPException(status_code=404, detail="Room not found")
+    sheet = load_cue_sheet(slot.stream_path) if slot.playlist_built and slot.stream_path else None
+    if not sheet:
+        raise HTTPException(status_code=404, detail="Timeline not available until the playlist is built")
+    return RoomTimelineResponse(
+        room_id=room_id,
+        status=slot.status,
+        rakats=slot.rakats,
+        started_at=slot.started_at,
+        total_duration=sheet["total_duration"],
+        cues=sheet["cues"],
+    )
+
+
 @router.post("/{room_id}/join", response_model=JoinRoomResponse)
 async def join_room(
     room_id: uuid.UUID,
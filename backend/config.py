@@ -8,6 +8,14 @@ class Settings(BaseSettings):
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    # APScheduler job store: "redis" (persistent, survives restarts) or "memory"
+    SCHEDULER_JOBSTORE: str = "redis"
+
+    # Process role(s), comma-separated — one codebase, scaled per role:
+    # "api" (REST + Socket.IO), "scheduler" (leader-elected room jobs),
+    # "streamer" (FFmpeg renders and relays, fed by a Redis command queue),
+    # or "all".  Roles coordinate only through Redis and the database.
+    ROLE: str = "all"
 
     # JWT
     JWT_SECRET_KEY: str = ""  # REQUIRED — set a long random string in .env
@@ -48,6 +56,49 @@ class Settings(BaseSettings):
     HLS_OUTPUT_DIR: str = "/run/media/saadat/A/Tarteel/hls"
     DEFAULT_RECITER: str = "Alafasy_128kbps"
 
+    # Streaming
+    # "ffmpeg"  — one real-time FFmpeg relay per live room
+    # "virtual" — no per-room process; stream.m3u8 is generated per request
+    #             from the cached program render and RoomSlot.started_at
+    STREAM_MODE: str = "ffmpeg"
+    HLS_WINDOW_SEGMENTS: int = 10   # segments in a virtual live playlist
+    # Where FFmpeg relays publish (ffmpeg mode): "disk" — HLS_OUTPUT_DIR;
+    # "memory" — PUT over loopback into a per-room ring buffer served by the
+    # backend.  The buffer lives in one process, so this needs a single worker
+    # whose ROLE includes both api and streamer (startup fails otherwise), and
+    # HLS_INGEST_URL must reach that process.
+    HLS_INGEST: str = "disk"
+    HLS_INGEST_URL: str = "http://127.0.0.1:8000/hls-ingest"
+    # Low-latency HLS (virtual mode only): programs render as fMP4 in ~1s
+    # parts and playlists carry EXT-X-PART / PRELOAD-HINT / blocking reload
+    HLS_LOW_LATENCY: bool = False
+    # "mp3"  — programs are decoded from the MP3 library and encoded to AAC
+    # "flac" — programs are encoded from the gapless PCM library pre-transcoded
+    #          by scripts/transcode_audio.py (falls back to "mp3" if incomplete)
+    AUDIO_CODEC: str = "mp3"
+
+    # Cores FFmpeg program renders may use together (0 = all cores), and
+    # room relays a node runs at once (0 = 50 per core — a -c copy remux is
+    # cheap); excess work queues, public rooms ahead of private and test rooms
+    ENCODE_CPU_BUDGET: float = 0
+    MAX_RELAYS: int = 0
+
+    # Retention: completed rooms' HLS directories are deleted after
+    # ROOM_RETENTION_MINUTES; when HLS_OUTPUT_DIR exceeds HLS_DISK_BUDGET_GB
+    # (0 = no budget) the least recently used programs not needed by an
+    # upcoming or live room are evicted — moved to PROGRAM_ARCHIVE_DIR if set.
+    ROOM_RETENTION_MINUTES: int = 30
+    HLS_DISK_BUDGET_GB: float = 0
+    PROGRAM_ARCHIVE_DIR: str = ""
+
+    # Rakat split: "count" gives every rakat the same number of ayahs;
+    # "duration" balances recitation time using the duration index (falls
+    # back to "count" if the reciter is not indexed).  Switching re-renders
+    # every program, since the split is part of the program key.
+    RAKAT_SPLIT_MODE: str = "count"
+    # Fraction of one rakat's share a cut may move to end on a surah boundary
+    RAKAT_BALANCE_TOLERANCE: float = 0.15
+
     # Ramadan
     RAMADAN_START_DATE: str = "2026-02-18"
     RAMADAN_TOTAL_NIGHTS: int = 30
@@ -55,6 +106,11 @@ class Settings(BaseSettings):
     # Set to False for local HTTP dev; True in production (HTTPS only)
     COOKIE_SECURE: bool = False
 
+    @property
+    def roles(self) -> set[str]:
+        roles = {r.strip() for r in self.ROLE.split(",") if r.strip()}
+        return {"api", "scheduler", "streamer"} if "all" in roles else roles
+
     class Config:
         env_file = "../.env"
         env_file_encoding = "utf-8"
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
@@ -16,7 +17,15 @@ from api.admin import router as admin_router
 from api.friends import router as friends_router
 from api.private_rooms import router as private_rooms_router
 from api.regions import router as regions_router
-from services.scheduler import start_scheduler
+from api.hls import router as hls_router, ingest_router as hls_ingest_router
+from services.scheduler import (
+    start_scheduler, stop_scheduler, become_scheduler_leader, step_down_scheduler, sync_scheduler_enabled,
+    watch_scheduler_wakeups,
+)
+from services.leader import LeaderElection
+from services.stream_control import run_streamer
+from services.audio.segment_store import is_memory_ingest
+from services.audio.library import watch_library
 from ws.events import sio
 
 logging.basicConfig(level=logging.INFO)
@@ -36,13 +45,37 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     await get_redis()
+    roles = settings.roles
+    if is_memory_ingest() and not {"api", "streamer"} <= roles:
+        raise RuntimeError("HLS_INGEST=memory needs the api and streamer roles in the same process (ROLE=all).")
+    # Every role can enqueue jobs (admin triggers, private rooms); only the
+    # elected scheduler process runs them
     start_scheduler()
-    logger.info("Tarteel backend ready")
+    tasks = []
+    election = None
+    if "scheduler" in roles:
+        # Exactly one process across all workers/containers runs the scheduler
+        election = LeaderElection(
+            "scheduler",
+            on_elected=become_scheduler_leader,
+            on_demoted=step_down_scheduler,
+            on_renewed=sync_scheduler_enabled,
+        )
+        tasks.append(asyncio.create_task(election.run()))
+        tasks.append(asyncio.create_task(watch_scheduler_wakeups()))
+    if "streamer" in roles:
+        tasks.append(asyncio.create_task(run_streamer()))
+        tasks.append(asyncio.create_task(watch_library()))
+    logger.info(f"Tarteel backend ready (roles: {', '.join(sorted(roles))})")
     yield
-    # Shutdown
+    # Shutdown — relays are detached and are adopted by the next streamer
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if election:
+        await election.release()
+    stop_scheduler()
     await close_redis()
-    from services.scheduler import scheduler
-    scheduler.shutdown(wait=False)
     logger.info("Tarteel backend shut down")
 
 
@@ -69,6 +102,8 @@ app.include_router(admin_router)
 app.include_router(friends_router)
 app.include_router(private_rooms_router)
 app.include_router(regions_router)
+app.include_router(hls_router)   # must precede the /hls static mount below
+app.include_router(hls_ingest_router)
 
 # Serve HLS files statically
 hls_dir = Path(settings.HLS_OUTPUT_DIR)
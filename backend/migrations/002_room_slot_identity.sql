@@ -0,0 +1,22 @@
+-- Migration: unique identity for public rooms
+-- daily_room_creation inserts every slot in one
+-- INSERT ... ON CONFLICT DO NOTHING, which needs this index to exist.
+-- (New databases get it from SQLAlchemy Base.metadata.create_all.)
+-- Admin test rooms (ramadan_night = 0) are public but may share a bucket and
+-- room type, so the index leaves them out.
+
+-- ── Check for duplicates first (the index cannot be built while any exist) ──
+-- SELECT isha_bucket_utc, rakats, juz_per_night, reciter, count(*)
+--   FROM room_slots
+--  WHERE NOT is_private AND ramadan_night > 0
+--  GROUP BY 1, 2, 3, 4
+-- HAVING count(*) > 1;
+
+-- ── Unique public room per bucket and room type ──────────────────────────────
+-- CONCURRENTLY: does not block room creation while it builds; run outside a
+-- transaction (psql's default autocommit is fine).  The DROP replaces an
+-- earlier build of this index that still covered test rooms.
+DROP INDEX CONCURRENTLY IF EXISTS uq_room_slots_public_identity;
+CREATE UNIQUE INDEX CONCURRENTLY uq_room_slots_public_identity
+    ON room_slots (isha_bucket_utc, rakats, juz_per_night, reciter)
+    WHERE NOT is_private AND ramadan_night > 0;
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import String, Boolean, Integer, SmallInteger, Float, TIMESTAMP, func, Index, ForeignKey
+from sqlalchemy import String, Boolean, Integer, SmallInteger, Float, TIMESTAMP, func, Index, ForeignKey, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from database import Base
@@ -37,4 +37,14 @@ class RoomSlot(Base):
 
     __table_args__ = (
         Index("idx_room_slots_bucket", "isha_bucket_utc", "status"),
+        # One public room per bucket and room type — lets daily_room_creation
+        # insert every slot in one INSERT ... ON CONFLICT DO NOTHING.  Admin
+        # test rooms (ramadan_night=0) are public too and may repeat, so they
+        # are left out.
+        Index(
+            "uq_room_slots_public_identity",
+            "isha_bucket_utc", "rakats", "juz_per_night", "reciter",
+            unique=True,
+            postgresql_where=text("NOT is_private AND ramadan_night > 0"),
+        ),
     )
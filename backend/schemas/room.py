@@ -39,3 +39,18 @@ class JoinRoomResponse(BaseModel):
     status: str
     participant_count: int
     current_rakah: int | None = None
+
+
+class CueResponse(BaseModel):
+    kind: str            # rakah | ruku | sujood | tashahhud | inter_prayer_break | dua
+    rakah: int
+    offset: float        # seconds from started_at
+
+
+class RoomTimelineResponse(BaseModel):
+    room_id: uuid.UUID
+    status: str
+    rakats: int
+    started_at: datetime | None
+    total_duration: float
+    cues: list[CueResponse]
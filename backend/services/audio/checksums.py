@@ -0,0 +1,116 @@
+"""
+Per-reciter checksum manifest of downloaded ayahs.
+
+AUDIO_DIR/<reciter>/.checksums.json maps each file relative to the reciter
+directory ("001/001.mp3") to [size, sha256].  The downloader records an entry
+when a file is renamed into place and checkpoints the manifest every
+CHECKPOINT_RECORDS entries or CHECKPOINT_INTERVAL seconds, so a killed run
+loses at most a few seconds of entries.  verify_files() re-hashes the library
+in parallel and reports which ayahs are missing or corrupt, so only those need
+to be fetched again.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MANIFEST_FILENAME = ".checksums.json"
+HASH_CHUNK = 1 << 20
+CHECKPOINT_RECORDS  = 50      # save after this many new entries …
+CHECKPOINT_INTERVAL = 5.0     # … or this many seconds, whichever comes first
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ChecksumManifest:
+    def __init__(self, reciter: str):
+        self.root = Path(settings.AUDIO_DIR) / reciter
+        self.path = self.root / MANIFEST_FILENAME
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._pending = 0
+        self._saved_at = time.monotonic()
+        try:
+            raw = json.loads(self.path.read_text())
+            self.entries: dict[str, tuple[int, str]] = {k: (v[0], v[1]) for k, v in raw.items()}
+        except (FileNotFoundError, ValueError, IndexError, TypeError):
+            self.entries = {}
+
+    def _rel(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def get(self, path: Path) -> tuple[int, str] | None:
+        return self.entries.get(self._rel(path))
+
+    def record(self, path: Path, size: int, sha256: str) -> None:
+        with self._lock:
+            self.entries[self._rel(path)] = (size, sha256)
+            self._dirty = True
+            self._pending += 1
+
+    @property
+    def checkpoint_due(self) -> bool:
+        """True when enough entries or time have accumulated since the last save."""
+        if not self._pending:
+            return False
+        return (self._pending >= CHECKPOINT_RECORDS
+                or time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL)
+
+    def forget(self, path: Path) -> None:
+        with self._lock:
+            if self.entries.pop(self._rel(path), None) is not None:
+                self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w") as f:
+                json.dump({k: list(v) for k, v in sorted(self.entries.items())}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._dirty = False
+            self._pending = 0
+            self._saved_at = time.monotonic()
+
+
+def _check(manifest: ChecksumManifest, path: Path) -> str:
+    """'ok', 'missing', 'corrupt' or 'adopted' (no entry yet — hashed and recorded)."""
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return "missing"
+    entry = manifest.get(path)
+    if entry is None:
+        if size == 0:
+            return "corrupt"
+        manifest.record(path, size, file_sha256(path))
+        return "adopted"
+    if entry[0] != size or entry[1] != file_sha256(path):
+        return "corrupt"
+    return "ok"
+
+
+def verify_files(manifest: ChecksumManifest, paths: list[Path], workers: int = 8) -> dict[Path, str]:
+    """Check paths against the manifest in parallel.  Returns path → status."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(lambda p: _check(manifest, p), paths))
+    manifest.save()
+    return dict(zip(paths, statuses))
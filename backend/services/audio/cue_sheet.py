@@ -0,0 +1,88 @@
+"""
+Rakah cue sheet — start offset of every prayer movement in a program.
+
+Written by build_concat_file as cues.json next to concat.txt.  Offsets are
+the running sum of entry durations from the duration index (or the FLAC
+sample count of pre-transcoded entries), so clients can
+derive the current rakah from `now - started_at` without per-transition
+Socket.IO pushes.
+"""
+import json
+import logging
+import math
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from services.audio.duration_index import get_duration_index, probe_mp3
+from services.audio.transcoder import flac_duration
+
+logger = logging.getLogger(__name__)
+
+CUE_SHEET_FILENAME = "cues.json"
+
+# Cue kinds, in the order they occur inside a rakah
+CUE_RAKAH      = "rakah"
+CUE_RUKU       = "ruku"
+CUE_SUJOOD     = "sujood"
+CUE_TASHAHHUD  = "tashahhud"
+CUE_BREAK      = "inter_prayer_break"
+CUE_DUA        = "dua"
+
+
+@dataclass
+class CueMark:
+    """A cue placed before entry `index` of the program's concat list."""
+    kind: str
+    rakah: int
+    index: int
+
+
+@dataclass
+class Cue:
+    kind: str
+    rakah: int
+    offset: float   # seconds from the start of the program
+
+
+def _entry_durations(entries: list[Path], reciter: str) -> list[float]:
+    index = get_duration_index(reciter)
+    durations = []
+    for path in entries:
+        if path.suffix == ".flac":
+            # Pre-transcoded entry — exact sample count
+            durations.append(flac_duration(path))
+            continue
+        d = index.path_duration(path) if index else math.nan
+        if math.isnan(d):
+            # Not indexed yet — parse the file directly (build time, not hot path)
+            d = probe_mp3(path).duration
+        durations.append(d)
+    return durations
+
+
+def build_cue_sheet(entries: list[Path], marks: list[CueMark], reciter: str, rakats: int) -> dict:
+    durations = _entry_durations(entries, reciter)
+    offsets = [0.0]
+    for d in durations:
+        offsets.append(offsets[-1] + d)
+    cues = [Cue(m.kind, m.rakah, round(offsets[m.index], 3)) for m in marks]
+    return {
+        "rakats": rakats,
+        "total_duration": round(offsets[-1], 3),
+        "cues": [asdict(c) for c in cues],
+    }
+
+
+def write_cue_sheet(sheet: dict, output_dir: Path) -> Path:
+    path = output_dir / CUE_SHEET_FILENAME
+    path.write_text(json.dumps(sheet))
+    return path
+
+
+@lru_cache(maxsize=256)
+def load_cue_sheet(program_path: str) -> dict | None:
+    """Cue sheet for a rendered program (cached — program dirs are immutable)."""
+    path = Path(program_path).parent / CUE_SHEET_FILENAME
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
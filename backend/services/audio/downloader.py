@@ -1,82 +1,389 @@
 """
 Download all Quran ayah MP3 files from EveryAyah.com for the configured reciters.
 Run via: python scripts/download_audio.py
+
+All files of a run share one pooled httpx client.  Requests are bounded by a
+semaphore (concurrency) and a per-host token bucket (requests/second), written
+chunk by chunk to `<ayah>.mp3.part`, fsynced and atomically renamed when
+complete, so a file at its final path is never truncated; an interrupted file
+is resumed with an HTTP Range request whose Content-Range must start where the
+.part ends.  Size and sha256 of every finished file go into the reciter's
+checksum manifest (see checksums), saved periodically during the run, which
+verify_reciter() uses to re-fetch only missing or corrupt ayahs.  base_url
+lets the engine run against a local stand-in server.
 """
 import asyncio
+import hashlib
 import logging
+import os
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
+from urllib.parse import urlsplit
 import httpx
 from config import get_settings
 from utils.juz_data import get_juz_ayahs, AyahKey
+from services.audio.library import get_library
+from services.audio.checksums import ChecksumManifest, file_sha256, verify_files
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 EVERYAYAH_BASE = "https://everyayah.com/data"
-RATE_LIMIT_DELAY = 0.5  # seconds between requests
+
+# Engine defaults — overridable per call (scripts/download_audio.py exposes them)
+DEFAULT_CONCURRENCY = 8        # requests in flight
+DEFAULT_RATE = 8.0             # requests per second per host
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0             # seconds; doubled on each retry
+PROGRESS_INTERVAL = 10.0       # seconds between progress reports
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 
 def get_audio_path(reciter: str, ayah: AyahKey) -> Path:
     return Path(settings.AUDIO_DIR) / reciter / f"{ayah.surah:03d}" / f"{ayah.ayah:03d}.mp3"
 
 
-def get_audio_url(reciter: str, ayah: AyahKey) -> str:
-    return f"{EVERYAYAH_BASE}/{reciter}/{ayah.surah:03d}{ayah.ayah:03d}.mp3"
+def get_audio_url(reciter: str, ayah: AyahKey, base_url: str = EVERYAYAH_BASE) -> str:
+    return f"{base_url}/{reciter}/{ayah.surah:03d}{ayah.ayah:03d}.mp3"
+
+
+# ── Rate limiting ─────────────────────────────────────────────────────────────
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursting up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """One TokenBucket per host."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._buckets: dict[str, TokenBucket] = {}
+
+    async def acquire(self, url: str) -> None:
+        host = urlsplit(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate)
+        await self._buckets[host].acquire()
+
+
+# ── Progress ──────────────────────────────────────────────────────────────────
+
+@dataclass
+class DownloadProgress:
+    total: int = 0
+    downloaded: int = 0
+    skipped: int = 0            # already on disk
+    failed: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def finished(self) -> int:
+        return self.downloaded + self.skipped + self.failed
 
+    def summary(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = self.downloaded / elapsed
+        remaining = self.total - self.finished
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+        return (
+            f"{self.finished}/{self.total} files "
+            f"({self.downloaded} new, {self.skipped} cached, {self.failed} failed) — "
+            f"{self.bytes / elapsed / 1e6:.2f} MB/s, {rate:.1f} files/s, ETA {eta}"
+        )
+
+
+async def _report_progress(progress: DownloadProgress, label: str) -> None:
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        logger.info(f"{label}: {progress.summary()}")
+
+
+# ── Single file ───────────────────────────────────────────────────────────────
+
+def _backoff(attempt: int) -> float:
+    return BACKOFF_BASE * 2 ** attempt
+
+
+def _range_start(content_range: str | None) -> int | None:
+    """First byte of a "bytes start-end/total" Content-Range, None if unparsable."""
+    if not content_range or not content_range.startswith("bytes "):
+        return None
+    try:
+        return int(content_range[6:].split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def _range_total(content_range: str | None) -> int | None:
+    """Full length from a "bytes start-end/total" or "bytes */total" Content-Range."""
+    total = (content_range or "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def _commit(part: Path, path: Path) -> None:
+    """fsync the finished .part file and atomically rename it into place."""
+    with open(part, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(part, path)
+
+
+async def _fetch(
+    client: httpx.AsyncClient, url: str, path: Path, part: Path, attempt: int,
+    known_size: int | None = None,
+) -> tuple[bool, int, float | None, str | None]:
+    """
+    One attempt at streaming url into part (resuming from its current size)
+    and renaming it to path.  Returns (ok, bytes_received, retry_delay,
+    sha256); a retry_delay of None means the failure is permanent.
+    known_size is the file's size from the checksum manifest, if recorded.
+    """
+    offset = part.stat().st_size if part.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    received = 0
+    async with client.stream("GET", url, headers=headers, follow_redirects=True) as resp:
+        if resp.status_code == 416 and offset:
+            # Nothing past offset: the previous attempt got the whole body —
+            # if the .part is exactly as long as the file, otherwise it is junk
+            expected = _range_total(resp.headers.get("Content-Range")) or known_size
+            if expected == offset:
+                _commit(part, path)
+                return True, 0, None, file_sha256(path)
+            logger.warning(f"HTTP 416 for {url} with {offset} bytes of {expected or '?'} — restarting")
+            part.unlink(missing_ok=True)
+            return False, 0, _backoff(attempt), None
+        if resp.status_code in RETRY_STATUSES:
+            retry_after = resp.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else _backoff(attempt)
+            logger.warning(f"HTTP {resp.status_code} for {url} — retrying in {delay:.0f}s")
+            return False, 0, delay, None
+        if resp.status_code not in (200, 206):
+            logger.warning(f"HTTP {resp.status_code} for {url}")
+            return False, 0, None, None
 
-async def download_ayah(client: httpx.AsyncClient, reciter: str, ayah: AyahKey) -> bool:
+        # 200 means the server ignored the Range header — start over
+        sha = hashlib.sha256()
+        if resp.status_code == 206:
+            content_range = resp.headers.get("Content-Range")
+            if _range_start(content_range) != offset:
+                # Appending would splice the wrong bytes in — start over
+                logger.warning(f"Content-Range {content_range!r} for {url} does not resume at {offset} — restarting")
+                part.unlink(missing_ok=True)
+                return False, 0, _backoff(attempt), None
+            mode = "ab"
+            if offset:
+                with open(part, "rb") as f:
+                    sha.update(f.read())
+        else:
+            mode = "wb"
+        with open(part, mode) as f:
+            async for chunk in resp.aiter_bytes():
+                f.write(chunk)
+                sha.update(chunk)
+                received += len(chunk)
+
+        expected = resp.headers.get("Content-Length")
+        if expected is not None and "Content-Encoding" not in resp.headers and received != int(expected):
+            # Connection dropped mid-body — keep the .part and resume next attempt
+            logger.warning(f"Short read for {url} ({received}/{expected} bytes)")
+            return False, received, _backoff(attempt), None
+    _commit(part, path)
+    return True, received, None, sha.hexdigest()
+
+
+async def download_ayah(
+    client: httpx.AsyncClient,
+    reciter: str,
+    ayah: AyahKey,
+    limiter: HostRateLimiter | None = None,
+    progress: DownloadProgress | None = None,
+    base_url: str = EVERYAYAH_BASE,
+    manifest: ChecksumManifest | None = None,
+) -> bool:
+    """
+    Download one ayah via a .part file, resuming a partial download with an
+    HTTP Range request and retrying transient failures with backoff.  The
+    finished file's size and sha256 are recorded in manifest.
+    """
+    progress = progress or DownloadProgress()
     path = get_audio_path(reciter, ayah)
     if path.exists():
+        progress.skipped += 1
         return True  # already downloaded
 
     path.parent.mkdir(parents=True, exist_ok=True)
-    url = get_audio_url(reciter, ayah)
+    part = path.with_name(path.name + ".part")
+    url = get_audio_url(reciter, ayah, base_url)
+    known = manifest.get(path) if manifest is not None else None
 
-    try:
-        resp = await client.get(url, follow_redirects=True)
-        if resp.status_code == 200:
-            path.write_bytes(resp.content)
-            logger.info(f"Downloaded {ayah}")
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter is not None:
+            await limiter.acquire(url)
+        try:
+            ok, received, delay, sha = await _fetch(
+                client, url, path, part, attempt, known[0] if known else None,
+            )
+        except (httpx.TransportError, OSError) as e:
+            ok, received, delay, sha = False, 0, _backoff(attempt), None
+            logger.warning(f"Error downloading {url} (attempt {attempt + 1}): {e}")
+        progress.bytes += received
+        if ok:
+            if manifest is not None:
+                manifest.record(path, path.stat().st_size, sha)
+                if manifest.checkpoint_due:
+                    await asyncio.to_thread(manifest.save)
+            get_library().add(path)
+            progress.downloaded += 1
+            logger.debug(f"Downloaded {ayah}")
             return True
+        if delay is None or attempt == MAX_RETRIES:
+            break
+        await asyncio.sleep(delay)
+
+    logger.error(f"Giving up on {url}")
+    progress.failed += 1
+    return False
+
+
+# ── Batches ───────────────────────────────────────────────────────────────────
+
+def _make_client(concurrency: int) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(timeout=30.0, limits=limits)
+
+
+async def download_ayahs(
+    reciter: str,
+    ayahs: list[AyahKey],
+    client: httpx.AsyncClient | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    rate: float = DEFAULT_RATE,
+    base_url: str = EVERYAYAH_BASE,
+) -> DownloadProgress:
+    """
+    Download ayahs for a reciter with at most `concurrency` requests in flight
+    and `rate` requests/second per host.  Uses client if given, otherwise a
+    pooled client of its own.
+    """
+    ayahs = list({(a.surah, a.ayah): a for a in ayahs}.values())
+    progress = DownloadProgress(total=len(ayahs))
+    limiter = HostRateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    manifest = ChecksumManifest(reciter)
+
+    async def worker(c: httpx.AsyncClient, ayah: AyahKey) -> None:
+        async with semaphore:
+            await download_ayah(c, reciter, ayah, limiter, progress, base_url, manifest)
+
+    reporter = asyncio.create_task(_report_progress(progress, reciter))
+    try:
+        if client is not None:
+            await asyncio.gather(*(worker(client, a) for a in ayahs))
         else:
-            logger.warning(f"HTTP {resp.status_code} for {url}")
-            return False
-    except Exception as e:
-        logger.error(f"Error downloading {url}: {e}")
-        return False
-
-
-async def download_reciter_juz(reciter: str, juz_num: int) -> int:
-    """Download all ayahs for a juz. Returns count of successful downloads."""
-    ayahs = get_juz_ayahs(juz_num)
-    success = 0
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for ayah in ayahs:
-            ok = await download_ayah(client, reciter, ayah)
-            if ok:
-                success += 1
-            await asyncio.sleep(RATE_LIMIT_DELAY)
-    return success
-
-
-async def download_fatiha(reciter: str) -> None:
+            async with _make_client(concurrency) as own:
+                await asyncio.gather(*(worker(own, a) for a in ayahs))
+    finally:
+        reporter.cancel()
+        manifest.save()
+    logger.info(f"{reciter}: {progress.summary()}")
+    return progress
+
+
+async def download_reciter_juz(reciter: str, juz_num: int, **kwargs) -> int:
+    """Download all ayahs for a juz. Returns count of files now on disk."""
+    progress = await download_ayahs(reciter, get_juz_ayahs(juz_num), **kwargs)
+    return progress.downloaded + progress.skipped
+
+
+async def download_fatiha(reciter: str, **kwargs) -> None:
     """Download Al-Fatiha (surah 1, ayahs 1-7) — used in every rakat."""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for ayah_num in range(1, 8):
-            ayah = AyahKey(surah=1, ayah=ayah_num)
-            await download_ayah(client, reciter, ayah)
-            await asyncio.sleep(RATE_LIMIT_DELAY)
+    await download_ayahs(reciter, [AyahKey(surah=1, ayah=a) for a in range(1, 8)], **kwargs)
+
+
+def _reciter_ayahs(juz_list: list[int]) -> list[AyahKey]:
+    # Al-Fatiha first — it is used in every rakat
+    ayahs = [AyahKey(surah=1, ayah=a) for a in range(1, 8)]
+    for juz_num in juz_list:
+        ayahs.extend(get_juz_ayahs(juz_num))
+    return ayahs
+
 
+async def verify_reciter(
+    reciter: str,
+    juz_list: list[int] | None = None,
+    workers: int = 8,
+    **kwargs,
+) -> DownloadProgress:
+    """
+    Re-hash a reciter's files against the checksum manifest in parallel,
+    delete corrupt ones and download whatever is missing.  Files without a
+    manifest entry are hashed and adopted as-is.
+    """
+    if juz_list is None:
+        juz_list = list(range(1, 31))
+    ayahs = list({(a.surah, a.ayah): a for a in _reciter_ayahs(juz_list)}.values())
+    paths = [get_audio_path(reciter, a) for a in ayahs]
+
+    manifest = ChecksumManifest(reciter)
+    statuses = await asyncio.to_thread(verify_files, manifest, paths, workers)
+    counts = {s: list(statuses.values()).count(s) for s in ("ok", "adopted", "missing", "corrupt")}
+    logger.info(f"Verified {reciter}: {counts}")
+
+    bad = []
+    for ayah, path in zip(ayahs, paths):
+        status = statuses[path]
+        if status == "corrupt":
+            path.unlink(missing_ok=True)
+            manifest.forget(path)
+            get_library().discard(path)
+        if status in ("corrupt", "missing"):
+            bad.append(ayah)
+    manifest.save()
+    return await download_ayahs(reciter, bad, **kwargs)
 
-async def download_all(reciters: list[str], juz_list: list[int] | None = None) -> None:
-    """Download all ayahs for given reciters and juz list."""
+
+async def download_all(
+    reciters: list[str],
+    juz_list: list[int] | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    rate: float = DEFAULT_RATE,
+    base_url: str = EVERYAYAH_BASE,
+) -> None:
+    """Download all ayahs for given reciters and juz list over one pooled client."""
     if juz_list is None:
         juz_list = list(range(1, 31))
 
-    for reciter in reciters:
-        logger.info(f"Downloading reciter: {reciter}")
-        await download_fatiha(reciter)
-        for juz_num in juz_list:
-            logger.info(f"  Juz {juz_num}...")
-            count = await download_reciter_juz(reciter, juz_num)
-            logger.info(f"  Juz {juz_num}: {count} files")
+    async with _make_client(concurrency) as client:
+        for reciter in reciters:
+            logger.info(f"Downloading reciter: {reciter} ({len(juz_list)} juz)")
+            await download_ayahs(
+                reciter, _reciter_ayahs(juz_list), client=client,
+                concurrency=concurrency, rate=rate, base_url=base_url,
+            )
+
+            # Refresh the duration index so only newly downloaded files are parsed
+            from services.audio.duration_index import build_duration_index
+            await asyncio.to_thread(build_duration_index, reciter)
+
+    # Persist the library manifest so the next startup only re-lists changed dirs
+    await asyncio.to_thread(get_library().refresh)
@@ -0,0 +1,312 @@
+"""
+Per-reciter index of exact ayah and clip durations.
+
+The index is built once per reciter by parsing the MP3 frame headers (no
+ffprobe) and stored next to the audio as AUDIO_DIR/<reciter>/.durations.idx.
+It covers all 6,236 ayahs in mushaf order followed by every clip under
+AUDIO_DIR/misc and AUDIO_DIR/silence.
+
+File layout (little-endian, column-oriented so each column can be used as a
+zero-copy array straight out of the mmap):
+
+    header    magic "TDUR", version, n_ayahs, n_clips, names_len  (24 bytes)
+    float64   duration    seconds of decoded audio after gapless trimming (NaN = missing)
+    int64     size        file size in bytes, -1 when missing
+    int64     mtime_ns    file mtime, used for incremental rebuilds
+    uint32    delay       encoder delay in samples (LAME tag)
+    uint32    padding     encoder padding in samples (LAME tag)
+    uint32    sample_rate
+    bytes     clip names  "misc/Salam\\nsilence/Silence_10\\n…" (UTF-8)
+
+Rebuilding only re-parses files whose size or mtime changed.
+"""
+import logging
+import math
+import mmap
+import os
+import struct
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from config import get_settings
+from services.audio.downloader import get_audio_path
+from utils.juz_data import AyahKey, TOTAL_AYAHS, all_ayahs, ayah_index
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+INDEX_FILENAME = ".durations.idx"
+INDEX_MAGIC = b"TDUR"
+INDEX_VERSION = 1
+_HEADER = struct.Struct("<4sHHIII4x")
+CLIP_DIRS = ("misc", "silence")
+
+# ── MP3 frame header tables (Layer III only — everything we serve) ───────────
+_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+@dataclass
+class Mp3Info:
+    duration: float
+    delay: int
+    padding: int
+    sample_rate: int
+
+
+def _parse_frame_header(data: bytes, pos: int) -> tuple[int, int, int, int] | None:
+    """Return (frame_length, samples_per_frame, sample_rate, side_info_len) or None."""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = (b1 >> 3) & 0x03          # 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5
+    layer = (b1 >> 1) & 0x03            # 1 = Layer III
+    br_idx = b2 >> 4
+    sr_idx = (b2 >> 2) & 0x03
+    if version == 1 or layer != 1 or br_idx in (0, 15) or sr_idx == 3:
+        return None
+    sample_rate = _SAMPLE_RATES[version][sr_idx]
+    pad = (b2 >> 1) & 0x01
+    mono = (b3 >> 6) == 3
+    if version == 3:
+        bitrate = _BITRATES_V1[br_idx] * 1000
+        return 144 * bitrate // sample_rate + pad, 1152, sample_rate, 17 if mono else 32
+    bitrate = _BITRATES_V2[br_idx] * 1000
+    return 72 * bitrate // sample_rate + pad, 576, sample_rate, 9 if mono else 17
+
+
+def _parse_xing(data: bytes, pos: int, side_info_len: int) -> tuple[int, int] | None:
+    """Return (encoder_delay, encoder_padding) from a Xing/Info + LAME tag, else None."""
+    tag = pos + 4 + side_info_len
+    if data[tag:tag + 4] not in (b"Xing", b"Info"):
+        return None
+    flags = struct.unpack_from(">I", data, tag + 4)[0]
+    lame = tag + 8
+    lame += 4 if flags & 0x1 else 0     # frame count
+    lame += 4 if flags & 0x2 else 0     # byte count
+    lame += 100 if flags & 0x4 else 0   # seek TOC
+    lame += 4 if flags & 0x8 else 0     # quality
+    if lame + 24 > len(data) or data[lame:lame + 4] not in (b"LAME", b"Lavc", b"Lavf"):
+        return 0, 0
+    b0, b1, b2 = data[lame + 21], data[lame + 22], data[lame + 23]
+    return (b0 << 4) | (b1 >> 4), ((b1 & 0x0F) << 8) | b2
+
+
+def probe_mp3(path: Path) -> Mp3Info:
+    """
+    Exact decoded duration of an MP3 by walking its frame headers.
+    Encoder delay/padding from the LAME tag are trimmed, matching what
+    FFmpeg's gapless MP3 decoder outputs.
+    """
+    data = path.read_bytes()
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    frames = 0
+    samples_per_frame = sample_rate = 0
+    delay = padding = 0
+    first = True
+    end = len(data)
+    while pos < end:
+        header = _parse_frame_header(data, pos)
+        if header is None:
+            if data[pos:pos + 3] == b"TAG":   # ID3v1 trailer
+                break
+            pos += 1                          # resync on garbage
+            continue
+        length, samples_per_frame, sample_rate, side_info_len = header
+        if first:
+            first = False
+            gapless = _parse_xing(data, pos, side_info_len)
+            if gapless is not None:
+                delay, padding = gapless
+                pos += length                 # the Xing frame carries no audio
+                continue
+        if pos + length > end:                # truncated final frame
+            break
+        frames += 1
+        pos += length
+
+    if not frames:
+        raise ValueError(f"No MPEG audio frames in {path}")
+    samples = max(0, frames * samples_per_frame - delay - padding)
+    return Mp3Info(samples / sample_rate, delay, padding, sample_rate)
+
+
+# ── Index ─────────────────────────────────────────────────────────────────────
+
+def get_index_path(reciter: str) -> Path:
+    return Path(settings.AUDIO_DIR) / reciter / INDEX_FILENAME
+
+
+def _clip_names() -> list[str]:
+    names = []
+    for kind in CLIP_DIRS:
+        clip_dir = Path(settings.AUDIO_DIR) / kind
+        if clip_dir.is_dir():
+            names.extend(f"{kind}/{p.stem}" for p in sorted(clip_dir.glob("*.mp3")))
+    return names
+
+
+def _clip_path(name: str) -> Path:
+    return Path(settings.AUDIO_DIR) / f"{name}.mp3"
+
+
+class DurationIndex:
+    """Read-only, mmap-backed view of a reciter's duration index."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n_ayahs, n_clips, names_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported duration index {path}")
+        self.n_ayahs = n_ayahs
+        self.n_clips = n_clips
+        n = n_ayahs + n_clips
+
+        view = memoryview(self._mm)
+        off = _HEADER.size
+        self.durations = view[off:off + 8 * n].cast("d"); off += 8 * n
+        self.sizes     = view[off:off + 8 * n].cast("q"); off += 8 * n
+        self.mtimes    = view[off:off + 8 * n].cast("q"); off += 8 * n
+        self.delays    = view[off:off + 4 * n].cast("I"); off += 4 * n
+        self.paddings  = view[off:off + 4 * n].cast("I"); off += 4 * n
+        self.rates     = view[off:off + 4 * n].cast("I"); off += 4 * n
+        names = bytes(view[off:off + names_len]).decode()
+        self.clip_names = names.split("\n") if names else []
+        self._clip_slots = {name: n_ayahs + i for i, name in enumerate(self.clip_names)}
+
+    def close(self) -> None:
+        for attr in ("durations", "sizes", "mtimes", "delays", "paddings", "rates"):
+            view = getattr(self, attr, None)
+            if view is not None:
+                view.release()
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+    def ayah_duration(self, ayah: AyahKey) -> float:
+        """Seconds; NaN if the ayah file was missing when the index was built."""
+        return self.durations[ayah_index(ayah)]
+
+    def ayah_durations(self, ayahs: list[AyahKey]) -> array:
+        return array("d", (self.durations[ayah_index(a)] for a in ayahs))
+
+    def clip_duration(self, name: str) -> float:
+        """Duration of a clip such as "silence/Silence_15"; NaN if unknown."""
+        slot = self._clip_slots.get(name)
+        return self.durations[slot] if slot is not None else math.nan
+
+    def path_duration(self, path: Path) -> float:
+        """Duration of an ayah (<reciter>/SSS/AAA.mp3) or clip (misc|silence/<name>.mp3) path."""
+        if path.parent.name in CLIP_DIRS:
+            return self.clip_duration(f"{path.parent.name}/{path.stem}")
+        try:
+            return self.ayah_duration(AyahKey(surah=int(path.parent.name), ayah=int(path.stem)))
+        except (ValueError, IndexError):
+            return math.nan
+
+
+def build_duration_index(reciter: str, force: bool = False) -> Path:
+    """
+    Build or incrementally refresh a reciter's duration index.
+    Blocking — parses every changed MP3.  Returns the index path.
+    """
+    index_path = get_index_path(reciter)
+    previous: DurationIndex | None = None
+    if index_path.exists() and not force:
+        try:
+            previous = DurationIndex(index_path)
+        except ValueError:
+            previous = None
+
+    clip_names = _clip_names()
+    paths = [get_audio_path(reciter, a) for a in all_ayahs()]
+    paths += [_clip_path(name) for name in clip_names]
+    previous_slots: dict[str, int] = {}
+    if previous:
+        previous_slots = {str(p): i for i, p in enumerate(paths[:TOTAL_AYAHS])}
+        previous_slots.update({str(_clip_path(nm)): s for nm, s in previous._clip_slots.items()})
+
+    n = len(paths)
+    durations = array("d", [math.nan]) * n
+    sizes     = array("q", [-1]) * n
+    mtimes    = array("q", [0]) * n
+    delays    = array("I", [0]) * n
+    paddings  = array("I", [0]) * n
+    rates     = array("I", [0]) * n
+
+    probed = 0
+    for i, path in enumerate(paths):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        sizes[i], mtimes[i] = st.st_size, st.st_mtime_ns
+
+        slot = previous_slots.get(str(path))
+        if slot is not None and previous.sizes[slot] == st.st_size and previous.mtimes[slot] == st.st_mtime_ns:
+            durations[i] = previous.durations[slot]
+            delays[i], paddings[i], rates[i] = previous.delays[slot], previous.paddings[slot], previous.rates[slot]
+            continue
+        try:
+            info = probe_mp3(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read duration of {path}: {e}")
+            continue
+        durations[i] = info.duration
+        delays[i], paddings[i], rates[i] = info.delay, info.padding, info.sample_rate
+        probed += 1
+
+    if previous:
+        previous.close()
+
+    names_blob = "\n".join(clip_names).encode()
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, TOTAL_AYAHS, len(clip_names), len(names_blob)))
+        for column in (durations, sizes, mtimes, delays, paddings, rates):
+            column.tofile(f)
+        f.write(names_blob)
+    os.replace(tmp_path, index_path)
+    _unload(reciter)
+    logger.info(f"Duration index for {reciter}: {n} entries, {probed} re-probed → {index_path}")
+    return index_path
+
+
+# reciter → (index file mtime, loaded index)
+_loaded: dict[str, tuple[int, DurationIndex]] = {}
+
+
+def _unload(reciter: str) -> None:
+    cached = _loaded.pop(reciter, None)
+    if cached:
+        cached[1].close()
+
+
+def get_duration_index(reciter: str) -> DurationIndex | None:
+    """
+    Return the mmap'd index for a reciter, or None if it has not been built.
+    The index is closed once its file is rebuilt, so use it right away
+    rather than keeping it.
+    """
+    path = get_index_path(reciter)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        _unload(reciter)
+        return None
+    cached = _loaded.get(reciter)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    _unload(reciter)
+    index = DurationIndex(path)
+    _loaded[reciter] = (mtime, index)
+    return index
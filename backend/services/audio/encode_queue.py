@@ -0,0 +1,186 @@
+"""
+Node-wide admission control for FFmpeg work.
+
+Program renders (a decode plus one AAC encode per rendition) draw from a
+CPU budget, ENCODE_CPU_BUDGET cores (0 = every core on the machine).  Room
+relays (real-time remux, -c copy) cost a small fraction of a core each but
+hold their place for the whole program, so they have their own queue,
+limited to MAX_RELAYS running relays (0 = RELAYS_PER_CORE per core) — a
+node full of live rooms never blocks renders, and renders never block a
+room from going live.  Work that does not fit waits in a priority queue,
+so a burst of private-room starts queues behind the public rooms of the
+current Isha bucket instead of pushing every stream below real time.
+
+Jobs are admitted strictly in (priority, arrival) order: a waiting public
+render blocks later private ones even if they would fit, so big jobs are
+not starved by a stream of small ones.  A relay holds its slot for as long
+as it runs (see stream_manager).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Priorities — lower runs first
+PRIORITY_PUBLIC  = 0
+PRIORITY_PRIVATE = 1
+PRIORITY_TEST    = 2
+PRIORITY_NAMES = {PRIORITY_PUBLIC: "public", PRIORITY_PRIVATE: "private", PRIORITY_TEST: "test"}
+
+# Approximate cores used per render (one decode + the AAC ladder, faster
+# than real time); a relay takes one slot of the relay queue
+RENDER_COST = 2.0
+RELAY_COST  = 1.0
+RELAYS_PER_CORE = 50
+
+
+def priority_for_slot(slot) -> int:
+    """Queue priority of a RoomSlot: public rooms first, admin test rooms last."""
+    if slot.ramadan_night == 0:
+        return PRIORITY_TEST
+    return PRIORITY_PRIVATE if slot.is_private else PRIORITY_PUBLIC
+
+
+@dataclass
+class Lease:
+    """Capacity held by one admitted job; release() exactly once."""
+    queue: "EncodeQueue"
+    label: str
+    cost: float
+    priority: int
+    admitted_at: float = field(default_factory=time.time)
+    released: bool = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.queue._release(self)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    cost: float = field(compare=False)
+    label: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    queued_at: float = field(default_factory=time.time, compare=False)
+
+
+class EncodeQueue:
+    def __init__(self, budget: float, unit: str = "cores"):
+        self.budget = budget
+        self.unit = unit
+        self.in_use = 0.0
+        self._running: list[Lease] = []
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+
+    def _fits(self, cost: float) -> bool:
+        # An idle node always admits one job, however large
+        return not self._running or self.in_use + cost <= self.budget
+
+    async def acquire(self, cost: float, priority: int, label: str) -> Lease:
+        """Wait for capacity; jobs are admitted in (priority, arrival) order."""
+        if not self._waiters and self._fits(cost):
+            return self._admit(cost, priority, label)
+        waiter = _Waiter(priority, next(self._seq), cost, label, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, waiter)
+        logger.info(
+            f"Queued {label} ({PRIORITY_NAMES.get(priority, priority)}), "
+            f"{len(self._waiters)} waiting, {self.in_use:.2f}/{self.budget:.2f} {self.unit} in use"
+        )
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                waiter.future.result().release()   # admitted just as we were cancelled
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._wake()
+            raise
+
+    def claim(self, cost: float, priority: int, label: str) -> Lease:
+        """Take capacity immediately, even over budget (adopting a running relay)."""
+        return self._admit(cost, priority, label)
+
+    @asynccontextmanager
+    async def slot(self, cost: float, priority: int, label: str):
+        lease = await self.acquire(cost, priority, label)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def _admit(self, cost: float, priority: int, label: str) -> Lease:
+        lease = Lease(self, label, cost, priority)
+        self.in_use += cost
+        self._running.append(lease)
+        return lease
+
+    def _release(self, lease: Lease) -> None:
+        self._running.remove(lease)
+        self.in_use = max(self.in_use - lease.cost, 0.0)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._fits(self._waiters[0].cost):
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue
+            waiter.future.set_result(self._admit(waiter.cost, waiter.priority, waiter.label))
+            logger.info(f"Admitted {waiter.label} after {time.time() - waiter.queued_at:.0f}s in queue")
+
+    def status(self) -> dict:
+        now = time.time()
+        return {
+            "unit": self.unit,
+            "budget": self.budget,
+            "in_use": round(self.in_use, 2),
+            "queue_depth": len(self._waiters),
+            "running": [
+                {"job": l.label, "priority": PRIORITY_NAMES.get(l.priority, l.priority),
+                 "cost": l.cost, "seconds": round(now - l.admitted_at)}
+                for l in self._running
+            ],
+            "queued": [
+                {"job": w.label, "priority": PRIORITY_NAMES.get(w.priority, w.priority),
+                 "cost": w.cost, "waiting_seconds": round(now - w.queued_at)}
+                for w in sorted(self._waiters)
+            ],
+        }
+
+
+_queue: EncodeQueue | None = None
+_relay_queue: EncodeQueue | None = None
+
+
+def get_encode_queue() -> EncodeQueue:
+    """Renders, against the CPU budget."""
+    global _queue
+    if _queue is None:
+        _queue = EncodeQueue(settings.ENCODE_CPU_BUDGET or float(os.cpu_count() or 2))
+    return _queue
+
+
+def get_relay_queue() -> EncodeQueue:
+    """Room relays, against MAX_RELAYS."""
+    global _relay_queue
+    if _relay_queue is None:
+        limit = settings.MAX_RELAYS or RELAYS_PER_CORE * (os.cpu_count() or 2)
+        _relay_queue = EncodeQueue(float(limit), unit="relays")
+    return _relay_queue
+
+
+def encode_status() -> dict:
+    """Both queues of this node, for the admin dashboard and heartbeats."""
+    return {"renders": get_encode_queue().status(), "relays": get_relay_queue().status()}
@@ -0,0 +1,174 @@
+"""
+In-memory manifest of the audio library under AUDIO_DIR.
+
+Playlist builds ask "does this ayah / clip exist?" thousands of times per
+program.  On a network-mounted AUDIO_DIR every Path.exists() is a metadata
+round-trip, so the library is listed once and answered from memory.
+
+The listing is persisted to AUDIO_DIR/.library.json as
+{relative_dir: [mtime_ns, [subdirs], [files]]}.  On load only directory
+mtimes are checked — a few hundred stat() calls instead of one per file — and
+just the directories that changed are re-listed.  While the backend runs the
+manifest is kept current by the downloader (add()) and, when the optional
+watchfiles package is installed, by inotify.  Neither sees files written by
+other processes on a network mount, so a miss is confirmed on the filesystem
+(and added) before it is believed.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MANIFEST_FILENAME = ".library.json"
+
+
+class AudioLibrary:
+    def __init__(self, root: Path):
+        self.root = root
+        self._dirs: dict[str, tuple[int, list[str], list[str]]] = {}
+        self._files: set[str] = set()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+
+    def _rel(self, path: Path) -> str | None:
+        try:
+            return Path(path).relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def exists(self, path: Path) -> bool:
+        self.ensure_loaded()
+        rel = self._rel(path)
+        if rel is None:                # outside the library — ask the filesystem
+            return Path(path).exists()
+        if rel in self._files:
+            return True
+        # Possibly written by another process since the listing — check
+        if Path(path).exists():
+            self._files.add(rel)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    # ── Updates ──────────────────────────────────────────────────────────────
+
+    def add(self, path: Path) -> None:
+        rel = self._rel(path)
+        if rel is not None:
+            self._files.add(rel)
+
+    def discard(self, path: Path) -> None:
+        rel = self._rel(path)
+        if rel is not None:
+            self._files.discard(rel)
+
+    # ── Loading ──────────────────────────────────────────────────────────────
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.refresh()
+
+    def refresh(self) -> None:
+        """Load the persisted manifest and re-list only directories whose mtime changed."""
+        previous = self._read_manifest()
+        dirs: dict[str, tuple[int, list[str], list[str]]] = {}
+        relisted = 0
+
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = self.root / rel_dir if rel_dir else self.root
+            try:
+                mtime = os.stat(abs_dir).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            cached = previous.get(rel_dir)
+            if cached and cached[0] == mtime:
+                subdirs, files = cached[1], cached[2]
+            else:
+                subdirs, files = [], []
+                with os.scandir(abs_dir) as it:
+                    for entry in it:
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_dir():
+                            subdirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+                relisted += 1
+            dirs[rel_dir] = (mtime, subdirs, files)
+            stack.extend(f"{rel_dir}/{d}" if rel_dir else d for d in subdirs)
+
+        self._dirs = dirs
+        self._files = {
+            f"{rel_dir}/{name}" if rel_dir else name
+            for rel_dir, (_, _, files) in dirs.items()
+            for name in files
+        }
+        self._loaded = True
+        self._write_manifest()
+        logger.info(f"Audio library: {len(self._files)} files in {len(dirs)} dirs ({relisted} re-listed)")
+
+    def _manifest_path(self) -> Path:
+        return self.root / MANIFEST_FILENAME
+
+    def _read_manifest(self) -> dict[str, tuple[int, list[str], list[str]]]:
+        try:
+            raw = json.loads(self._manifest_path().read_text())
+            return {k: (v[0], v[1], v[2]) for k, v in raw.items()}
+        except (FileNotFoundError, ValueError, IndexError, TypeError):
+            return {}
+
+    def _write_manifest(self) -> None:
+        path = self._manifest_path()
+        tmp = path.with_name(path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps({k: list(v) for k, v in self._dirs.items()}))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not persist audio library manifest: {e}")
+
+
+_library: AudioLibrary | None = None
+
+
+def get_library() -> AudioLibrary:
+    global _library
+    if _library is None:
+        _library = AudioLibrary(Path(settings.AUDIO_DIR))
+    return _library
+
+
+async def watch_library() -> None:
+    """Keep the library current from inotify events (requires watchfiles)."""
+    try:
+        from watchfiles import awatch, Change
+    except ImportError:
+        logger.info("watchfiles not installed — audio library refreshes on download only")
+        return
+
+    library = get_library()
+    await asyncio.to_thread(library.ensure_loaded)
+    root = library.root
+    if not root.is_dir():
+        return
+    async for changes in awatch(root, recursive=True):
+        for change, path in changes:
+            if Path(path).name.startswith("."):
+                continue
+            if change == Change.deleted:
+                library.discard(Path(path))
+            elif Path(path).is_file():
+                library.add(Path(path))
@@ -42,10 +42,18 @@ Prayer structure (repeating 2-rakat units = 1 complete prayer):
     Silence 15s [now 10s] + Dua     (closing du'a)
 """
 import logging
+import math
 from pathlib import Path
 from config import get_settings
 from utils.juz_data import get_juz_ayahs, get_juz_quarter, distribute_ayahs_to_rakats, AyahKey
 from services.audio.downloader import get_audio_path
+from services.audio.duration_index import get_duration_index
+from services.audio.library import get_library
+from services.audio.transcoder import pcm_entries
+from services.audio.cue_sheet import (
+    CueMark, build_cue_sheet, write_cue_sheet,
+    CUE_RAKAH, CUE_RUKU, CUE_SUJOOD, CUE_TASHAHHUD, CUE_BREAK, CUE_DUA,
+)
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -56,20 +64,25 @@ MISC_DIR    = Path(settings.AUDIO_DIR) / "misc"
 
 def _silence(name: str) -> Path | None:
     p = SILENCE_DIR / f"{name}.mp3"
-    return p if p.exists() else None
+    return p if get_library().exists(p) else None
 
 
 def _misc(name: str) -> Path | None:
     p = MISC_DIR / f"{name}.mp3"
-    return p if p.exists() else None
+    return p if get_library().exists(p) else None
 
 
-def _add(segments: list[Path], p: Path | None) -> None:
-    """Append path to segments only if the file exists."""
+def _add(segments: list[Path], p: Path | None, missing: list[Path] | None = None) -> None:
+    """
+    Append path to segments only if the file exists (per the audio library).
+    A missing file is skipped with a warning, or recorded in missing if given.
+    """
     if p is None:
         return
-    if p.exists():
+    if get_library().exists(p):
         segments.append(p)
+    elif missing is not None:
+        missing.append(p)
     else:
         logger.warning(f"Audio file missing, skipping: {p}")
 
@@ -82,19 +95,31 @@ def _write_concat(entries: list[Path], output_path: Path) -> None:
             f.write(f"file '{p.absolute()}'\n")
 
 
+def _mark(marks: list[CueMark] | None, kind: str, rakat_index: int, segments: list[Path]) -> None:
+    """Record that a cue starts at the next segment appended to segments."""
+    if marks is not None:
+        marks.append(CueMark(kind=kind, rakah=rakat_index + 1, index=len(segments)))
+
+
 def build_rakat_segments(
     rakat_index: int,
     ayahs: list[AyahKey],
     reciter: str,
+    marks: list[CueMark] | None = None,
+    missing: list[Path] | None = None,
 ) -> list[Path]:
     """
     Build the ordered list of audio files for one rakat.
     rakat_index is 0-based.
     Even index (0, 2, 4 …) = first rakat of a 2-rakat prayer (has opening takbeer).
     Odd index  (1, 3, 5 …) = second rakat of a 2-rakat prayer (ends with tasleem).
+    If marks is given, cue positions are appended to it (indices relative to
+    the returned list).  If missing is given, absent ayah files are appended
+    to it instead of being skipped with a warning.
     """
     segments: list[Path] = []
     is_first_of_prayer = (rakat_index % 2 == 0)
+    _mark(marks, CUE_RAKAH, rakat_index, segments)
 
     # ── Opening (first rakat of each prayer only) ─────────────────────────
     if is_first_of_prayer:
@@ -103,13 +128,14 @@ def build_rakat_segments(
 
     # ── Al-Fatiha ─────────────────────────────────────────────────────────
     for a in range(1, 8):
-        _add(segments, get_audio_path(reciter, AyahKey(surah=1, ayah=a)))
+        _add(segments, get_audio_path(reciter, AyahKey(surah=1, ayah=a)), missing)
 
     # ── Juz portion ───────────────────────────────────────────────────────
     for ayah in ayahs:
-        _add(segments, get_audio_path(reciter, ayah))
+        _add(segments, get_audio_path(reciter, ayah), missing)
 
     # ── Ruku ──────────────────────────────────────────────────────────────
+    _mark(marks, CUE_RUKU, rakat_index, segments)
     _add(segments, _misc("Allahu_akbar_short"))   # → bow (~5s)
     _add(segments, _silence("Silence_15"))         # ruku dhikr (~10s)
 
@@ -117,6 +143,7 @@ def build_rakat_segments(
     _add(segments, _misc("Sami_Allahu_liman_hamida"))   # trimmed to ~5s
 
     # ── Sujood 1 ──────────────────────────────────────────────────────────
+    _mark(marks, CUE_SUJOOD, rakat_index, segments)
     _add(segments, _misc("Allahu_akbar_short"))   # → prostrate (~5s)
     _add(segments, _silence("Silence_15"))         # sujood 1 dhikr (~10s)
 
@@ -125,6 +152,7 @@ def build_rakat_segments(
     _add(segments, _silence("Silence_10"))         # jilsah pause (~5s)
 
     # ── Sujood 2 ──────────────────────────────────────────────────────────
+    _mark(marks, CUE_SUJOOD, rakat_index, segments)
     _add(segments, _misc("Allahu_akbar_short"))   # → prostrate (~5s)
 
     if is_first_of_prayer:
@@ -134,6 +162,7 @@ def build_rakat_segments(
     else:
         # Sujood 2 dhikr, then rise into tashahhud, then tasleem × 2
         _add(segments, _silence("Silence_10"))         # sujood 2 dhikr (~5s)
+        _mark(marks, CUE_TASHAHHUD, rakat_index, segments)
         _add(segments, _misc("Allahu_akbar_short"))    # → rise to tashahhud (~5s)
         _add(segments, _silence("Silence_45"))         # full tashahhud (~45s)
         _add(segments, _misc("Salam"))                 # Assalamu Alaikum (1)
@@ -142,17 +171,29 @@ def build_rakat_segments(
     return segments
 
 
-def build_concat_file(
-    room_slot_id: str,
+def _rakat_durations(ayahs: list[AyahKey], reciter: str) -> list[float] | None:
+    """Per-ayah durations for a duration-balanced split, or None to split by count."""
+    if settings.RAKAT_SPLIT_MODE != "duration":
+        return None
+    index = get_duration_index(reciter)
+    if index is None:
+        logger.warning(f"No duration index for {reciter} — splitting rakats by ayah count")
+        return None
+    return list(index.ayah_durations(ayahs))
+
+
+def build_program(
     rakats: int,
     juz_number: int,
     juz_half: int | None,
     reciter: str,
     juz_per_night: float = 1.0,
-) -> Path:
+    missing: list[Path] | None = None,
+) -> tuple[list[Path], list[CueMark]]:
     """
-    Build a single FFmpeg concat file for a room.
-    Returns the path to the concat .txt file.
+    Build the ordered audio entries of a whole Taraweeh program together with
+    the cue marks (rakah, ruku, sujood …) pointing into that list.
+    Absent ayah files are collected in missing when it is given.
     """
     if juz_per_night == 0.25:
         ayahs = get_juz_quarter(juz_number, juz_half or 1)
@@ -164,26 +205,91 @@ def build_concat_file(
     # regardless of which juz is assigned (Juz 1 starts with Surah 1).
     ayahs = [a for a in ayahs if a.surah != 1]
 
-    rakat_ayahs = distribute_ayahs_to_rakats(ayahs, rakats)
+    rakat_ayahs = distribute_ayahs_to_rakats(
+        ayahs, rakats,
+        durations=_rakat_durations(ayahs, reciter),
+        tolerance=settings.RAKAT_BALANCE_TOLERANCE,
+    )
 
     all_segments: list[Path] = []
+    marks: list[CueMark] = []
 
     for i, rakat_chunk in enumerate(rakat_ayahs):
-        all_segments.extend(build_rakat_segments(i, rakat_chunk, reciter))
+        rakat_marks: list[CueMark] = []
+        rakat_segments = build_rakat_segments(i, rakat_chunk, reciter, rakat_marks, missing)
+        for m in rakat_marks:
+            m.index += len(all_segments)
+        marks.extend(rakat_marks)
+        all_segments.extend(rakat_segments)
 
         rakat_number = i + 1  # 1-based
 
         if rakat_number == rakats:
             # ── Very end of the prayer session ──────────────────────────
+            _mark(marks, CUE_DUA, i, all_segments)
             _add(all_segments, _silence("Silence_15"))   # brief pause (~10s)
             _add(all_segments, _misc("Dua"))
         elif rakat_number % 2 == 0:
             # ── 45s inter-prayer break after every complete prayer ───────
             # (every 2 rakats = 1 complete Taraweeh prayer)
             # The UI shows a countdown popup during this silence.
+            _mark(marks, CUE_BREAK, i, all_segments)
             _add(all_segments, _silence("inter_prayer_45s"))
 
-    concat_path = Path(settings.HLS_OUTPUT_DIR) / room_slot_id / "concat.txt"
+    return all_segments, marks
+
+
+def build_concat_file(
+    output_dir: Path,
+    rakats: int,
+    juz_number: int,
+    juz_half: int | None,
+    reciter: str,
+    juz_per_night: float = 1.0,
+    use_pcm: bool = False,
+) -> tuple[Path, bool]:
+    """
+    Build a single FFmpeg concat file for a Taraweeh program in output_dir,
+    plus its rakah cue sheet (cues.json) derived from the ayah durations.
+    With use_pcm the entries point at the pre-transcoded FLAC library when
+    every file has been transcoded.
+    Returns (concat path, whether the entries are sample-exact FLAC).
+    Raises RuntimeError if any ayah file is missing — programs are cached for
+    good, so a shortened recitation must never be rendered.
+    """
+    missing: list[Path] = []
+    all_segments, marks = build_program(rakats, juz_number, juz_half, reciter, juz_per_night, missing)
+    if missing:
+        raise RuntimeError(
+            f"{len(missing)} ayah files missing for {reciter} "
+            f"(juz {juz_number}, first: {missing[0]}) — download them before rendering"
+        )
+
+    pcm = pcm_entries(all_segments) if use_pcm else None
+    if pcm is not None:
+        all_segments = pcm
+
+    concat_path = output_dir / "concat.txt"
     _write_concat(all_segments, concat_path)
-    logger.info(f"Built concat file: {concat_path} ({len(all_segments)} segments)")
-    return concat_path
+    write_cue_sheet(build_cue_sheet(all_segments, marks, reciter, rakats), output_dir)
+    logger.info(f"Built concat file: {concat_path} ({len(all_segments)} segments{', FLAC' if pcm else ''})")
+    return concat_path, pcm is not None
+
+
+def predict_program_duration(
+    rakats: int,
+    juz_number: int,
+    juz_half: int | None,
+    reciter: str,
+    juz_per_night: float = 1.0,
+) -> float | None:
+    """
+    Predicted length of a program in seconds from the duration index, without
+    writing anything.  None if the reciter has no index or files are unindexed.
+    """
+    index = get_duration_index(reciter)
+    if index is None:
+        return None
+    entries, _ = build_program(rakats, juz_number, juz_half, reciter, juz_per_night)
+    total = sum(index.path_duration(p) for p in entries)
+    return None if math.isnan(total) else total
@@ -0,0 +1,320 @@
+"""
+Content-addressed cache of rendered Taraweeh programs.
+
+Every public room on the same Ramadan night with the same reciter, juz slice
+and rakat count plays byte-identical audio — 96 buckets × 4 room types would
+otherwise encode the same program hundreds of times.  A program is rendered to
+AAC/HLS exactly once and every RoomSlot points its stream_path at the cached
+render.
+
+Layout (one directory per program):
+
+    HLS_OUTPUT_DIR/programs/<key>/concat.txt     FFmpeg concat list
+    HLS_OUTPUT_DIR/programs/<key>/cues.json      rakah cue sheet (see cue_sheet)
+    HLS_OUTPUT_DIR/programs/<key>/program.m3u8   master playlist (see renditions)
+    HLS_OUTPUT_DIR/programs/<key>/program_<r>.m3u8     VOD playlist per rendition
+    HLS_OUTPUT_DIR/programs/<key>/seg_<r>_00000.ts     AAC segments
+    HLS_OUTPUT_DIR/programs/<key>/media_<r>.m4s        fMP4 parts instead, with
+                                                        HLS_LOW_LATENCY
+    HLS_OUTPUT_DIR/programs/<key>/render.log     FFmpeg stderr of the render
+
+A program directory's mtime records its last use; retention evicts the least
+recently used programs when HLS_OUTPUT_DIR is over its disk budget, moving
+them to PROGRAM_ARCHIVE_DIR if set, from where a later build restores them
+instead of rendering again.
+
+Renders are written into a temporary sibling directory and renamed into place
+when FFmpeg exits cleanly, so a directory under programs/ is always complete.
+The temporary name carries the rendering host and pid (<key>.tmp-<host>-<pid>):
+HLS_OUTPUT_DIR is shared between containers, and a pid only means something
+on the host that owns it.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from config import get_settings
+from services.audio.playlist_builder import build_concat_file, predict_program_duration
+from services.audio.cue_sheet import load_cue_sheet
+from services.audio.renditions import encode_args, hls_ladder_args
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Bump whenever the render command changes so stale renders are not reused.
+RENDER_VERSION = 3
+
+PROGRAM_MANIFEST = "program.m3u8"          # master playlist
+PROGRAM_PLAYLIST_PREFIX = "program"         # program_<rendition>.m3u8
+
+# Another host's unfinished render untouched for this long is abandoned
+STALE_RENDER_AGE = 3600.0
+
+# ProgramKey → predicted seconds (only known values are cached)
+_durations: dict["ProgramKey", float] = {}
+
+# One lock per program key — concurrent builds of the same program in this
+# process wait for the first render instead of encoding it twice.
+_render_locks: dict[str, threading.Lock] = {}
+_render_locks_guard = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ProgramKey:
+    reciter: str
+    juz_number: int
+    juz_half: int | None
+    rakats: int
+    juz_per_night: float
+
+    @property
+    def digest(self) -> str:
+        payload = json.dumps({
+            **asdict(self),
+            "v": RENDER_VERSION,
+            "split": settings.RAKAT_SPLIT_MODE,
+            "tolerance": settings.RAKAT_BALANCE_TOLERANCE,
+            "codec": settings.AUDIO_CODEC,
+            "ll": settings.HLS_LOW_LATENCY,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+    @classmethod
+    def for_slot(cls, slot) -> "ProgramKey":
+        return cls(
+            reciter=slot.reciter,
+            juz_number=slot.juz_number,
+            juz_half=slot.juz_half,
+            rakats=slot.rakats,
+            juz_per_night=float(slot.juz_per_night),
+        )
+
+
+def get_programs_root() -> Path:
+    return Path(settings.HLS_OUTPUT_DIR) / "programs"
+
+
+def get_program_dir(key: ProgramKey) -> Path:
+    return get_programs_root() / key.digest
+
+
+def get_program_manifest(key: ProgramKey) -> Path:
+    return get_program_dir(key) / PROGRAM_MANIFEST
+
+
+def is_program_rendered(key: ProgramKey) -> bool:
+    return get_program_manifest(key).exists()
+
+
+def _tmp_dir(final_dir: Path) -> Path:
+    return final_dir.with_name(f"{final_dir.name}.tmp-{socket.gethostname()}-{os.getpid()}")
+
+
+def _lock_for(digest: str) -> threading.Lock:
+    with _render_locks_guard:
+        return _render_locks.setdefault(digest, threading.Lock())
+
+
+def _render_cmd(concat_path: Path, output_dir: Path, pcm: bool = False) -> list[str]:
+    # With pcm the entries are sample-exact FLAC (see transcoder) and join
+    # without gaps; otherwise resample to handle timestamp gaps between MP3
+    # files.  Either way the whole program is encoded once, so AAC priming
+    # occurs only at its very start.
+    resample = [] if pcm else ["-af", "aresample=async=1000"]
+    if settings.HLS_LOW_LATENCY:
+        # ~1s fMP4 chunks in one file per rendition — each chunk is an LL-HLS
+        # part, addressed by byte range (see virtual_stream)
+        segmenting = [
+            "-hls_time", "1",
+            "-hls_segment_type", "fmp4",
+            "-hls_fmp4_init_filename", "init_%v.mp4",
+            "-hls_flags", "single_file",
+        ]
+        segment_filename = "media_%v.m4s"
+    else:
+        segmenting = ["-hls_time", "6"]
+        segment_filename = "seg_%v_%05d.ts"
+    return [
+        "ffmpeg", "-y", "-nostdin",
+        "-f", "concat", "-safe", "0",
+        "-i", str(concat_path),
+        *resample,
+        *encode_args(),                           # one pass, every rendition
+        "-vn",
+        "-max_muxing_queue_size", "1024",
+        "-f", "hls",
+        *segmenting,
+        "-hls_playlist_type", "vod",
+        *hls_ladder_args(output_dir, PROGRAM_PLAYLIST_PREFIX, PROGRAM_MANIFEST, segment_filename),
+    ]
+
+
+def render_program(key: ProgramKey) -> Path:
+    """
+    Return the cached program manifest for key, rendering it first if needed.
+    Blocking — call from an executor.  Raises RuntimeError if an ayah
+    file is missing or FFmpeg fails.
+    """
+    manifest = get_program_manifest(key)
+    if manifest.exists():
+        _touch(manifest.parent)
+        return manifest
+
+    with _lock_for(key.digest):
+        if manifest.exists():  # rendered while we waited for the lock
+            return manifest
+
+        final_dir = get_program_dir(key)
+        if _restore_archived(key):
+            return manifest
+
+        tmp_dir = _tmp_dir(final_dir)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        try:
+            concat_path, pcm = build_concat_file(
+                tmp_dir, key.rakats, key.juz_number, key.juz_half, key.reciter, key.juz_per_night,
+                use_pcm=settings.AUDIO_CODEC == "flac",
+            )
+        except RuntimeError:
+            # Missing audio — nothing is cached, the next build retries
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        (tmp_dir / "program.json").write_text(json.dumps(asdict(key)))
+
+        log_path = tmp_dir / "render.log"
+        with open(log_path, "w") as log_file:
+            result = subprocess.run(
+                _render_cmd(concat_path, tmp_dir, pcm),
+                stdout=subprocess.DEVNULL,
+                stderr=log_file,
+            )
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"FFmpeg render failed for program {key.digest} "
+                f"(exit {result.returncode}) — see {log_path}"
+            )
+
+        try:
+            tmp_dir.rename(final_dir)
+        except OSError as e:
+            # Another worker process finished the same program first — or not
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not manifest.exists():
+                raise RuntimeError(f"Could not move render of program {key.digest} into place: {e}") from e
+        logger.info(f"Rendered program {key.digest} ({key})")
+        return manifest
+
+
+def _touch(program_dir: Path) -> None:
+    try:
+        os.utime(program_dir)
+    except OSError:
+        pass
+
+
+def _restore_archived(key: ProgramKey) -> bool:
+    """Copy a program evicted to PROGRAM_ARCHIVE_DIR back into the cache."""
+    if not settings.PROGRAM_ARCHIVE_DIR:
+        return False
+    archived = Path(settings.PROGRAM_ARCHIVE_DIR) / key.digest
+    if not (archived / PROGRAM_MANIFEST).exists():
+        return False
+    final_dir = get_program_dir(key)
+    tmp_dir = _tmp_dir(final_dir)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    shutil.copytree(archived, tmp_dir)
+    try:
+        tmp_dir.rename(final_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not (final_dir / PROGRAM_MANIFEST).exists():
+            return False
+    _touch(final_dir)
+    logger.info(f"Restored program {key.digest} from the archive")
+    return True
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _last_write(path: Path) -> float:
+    """Newest mtime of a directory and the files in it."""
+    try:
+        latest = path.stat().st_mtime
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0.0
+    for entry in entries:
+        try:
+            latest = max(latest, entry.stat(follow_symlinks=False).st_mtime)
+        except OSError:
+            continue
+    return latest
+
+
+def remove_stale_renders() -> int:
+    """
+    Delete temporary render directories left by processes that died
+    mid-render.  A render of this host is dead when its pid is gone; another
+    host's pids cannot be checked from here, so its render is only removed
+    once nothing in it has changed for STALE_RENDER_AGE.  Returns the count.
+    """
+    removed = 0
+    root = get_programs_root()
+    host = socket.gethostname()
+    cutoff = time.time() - STALE_RENDER_AGE
+    for tmp_dir in root.glob("*.tmp-*") if root.is_dir() else ():
+        owner, _, pid = tmp_dir.name.rpartition(".tmp-")[2].rpartition("-")
+        if owner == host and pid.isdigit():
+            if _pid_alive(int(pid)):
+                continue           # still rendering
+        elif _last_write(tmp_dir) > cutoff:
+            continue
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def get_program_duration(key: ProgramKey) -> float | None:
+    """
+    Length of a program in seconds: from the rendered cue sheet if the program
+    exists, otherwise predicted from the duration index.  None if unknown.
+    """
+    if key in _durations:
+        return _durations[key]
+    duration = None
+    if is_program_rendered(key):
+        sheet = load_cue_sheet(str(get_program_manifest(key)))
+        duration = sheet["total_duration"] if sheet else None
+    if duration is None:
+        duration = predict_program_duration(
+            key.rakats, key.juz_number, key.juz_half, key.reciter, key.juz_per_night,
+        )
+    if duration is not None:
+        _durations[key] = duration
+    return duration
+
+
+async def program_duration(key: ProgramKey) -> float | None:
+    """get_program_duration for async callers — a prediction may load the audio
+    library and duration index, so it runs off the event loop."""
+    if key in _durations:
+        return _durations[key]
+    return await asyncio.to_thread(get_program_duration, key)
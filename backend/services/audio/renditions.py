@@ -0,0 +1,82 @@
+"""
+Audio bitrate ladder shared by program renders, FFmpeg room relays and
+virtual-mode manifests.
+
+A program is rendered once into every rendition in a single FFmpeg pass
+(one decode, several AAC encodes), all at 44.1 kHz so AAC frames — and hence
+HLS segment boundaries — line up across renditions.  Players load the master
+playlist and switch renditions by bandwidth.
+
+FFmpeg's native AAC encoder has no HE-AAC profile, so the low rung is mono
+AAC-LC, which is the nearest equivalent at 32k.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class Rendition:
+    name: str
+    bitrate: str        # FFmpeg -b:a value
+    bandwidth: int      # EXT-X-STREAM-INF BANDWIDTH (bits/s incl. TS overhead)
+    channels: int
+
+
+# Highest first
+RENDITIONS: tuple[Rendition, ...] = (
+    Rendition("128k", "128k", 140000, 2),
+    Rendition("64k",  "64k",   72000, 2),
+    Rendition("32k",  "32k",   38000, 1),
+)
+RENDITION_NAMES = frozenset(r.name for r in RENDITIONS)
+AAC_CODECS = "mp4a.40.2"
+
+
+def encode_args() -> list[str]:
+    """-map/-c:a arguments producing one output audio stream per rendition."""
+    args: list[str] = []
+    for i, r in enumerate(RENDITIONS):
+        args += ["-map", "0:a:0",
+                 f"-c:a:{i}", "aac", f"-b:a:{i}", r.bitrate,
+                 f"-ar:a:{i}", "44100", f"-ac:a:{i}", str(r.channels)]
+    return args
+
+
+def relay_args() -> list[str]:
+    """-map/-c arguments that remux every rendition of an HLS master input."""
+    return [arg for i in range(len(RENDITIONS)) for arg in ("-map", f"0:a:{i}")] + ["-c", "copy"]
+
+
+def hls_ladder_args(
+    output_dir: Path | str,
+    playlist_prefix: str,
+    master_name: str,
+    segment_filename: str = "seg_%v_%05d.ts",
+) -> list[str]:
+    """
+    HLS muxer arguments for the ladder: media playlists
+    <playlist_prefix>_<name>.m3u8, segments segment_filename (seg_<name>_NNNNN.ts)
+    and a master playlist master_name, all in output_dir (a directory, or an
+    http:// URL for -method PUT output).
+    """
+    base = str(output_dir).rstrip("/")
+    return [
+        "-var_stream_map", " ".join(f"a:{i},name:{r.name}" for i, r in enumerate(RENDITIONS)),
+        "-master_pl_name", master_name,
+        "-hls_segment_filename", f"{base}/{segment_filename}",
+        f"{base}/{playlist_prefix}_%v.m3u8",
+    ]
+
+
+def media_playlist_path(master_path: str | Path, name: str, playlist_prefix: str = "program") -> Path:
+    """Path of one rendition's media playlist next to its master playlist."""
+    return Path(master_path).parent / f"{playlist_prefix}_{name}.m3u8"
+
+
+def render_master_playlist(playlist_prefix: str) -> str:
+    """Master playlist pointing at <playlist_prefix>_<name>.m3u8 for every rendition."""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for r in RENDITIONS:
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={r.bandwidth},CODECS="{AAC_CODECS}"')
+        lines.append(f"{playlist_prefix}_{r.name}.m3u8")
+    return "\n".join(lines) + "\n"
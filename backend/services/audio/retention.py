@@ -0,0 +1,190 @@
+"""
+Retention and garbage collection for HLS_OUTPUT_DIR.
+
+    HLS_OUTPUT_DIR/<room_id>/     per-room relay output (ffmpeg mode)
+    HLS_OUTPUT_DIR/programs/      cached program renders (see program_cache)
+
+retention_job runs every RETENTION_INTERVAL_MINUTES:
+
+  1. Room directories of completed (or deleted) rooms are removed once they
+     have been idle for ROOM_RETENTION_MINUTES — catch-up playlists read the
+     program render, so nothing references them after the room ends.
+  2. If HLS_OUTPUT_DIR is still over HLS_DISK_BUDGET_GB, the least recently
+     used programs are evicted (moved to PROGRAM_ARCHIVE_DIR when set) until
+     it fits.  Programs of scheduled, building or live rooms are never touched.
+
+get_storage_usage() reports bytes and files per area plus free space on the
+volume, for the admin dashboard.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from sqlalchemy import select
+from config import get_settings
+from database import AsyncSessionLocal
+from models import RoomSlot
+from services.audio.program_cache import get_programs_root, remove_stale_renders, PROGRAM_MANIFEST
+from services.audio.stream_manager import is_stream_alive
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RETENTION_INTERVAL_MINUTES = 10
+ACTIVE_STATUSES = ("scheduled", "building", "live")
+
+
+def _dir_usage(path: Path) -> tuple[int, int]:
+    """(bytes, files) under path."""
+    total = files = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+                    files += 1
+            except OSError:
+                continue
+    return total, files
+
+
+def _room_dirs() -> list[Path]:
+    root = Path(settings.HLS_OUTPUT_DIR)
+    dirs = []
+    for entry in os.scandir(root) if root.is_dir() else ():
+        try:
+            uuid.UUID(entry.name)
+        except ValueError:
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            dirs.append(Path(entry.path))
+    return dirs
+
+
+def get_storage_usage() -> dict:
+    """Bytes and file counts of room output and programs, and volume free space.  Blocking."""
+    root = Path(settings.HLS_OUTPUT_DIR)
+    rooms_bytes = rooms_files = 0
+    room_dirs = _room_dirs()
+    for room_dir in room_dirs:
+        b, f = _dir_usage(room_dir)
+        rooms_bytes += b
+        rooms_files += f
+    programs_bytes, programs_files = _dir_usage(get_programs_root())
+    disk = shutil.disk_usage(root) if root.is_dir() else None
+    budget = int(settings.HLS_DISK_BUDGET_GB * 1024 ** 3)
+    return {
+        "rooms": {"bytes": rooms_bytes, "files": rooms_files, "dirs": len(room_dirs)},
+        "programs": {"bytes": programs_bytes, "files": programs_files},
+        "total_bytes": rooms_bytes + programs_bytes,
+        "budget_bytes": budget or None,
+        "volume": {"total": disk.total, "free": disk.free} if disk else None,
+    }
+
+
+def _remove_room_dirs(removable: set[str], max_idle: float) -> int:
+    removed = 0
+    cutoff = time.time() - max_idle
+    for room_dir in _room_dirs():
+        if room_dir.name not in removable or is_stream_alive(room_dir.name):
+            continue
+        try:
+            if room_dir.stat().st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(room_dir, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def _evict_programs(keep: set[str], budget: int) -> int:
+    """Evict least recently used programs until HLS_OUTPUT_DIR fits budget.  Blocking."""
+    root = get_programs_root()
+    if not root.is_dir():
+        return 0
+    usage = get_storage_usage()["total_bytes"]
+    if usage <= budget:
+        return 0
+
+    programs = []
+    for entry in os.scandir(root):
+        program_dir = Path(entry.path)
+        if entry.is_dir() and ".tmp-" not in entry.name and entry.name not in keep:
+            programs.append((entry.stat().st_mtime, program_dir))
+    programs.sort()
+
+    archive = Path(settings.PROGRAM_ARCHIVE_DIR) if settings.PROGRAM_ARCHIVE_DIR else None
+    evicted = 0
+    for _, program_dir in programs:
+        if usage <= budget:
+            break
+        size, _ = _dir_usage(program_dir)
+        if archive and (program_dir / PROGRAM_MANIFEST).exists():
+            archive.mkdir(parents=True, exist_ok=True)
+            target = archive / program_dir.name
+            shutil.rmtree(target, ignore_errors=True)
+            shutil.move(str(program_dir), str(target))
+        else:
+            shutil.rmtree(program_dir, ignore_errors=True)
+        usage -= size
+        evicted += 1
+    if usage > budget:
+        logger.warning(
+            f"HLS output still {usage / 1024 ** 3:.1f} GB after eviction — "
+            f"over the {budget / 1024 ** 3:.1f} GB budget; remaining programs are in use"
+        )
+    return evicted
+
+
+async def retention_job() -> dict:
+    """Delete finished rooms' output and enforce the disk budget."""
+    try:
+        room_ids = [d.name for d in await asyncio.to_thread(_room_dirs)]
+        async with AsyncSessionLocal() as db:
+            active_rooms = set()
+            if room_ids:
+                result = await db.execute(
+                    select(RoomSlot.id).where(
+                        RoomSlot.id.in_([uuid.UUID(r) for r in room_ids]),
+                        RoomSlot.status.in_(ACTIVE_STATUSES),
+                    )
+                )
+                active_rooms = {str(r) for r in result.scalars().all()}
+            result = await db.execute(
+                select(RoomSlot.stream_path).where(
+                    RoomSlot.status.in_(ACTIVE_STATUSES),
+                    RoomSlot.stream_path.is_not(None),
+                )
+            )
+            keep_programs = {Path(p).parent.name for p in result.scalars().all()}
+
+        removable = set(room_ids) - active_rooms
+        rooms = await asyncio.to_thread(
+            _remove_room_dirs, removable, settings.ROOM_RETENTION_MINUTES * 60,
+        )
+        stale = await asyncio.to_thread(remove_stale_renders)
+        programs = 0
+        if settings.HLS_DISK_BUDGET_GB > 0:
+            programs = await asyncio.to_thread(
+                _evict_programs, keep_programs, int(settings.HLS_DISK_BUDGET_GB * 1024 ** 3),
+            )
+        if rooms or stale or programs:
+            logger.info(
+                f"Retention: removed {rooms} room dirs, {stale} unfinished renders, "
+                f"evicted {programs} programs"
+            )
+        return {"rooms_removed": rooms, "stale_renders_removed": stale, "programs_evicted": programs}
+    except Exception as e:
+        logger.error(f"retention_job failed: {e}", exc_info=True)
+        return {"error": str(e)}
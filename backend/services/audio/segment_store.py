@@ -0,0 +1,91 @@
+"""
+In-memory HLS output for FFmpeg relays (HLS_INGEST="memory").
+
+Instead of writing playlists and segments under HLS_OUTPUT_DIR, a relay
+PUTs them over loopback HTTP to /hls-ingest/<room_id>/<name> (see api/hls)
+and they land here: the latest version of each playlist, plus the most
+recent segments per room in a bounded ring.  The /hls routes answer from
+the same buffers, so live audio never touches the disk.
+
+A ring holds the live window of every rendition plus a little slack for
+players that are a segment or two behind; older segments are evicted as
+new ones arrive.  Everything lives in one backend process, so it needs a
+single worker running both the api and streamer roles (ROLE=all); startup
+refuses HLS_INGEST=memory otherwise.
+"""
+import time
+from collections import OrderedDict
+from config import get_settings
+from services.audio.renditions import RENDITIONS
+
+settings = get_settings()
+
+RING_SLACK_SEGMENTS = 4     # per rendition, beyond the live window
+
+
+class RoomBuffer:
+    def __init__(self, max_segments: int):
+        self.max_segments = max_segments
+        self.playlists: dict[str, bytes] = {}
+        self.segments: OrderedDict[str, bytes] = OrderedDict()
+        self.updated = time.monotonic()
+
+    def put(self, name: str, data: bytes) -> None:
+        self.updated = time.monotonic()
+        if name.endswith(".m3u8"):
+            self.playlists[name] = data
+            return
+        self.segments[name] = data
+        self.segments.move_to_end(name)
+        while len(self.segments) > self.max_segments:
+            self.segments.popitem(last=False)
+
+    def get(self, name: str) -> bytes | None:
+        if name.endswith(".m3u8"):
+            return self.playlists.get(name)
+        return self.segments.get(name)
+
+    def nbytes(self) -> int:
+        return sum(map(len, self.playlists.values())) + sum(map(len, self.segments.values()))
+
+
+class SegmentStore:
+    def __init__(self, max_segments: int):
+        self.max_segments = max_segments
+        self.rooms: dict[str, RoomBuffer] = {}
+
+    def put(self, room_slot_id: str, name: str, data: bytes) -> None:
+        room = self.rooms.get(room_slot_id)
+        if room is None:
+            room = self.rooms[room_slot_id] = RoomBuffer(self.max_segments)
+        room.put(name, data)
+
+    def get(self, room_slot_id: str, name: str) -> bytes | None:
+        room = self.rooms.get(room_slot_id)
+        return room.get(name) if room else None
+
+    def drop(self, room_slot_id: str) -> None:
+        self.rooms.pop(room_slot_id, None)
+
+    def status(self) -> dict:
+        return {
+            "rooms": len(self.rooms),
+            "segments": sum(len(r.segments) for r in self.rooms.values()),
+            "bytes": sum(r.nbytes() for r in self.rooms.values()),
+        }
+
+
+_store: SegmentStore | None = None
+
+
+def get_segment_store() -> SegmentStore:
+    global _store
+    if _store is None:
+        per_rendition = settings.HLS_WINDOW_SEGMENTS + RING_SLACK_SEGMENTS
+        _store = SegmentStore(per_rendition * len(RENDITIONS))
+    return _store
+
+
+def is_memory_ingest() -> bool:
+    """True when FFmpeg relays publish into memory instead of HLS_OUTPUT_DIR."""
+    return settings.STREAM_MODE != "virtual" and settings.HLS_INGEST == "memory"
@@ -1,97 +1,649 @@
-import subprocess
+"""
+Per-room FFmpeg relays (STREAM_MODE="ffmpeg").
+
+Relays run in their own session, detached from the backend, and each one is
+recorded in a PID file (HLS_OUTPUT_DIR/<room_id>/ffmpeg.pid: pid, host,
+start time, program, log path).  A streamer process that restarts re-adopts
+the still-running relays through adopt_stream() instead of killing and
+re-spawning them, so listeners hear no interruption.  In production relays
+live in the long-lived streamer container, which deploys leave running (see
+docker-compose.prod.yml); the process inside it is restarted in place.
+
+Every relay, spawned or adopted, is watched by an asyncio supervisor task.
+FFmpeg writes `-progress` key/value blocks and its (warning-level) stderr
+to files in the room directory — files rather than pipes so the relay
+outlives the backend — and the supervisor tails both: it tracks the relay's
+speed and output position, keeps the last LOG_TAIL_LINES log lines in
+memory, and restarts the relay at the room's current position if it exits,
+stalls, or falls behind real time.
+
+With HLS_INGEST="memory" the relay publishes its playlists and segments by
+HTTP PUT into the backend's segment_store instead of the room directory;
+only the PID, progress and log files stay on disk.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import socket
 import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
 from pathlib import Path
 from config import get_settings
+from services.audio.renditions import RENDITIONS, relay_args, hls_ladder_args, media_playlist_path
+from services.audio.segment_store import get_segment_store, is_memory_ingest
+from services.audio.encode_queue import get_relay_queue, Lease, PRIORITY_PUBLIC, RELAY_COST
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Maps room_slot_id → running FFmpeg subprocess
-ACTIVE_STREAMS: dict[str, subprocess.Popen] = {}
+PID_FILENAME      = "ffmpeg.pid"
+LOG_FILENAME      = "ffmpeg.log"
+PROGRESS_FILENAME = "progress.log"
+
+# ── Watchdog tuning ───────────────────────────────────────────────────────────
+WATCHDOG_INTERVAL = 5.0     # seconds between checks
+STALL_TIMEOUT     = 30.0    # no output progress for this long → restart
+MIN_SPEED         = 0.9     # relays are paced with -re, so ~1.0x is healthy
+SLOW_GRACE        = 60.0    # tolerated time below MIN_SPEED before a restart
+MAX_RESTARTS      = 5       # per RESTART_WINDOW, then give up and log
+RESTART_WINDOW    = 600.0
+LOG_TAIL_LINES    = 50
+
+HLS_INIT_TIME     = 2       # short first segment so a room goes live quickly
+READY_TIMEOUT     = 45.0
+
+
+class AdoptedProcess:
+    """
+    Handle for a relay started by a previous backend process, shaped like
+    asyncio.subprocess.Process.  It is not our child, so liveness is checked
+    with signal 0 and /proc/<pid>/cmdline (guards against PID reuse).
+    """
+
+    def __init__(self, pid: int, room_slot_id: str):
+        self.pid = pid
+        self.room_slot_id = room_slot_id
+        self._returncode: int | None = None
+
+    @property
+    def returncode(self) -> int | None:
+        if self._returncode is None and not _is_room_ffmpeg(self.pid, self.room_slot_id):
+            self._returncode = -1
+        return self._returncode
+
+    def terminate(self) -> None:
+        self._signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self._signal(signal.SIGKILL)
+
+    def _signal(self, sig: int) -> None:
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                self._returncode = -1
+
+    async def wait(self) -> int:
+        while self.returncode is None:
+            await asyncio.sleep(0.1)
+        return self._returncode
+
+
+@dataclass
+class RelayState:
+    """What the supervisor knows about one room's relay."""
+    room_slot_id: str
+    program_path: str
+    origin: float                      # wall-clock time of program position 0
+    speed: float | None = None
+    out_time: float = 0.0              # seconds of program written by this relay
+    last_progress: float = field(default_factory=time.monotonic)
+    slow_since: float | None = None
+    finished: bool = False             # FFmpeg reported progress=end
+    restarts: deque = field(default_factory=lambda: deque(maxlen=MAX_RESTARTS))
+    log_tail: deque = field(default_factory=lambda: deque(maxlen=LOG_TAIL_LINES))
+    log_pos: int = 0
+    progress_pos: int = 0
+    task: asyncio.Task | None = None
+
+
+# Maps room_slot_id → running FFmpeg relay (spawned or adopted)
+ACTIVE_STREAMS: dict[str, asyncio.subprocess.Process | AdoptedProcess] = {}
+# Maps room_slot_id → supervisor state
+SUPERVISED: dict[str, RelayState] = {}
+# Maps room_slot_id → the relay's slot in the relay queue
+RELAY_LEASES: dict[str, Lease] = {}
 
 
 def get_stream_dir(room_slot_id: str) -> Path:
     return Path(settings.HLS_OUTPUT_DIR) / room_slot_id
 
 
+STREAM_PLAYLIST_PREFIX = "stream"           # stream_<rendition>.m3u8
+
+
 def get_m3u8_path(room_slot_id: str) -> Path:
+    """The room's master playlist (lists one media playlist per rendition)."""
     return get_stream_dir(room_slot_id) / "stream.m3u8"
 
 
 def get_stream_url(room_slot_id: str) -> str:
+    """Master playlist URL — players pick a rendition by bandwidth."""
     return f"{settings.HLS_SERVE_URL}/hls/{room_slot_id}/stream.m3u8"
 
 
-async def start_stream(room_slot_id: str, concat_file_path: str) -> subprocess.Popen | None:
-    output_dir = get_stream_dir(room_slot_id)
-    output_dir.mkdir(parents=True, exist_ok=True)
+def get_ingest_key() -> str:
+    """Shared secret relays send (X-Ingest-Key) when publishing into memory."""
+    return hashlib.sha256(f"hls-ingest:{settings.JWT_SECRET_KEY}".encode()).hexdigest()[:32]
+
+
+def get_pid_path(room_slot_id: str) -> Path:
+    return get_stream_dir(room_slot_id) / PID_FILENAME
+
+
+def is_virtual_mode() -> bool:
+    """True when rooms are served as time-shifted manifests (no FFmpeg per room)."""
+    return settings.STREAM_MODE == "virtual"
+
 
-    m3u8 = get_m3u8_path(room_slot_id)
+def get_program_segment_prefix(program_path: str) -> str:
+    """URI prefix that reaches a program's segments from /hls/<room_id>/stream.m3u8."""
+    rel = Path(program_path).parent.relative_to(Path(settings.HLS_OUTPUT_DIR))
+    return f"../{rel.as_posix()}/"
 
-    # Write FFmpeg stderr to a log file so:
-    #   1. The OS pipe buffer never fills up and blocks FFmpeg mid-stream
-    #   2. We can inspect errors at /app/hls/<room_id>/ffmpeg.log
-    log_path = output_dir / "ffmpeg.log"
 
-    cmd = [
-        "ffmpeg", "-y",
-        "-f", "concat", "-safe", "0",
-        "-i", str(concat_file_path),
-        # Resample to handle encoder-delay gaps between MP3 files
-        "-af", "aresample=async=1000",
-        "-c:a", "aac", "-b:a", "128k", "-ar", "44100",
+# ── PID files ─────────────────────────────────────────────────────────────────
+
+def _is_room_ffmpeg(pid: int, room_slot_id: str) -> bool:
+    """True if pid is alive and is an FFmpeg writing this room's directory."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, owned by another user
+    try:
+        cmdline = Path(f"/proc/{pid}/cmdline").read_bytes()
+    except OSError:
+        return True  # no procfs — trust the signal check
+    return b"ffmpeg" in cmdline and str(get_stream_dir(room_slot_id)).encode() in cmdline
+
+
+def _write_pid_file(room_slot_id: str, pid: int, program_path: str, origin: float) -> None:
+    get_pid_path(room_slot_id).write_text(json.dumps({
+        "pid": pid,
+        "host": socket.gethostname(),
+        "started_at": time.time(),
+        "origin": origin,
+        "program": str(program_path),
+        "log": str(get_stream_dir(room_slot_id) / LOG_FILENAME),
+    }))
+
+
+def _read_pid_file(room_slot_id: str) -> dict | None:
+    """PID file of a relay started on this host (None if absent or another host's)."""
+    try:
+        info = json.loads(get_pid_path(room_slot_id).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    # HLS_OUTPUT_DIR may be shared between streamer hosts
+    return info if info.get("host", socket.gethostname()) == socket.gethostname() else None
+
+
+def adopt_stream(room_slot_id: str) -> bool:
+    """
+    Re-attach to a relay left running by a previous backend process and put
+    it under supervision.  Returns True if one is alive.
+    """
+    if is_stream_alive(room_slot_id):
+        return True
+    info = _read_pid_file(room_slot_id)
+    if not info:
+        return False
+    if not _is_room_ffmpeg(info["pid"], room_slot_id):
+        get_pid_path(room_slot_id).unlink(missing_ok=True)
+        return False
+    ACTIVE_STREAMS[room_slot_id] = AdoptedProcess(info["pid"], room_slot_id)
+    if room_slot_id not in RELAY_LEASES:
+        RELAY_LEASES[room_slot_id] = get_relay_queue().claim(RELAY_COST, PRIORITY_PUBLIC, f"relay {room_slot_id}")
+    started_at = info.get("started_at", time.time())
+    _supervise(room_slot_id, info["program"], info.get("origin", started_at), adopted=True)
+    logger.info(
+        f"Adopted stream for room {room_slot_id}, PID={info['pid']}, "
+        f"running {time.time() - started_at:.0f}s"
+    )
+    return True
+
+
+def adopt_local_streams() -> int:
+    """Adopt every relay on this host that has a PID file (streamer startup)."""
+    root = Path(settings.HLS_OUTPUT_DIR)
+    pid_files = root.glob(f"*/{PID_FILENAME}") if root.is_dir() else ()
+    return sum(adopt_stream(p.parent.name) for p in pid_files)
+
+
+# ── Spawning ──────────────────────────────────────────────────────────────────
+
+def _relay_cmd(room_slot_id: str, program_path: str, offset: float) -> list[str]:
+    output_dir = get_stream_dir(room_slot_id)
+    flags = []
+    if offset > 0:
+        flags += ["append_list", "discont_start"]   # continue numbering, mark the gap
+    target: Path | str = output_dir
+    ingest = []
+    if is_memory_ingest():
+        target = f"{settings.HLS_INGEST_URL.rstrip('/')}/{room_slot_id}"
+        ingest = [
+            "-method", "PUT",
+            "-http_persistent", "1",              # one keep-alive connection per relay
+            "-ignore_io_errors", "1",             # ride out a backend restart
+            "-headers", f"X-Ingest-Key: {get_ingest_key()}\r\n",
+        ]
+    else:
+        # Segments that left the window are dead — catch-up reads the program
+        flags.append("delete_segments")
+    return [
+        "ffmpeg", "-y", "-nostdin",
+        "-loglevel", "warning", "-nostats",       # stderr is for problems only
+        "-progress", str(output_dir / PROGRESS_FILENAME),   # speed / position for the watchdog
+        "-re",                                    # pace at real time — radio-style room
+        *(["-ss", f"{offset:.3f}"] if offset > 0 else []),   # resume position
+        "-i", str(program_path),                  # program master playlist
+        *relay_args(),                            # every rendition, -c copy
         "-vn",                                    # no video stream
         "-max_muxing_queue_size", "1024",         # prevent muxing queue overflow
         "-f", "hls",
+        "-hls_init_time", str(HLS_INIT_TIME),     # first segment ready ~2s after launch
         "-hls_time", "6",                         # 6-second segments — more stable than 4s
-        "-hls_list_size", "0",                    # keep all segments (VOD-style, join from start)
-        "-hls_segment_filename", str(output_dir / "seg%05d.ts"),
-        str(m3u8),
+        "-hls_list_size", str(settings.HLS_WINDOW_SEGMENTS),  # sliding window; catch-up via full.m3u8
+        *(["-hls_flags", "+".join(flags)] if flags else []),
+        *ingest,
+        *hls_ladder_args(target, STREAM_PLAYLIST_PREFIX, get_m3u8_path(room_slot_id).name),
     ]
 
+
+async def _terminate(proc: asyncio.subprocess.Process | AdoptedProcess, timeout: float) -> None:
+    if proc.returncode is not None:
+        return
     try:
-        # Kill any pre-existing FFmpeg writing to this room's directory.
-        # This handles the case where a previous container left orphaned processes
-        # or where start_stream is called twice for the same room.
-        existing = ACTIVE_STREAMS.pop(room_slot_id, None)
-        if existing and existing.poll() is None:
-            existing.terminate()
-            try:
-                existing.wait(timeout=3)
-            except subprocess.TimeoutExpired:
-                existing.kill()
-        # Also pkill by directory pattern to catch orphans not tracked in ACTIVE_STREAMS
-        subprocess.run(
-            ["pkill", "-f", f"hls/{room_slot_id}"],
-            capture_output=True,
-        )
-        import time; time.sleep(0.5)  # brief pause so the OS releases file locks
+        proc.terminate()
+        await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+    except ProcessLookupError:
+        pass
 
-        log_file = open(log_path, "w")
-        proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=log_file,              # file write never blocks unlike a pipe
+
+async def _spawn(room_slot_id: str, program_path: str, offset: float) -> asyncio.subprocess.Process:
+    """Replace whatever relay the room has with a fresh one at offset."""
+    # Kill any pre-existing FFmpeg writing to this room's directory —
+    # tracked in this process or recorded in the PID file by a previous
+    # one — in case start_stream is called twice for the same room.
+    if room_slot_id not in ACTIVE_STREAMS:
+        info = _read_pid_file(room_slot_id)
+        if info and _is_room_ffmpeg(info["pid"], room_slot_id):
+            ACTIVE_STREAMS[room_slot_id] = AdoptedProcess(info["pid"], room_slot_id)
+    existing = ACTIVE_STREAMS.pop(room_slot_id, None)
+    if existing:
+        await _terminate(existing, timeout=3)
+    if offset <= 0:
+        get_segment_store().drop(room_slot_id)   # a fresh start, not a resume
+
+    output_dir = get_stream_dir(room_slot_id)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # stderr goes to a file: the OS pipe buffer can never fill up and block
+    # FFmpeg, and the relay keeps running if the backend goes away.  The
+    # parent's handle is closed as soon as the child has it.
+    with open(output_dir / LOG_FILENAME, "a" if offset > 0 else "w") as log_file:
+        proc = await asyncio.create_subprocess_exec(
+            *_relay_cmd(room_slot_id, program_path, offset),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=log_file,
+            start_new_session=True,       # survives a backend restart; re-adopted via PID file
         )
-        ACTIVE_STREAMS[room_slot_id] = proc
-        logger.info(f"Stream started for room {room_slot_id}, PID={proc.pid}, log={log_path}")
-        return proc
+    ACTIVE_STREAMS[room_slot_id] = proc
+    _write_pid_file(room_slot_id, proc.pid, program_path, time.time() - offset)
+    return proc
+
+
+async def start_stream(
+    room_slot_id: str, program_path: str, offset: float = 0.0, priority: int = PRIORITY_PUBLIC,
+    deadline: float | None = None,
+) -> asyncio.subprocess.Process | None:
+    """
+    Relay a cached program render (see program_cache) into this room's HLS
+    directory in real time, under supervision.  The program is already AAC
+    in every rendition, so FFmpeg only remuxes (-c copy) — no per-room encode.
+
+    With offset > 0 (resuming a room after a restart) the relay seeks that
+    many seconds into the program and appends to the room's existing
+    playlists, so segment numbering continues and listeners stay in sync.
+
+    A new relay first waits for a relay slot (see encode_queue) at the given
+    priority.  If that wait runs past deadline
+    (epoch seconds — the caller has stopped waiting) nothing is started.
+    """
+    await _unsupervise(room_slot_id)
+    if room_slot_id not in RELAY_LEASES:
+        lease = await get_relay_queue().acquire(RELAY_COST, priority, f"relay {room_slot_id}")
+        if room_slot_id in RELAY_LEASES:   # started concurrently while we queued
+            lease.release()
+        elif deadline is not None and time.time() >= deadline:
+            lease.release()
+            logger.warning(f"Not starting stream for room {room_slot_id} — start request expired in the queue")
+            return None
+        else:
+            RELAY_LEASES[room_slot_id] = lease
+    try:
+        proc = await _spawn(room_slot_id, program_path, offset)
     except Exception as e:
         logger.error(f"Failed to start stream for room {room_slot_id}: {e}")
+        _release_lease(room_slot_id)
         return None
+    _supervise(room_slot_id, program_path, time.time() - offset)
+    logger.info(
+        f"Stream started for room {room_slot_id}, PID={proc.pid}, "
+        f"log={get_stream_dir(room_slot_id) / LOG_FILENAME}"
+    )
+    return proc
 
 
 async def stop_stream(room_slot_id: str) -> None:
+    adopt_stream(room_slot_id)  # a relay from a previous backend process
+    await _unsupervise(room_slot_id)
     proc = ACTIVE_STREAMS.pop(room_slot_id, None)
+    get_pid_path(room_slot_id).unlink(missing_ok=True)
+    get_segment_store().drop(room_slot_id)
+    _release_lease(room_slot_id)
     if proc:
-        proc.terminate()
-        try:
-            proc.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            proc.kill()
+        await _terminate(proc, timeout=5)
         logger.info(f"Stream stopped for room {room_slot_id}")
 
 
+def _release_lease(room_slot_id: str) -> None:
+    lease = RELAY_LEASES.pop(room_slot_id, None)
+    if lease:
+        lease.release()
+
+
 def is_stream_alive(room_slot_id: str) -> bool:
     proc = ACTIVE_STREAMS.get(room_slot_id)
-    return proc is not None and proc.poll() is None
+    return proc is not None and proc.returncode is None
+
+
+def get_stream_status(room_slot_id: str) -> dict | None:
+    """Supervisor view of a room's relay (None if it is not supervised)."""
+    state = SUPERVISED.get(room_slot_id)
+    if state is None:
+        return None
+    proc = ACTIVE_STREAMS.get(room_slot_id)
+    return {
+        "pid": proc.pid if proc else None,
+        "alive": is_stream_alive(room_slot_id),
+        "speed": state.speed,
+        "position": round(time.time() - state.origin, 1),
+        "out_time": round(state.out_time, 1),
+        "seconds_since_progress": round(time.monotonic() - state.last_progress, 1),
+        "restarts": len(state.restarts),
+        "log_tail": list(state.log_tail),
+    }
+
+
+# ── Manifest readiness ────────────────────────────────────────────────────────
+#
+# One watcher task serves every room waiting to go live: with watchfiles it
+# reacts to inotify events under HLS_OUTPUT_DIR (and re-checks once a second
+# to cover files written before the watch was set up); without it, it checks
+# all waiting rooms in a single loop.  It exits when nobody is waiting.  If
+# the watch breaks it falls back to polling; if the watcher itself fails,
+# every waiter is answered False at once rather than left to time out.
+
+_ready_waiters: dict[str, list[asyncio.Future]] = {}
+_ready_task: asyncio.Task | None = None
+
+
+def _manifest_ready(room_slot_id: str) -> bool:
+    """Master playlist written and the top rendition has a segment."""
+    master = get_m3u8_path(room_slot_id)
+    media = media_playlist_path(master, RENDITIONS[0].name, STREAM_PLAYLIST_PREFIX)
+    if is_memory_ingest():
+        store = get_segment_store()
+        return bool(store.get(room_slot_id, master.name)) and b"#EXTINF" in (store.get(room_slot_id, media.name) or b"")
+    try:
+        return master.stat().st_size > 50 and b"#EXTINF" in media.read_bytes()
+    except OSError:
+        return False
+
+
+def notify_ingest(room_slot_id: str) -> None:
+    """A relay published into memory — wake anyone waiting for the room."""
+    if room_slot_id in _ready_waiters:
+        _resolve_ready([room_slot_id])
+
+
+def _resolve_ready(rooms) -> None:
+    for room_slot_id in rooms:
+        if room_slot_id in _ready_waiters and _manifest_ready(room_slot_id):
+            for future in _ready_waiters.pop(room_slot_id):
+                if not future.done():
+                    future.set_result(True)
+
+
+def _fail_ready() -> None:
+    for futures in _ready_waiters.values():
+        for future in futures:
+            if not future.done():
+                future.set_result(False)
+    _ready_waiters.clear()
+
+
+def _changed_rooms(root: Path, changes) -> set[str]:
+    rooms = set()
+    for _, path in changes:
+        try:
+            rooms.add(Path(path).relative_to(root).parts[0])
+        except (ValueError, IndexError):
+            continue    # not under a room directory
+    return rooms
+
+
+async def _watch_ready() -> None:
+    global _ready_task
+    root = Path(settings.HLS_OUTPUT_DIR)
+    try:
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            awatch = None
+        if is_memory_ingest():
+            awatch = None     # nothing is written to disk; notify_ingest() wakes waiters
+        if awatch is not None:
+            # Every segment write in every room is an event — don't log each batch
+            logging.getLogger("watchfiles").setLevel(logging.WARNING)
+            try:
+                _resolve_ready(list(_ready_waiters))
+                async for changes in awatch(root, debounce=50, step=10, rust_timeout=1000, yield_on_timeout=True):
+                    if changes:
+                        rooms = _changed_rooms(root, changes)
+                    else:
+                        rooms = list(_ready_waiters)
+                    _resolve_ready(rooms)
+                    if not _ready_waiters:
+                        return
+            except OSError as e:   # e.g. inotify instance limit reached
+                logger.warning(f"Cannot watch {root} ({e}) — polling for stream readiness")
+            except Exception as e:
+                logger.error(f"Watching {root} failed: {e} — polling for stream readiness", exc_info=True)
+        while _ready_waiters:
+            _resolve_ready(list(_ready_waiters))
+            await asyncio.sleep(0.5)
+    except Exception as e:
+        logger.error(f"Stream readiness watcher failed: {e}", exc_info=True)
+        _fail_ready()
+    finally:
+        _ready_task = None
+
+
+async def wait_until_ready(room_slot_id: str, timeout: float = READY_TIMEOUT) -> bool:
+    """Wait until the room's HLS playlists have a first segment.  False on timeout."""
+    global _ready_task
+    if _manifest_ready(room_slot_id):
+        return True
+    future = asyncio.get_running_loop().create_future()
+    _ready_waiters.setdefault(room_slot_id, []).append(future)
+    if _ready_task is None:
+        _ready_task = asyncio.create_task(_watch_ready())
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        waiters = _ready_waiters.get(room_slot_id, [])
+        if future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del _ready_waiters[room_slot_id]
+
+
+# ── Supervisor ────────────────────────────────────────────────────────────────
+
+def _supervise(room_slot_id: str, program_path: str, origin: float, adopted: bool = False) -> None:
+    state = RelayState(room_slot_id, program_path, origin)
+    if adopted:
+        # Only the recent end of files written before we attached
+        room_dir = get_stream_dir(room_slot_id)
+        for attr, name in (("log_pos", LOG_FILENAME), ("progress_pos", PROGRESS_FILENAME)):
+            try:
+                setattr(state, attr, max(0, (room_dir / name).stat().st_size - 8192))
+            except FileNotFoundError:
+                pass
+    previous = SUPERVISED.pop(room_slot_id, None)
+    if previous and previous.task:
+        previous.task.cancel()
+    state.task = asyncio.create_task(_watch(state))
+    SUPERVISED[room_slot_id] = state
+
+
+async def _unsupervise(room_slot_id: str) -> None:
+    state = SUPERVISED.pop(room_slot_id, None)
+    if state and state.task and state.task is not asyncio.current_task():
+        state.task.cancel()
+
+
+def _read_new_lines(path: Path, pos: int) -> tuple[list[str], int]:
+    """Lines appended to path since byte pos (restarts at 0 if it was truncated)."""
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return [], 0
+    if size < pos:
+        pos = 0
+    if size == pos:
+        return [], pos
+    with open(path, "rb") as f:
+        f.seek(pos)
+        data = f.read()
+    # Leave an incomplete trailing line for the next read
+    cut = data.rfind(b"\n") + 1
+    return data[:cut].decode(errors="replace").splitlines(), pos + cut
+
+
+def _apply_progress(state: RelayState, lines: list[str]) -> None:
+    """Fold FFmpeg -progress key=value blocks into state."""
+    block: dict[str, str] = {}
+    for line in lines:
+        key, _, value = line.partition("=")
+        block[key.strip()] = value.strip()
+        if key != "progress":
+            continue
+        out_us = block.get("out_time_us") or block.get("out_time_ms")  # both are µs
+        if out_us and out_us.lstrip("-").isdigit():
+            out_time = int(out_us) / 1e6
+            if out_time > state.out_time:
+                state.out_time = out_time
+                state.last_progress = time.monotonic()
+        speed = block.get("speed", "").rstrip("x")
+        try:
+            state.speed = float(speed)
+        except ValueError:
+            pass
+        if value.strip() == "end":
+            state.finished = True
+        block = {}
+
+
+async def _watch(state: RelayState) -> None:
+    room_dir = get_stream_dir(state.room_slot_id)
+    while True:
+        await asyncio.sleep(WATCHDOG_INTERVAL)
+        try:
+            log_lines, state.log_pos = await asyncio.to_thread(
+                _read_new_lines, room_dir / LOG_FILENAME, state.log_pos,
+            )
+            state.log_tail.extend(log_lines)
+            progress_lines, state.progress_pos = await asyncio.to_thread(
+                _read_new_lines, room_dir / PROGRESS_FILENAME, state.progress_pos,
+            )
+            _apply_progress(state, progress_lines)
+
+            proc = ACTIVE_STREAMS.get(state.room_slot_id)
+            now = time.monotonic()
+            if proc is None or proc.returncode is not None:
+                code = proc.returncode if proc else None
+                if state.finished or code == 0:
+                    logger.info(f"Stream for room {state.room_slot_id} reached the end of the program")
+                    SUPERVISED.pop(state.room_slot_id, None)
+                    _release_lease(state.room_slot_id)
+                    return
+                reason = f"FFmpeg exited with code {code}"
+            elif now - state.last_progress > STALL_TIMEOUT:
+                reason = f"no progress for {now - state.last_progress:.0f}s"
+            elif state.speed is not None and state.speed < MIN_SPEED:
+                state.slow_since = state.slow_since or now
+                if now - state.slow_since <= SLOW_GRACE:
+                    continue
+                reason = f"running at {state.speed:.2f}x for {now - state.slow_since:.0f}s"
+            else:
+                state.slow_since = None
+                continue
+            if not await _restart(state, reason):
+                return      # gave up — the room is no longer supervised
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Stream watchdog error for room {state.room_slot_id}: {e}", exc_info=True)
+
+
+async def _restart(state: RelayState, reason: str) -> bool:
+    """
+    Respawn the relay at the room's current position, within the restart
+    budget.  False once the budget is spent: the supervisor gives up.
+    """
+    now = time.monotonic()
+    if len(state.restarts) == MAX_RESTARTS and now - state.restarts[0] < RESTART_WINDOW:
+        logger.error(
+            f"Stream for room {state.room_slot_id} unhealthy ({reason}) — "
+            f"{MAX_RESTARTS} restarts in {RESTART_WINDOW:.0f}s, giving up. "
+            f"Last log lines: {list(state.log_tail)[-5:]}"
+        )
+        SUPERVISED.pop(state.room_slot_id, None)
+        if not is_stream_alive(state.room_slot_id):
+            _release_lease(state.room_slot_id)
+        return False
+    state.restarts.append(now)
+    offset = max(time.time() - state.origin, 0.0)
+    logger.warning(f"Restarting stream for room {state.room_slot_id} at {offset:.0f}s: {reason}")
+    await _spawn(state.room_slot_id, state.program_path, offset)
+    state.out_time = 0.0
+    state.speed = None
+    state.slow_since = None
+    state.finished = False
+    state.last_progress = time.monotonic()
+    return True
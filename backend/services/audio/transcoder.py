@@ -0,0 +1,119 @@
+"""
+Offline normalisation of the audio library to gapless PCM.
+
+Every ayah and misc/silence clip is decoded once to 44.1 kHz stereo 16-bit
+PCM, stored losslessly as FLAC:
+
+    AUDIO_DIR/<reciter>/001/001.mp3   →   AUDIO_DIR/_flac/<reciter>/001/001.flac
+    AUDIO_DIR/misc/Salam.mp3          →   AUDIO_DIR/_flac/misc/Salam.flac
+
+FFmpeg's MP3 decoder drops the encoder delay and padding recorded in the
+LAME/Lavc tag, and FLAC adds none of its own, so each file holds exactly the
+recited samples.  With AUDIO_CODEC="flac" a program render concatenates these
+files sample-exactly and encodes the whole program once into every rendition
+— no per-file AAC priming frames, hence no gap or click at ayah boundaries,
+and no resampler to paper over MP3 timestamp gaps.  Cue sheets take entry
+durations from the FLAC STREAMINFO sample count (flac_duration).
+
+FLAC is roughly five times the size of the 128k MP3 library.
+
+Run via: python scripts/transcode_audio.py
+"""
+import logging
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from config import get_settings
+from services.audio.library import get_library
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PCM_DIRNAME = "_flac"
+PCM_SAMPLE_RATE = 44100
+CLIP_DIRS = ("misc", "silence")
+
+
+def get_pcm_root() -> Path:
+    return Path(settings.AUDIO_DIR) / PCM_DIRNAME
+
+
+def get_pcm_path(source: Path) -> Path:
+    """Decoded counterpart of a library MP3."""
+    rel = source.relative_to(Path(settings.AUDIO_DIR))
+    return get_pcm_root() / rel.with_suffix(".flac")
+
+
+def pcm_entries(entries: list[Path]) -> list[Path] | None:
+    """Map program entries to their FLAC files, or None if any is not transcoded."""
+    library = get_library()
+    mapped = [get_pcm_path(p) for p in entries]
+    missing = sum(1 for p in mapped if not library.exists(p))
+    if missing:
+        logger.warning(f"{missing} entries not transcoded — rendering from MP3")
+        return None
+    return mapped
+
+
+def flac_duration(path: Path) -> float:
+    """Duration of a FLAC file from its STREAMINFO block (sample rate, total samples)."""
+    with open(path, "rb") as f:
+        header = f.read(42)
+    if len(header) < 42 or header[:4] != b"fLaC":
+        raise ValueError(f"Not a FLAC file: {path}")
+    info = header[8:42]                 # STREAMINFO follows the 4-byte block header
+    rate = (info[10] << 12) | (info[11] << 4) | (info[12] >> 4)
+    samples = ((info[13] & 0x0F) << 32) | int.from_bytes(info[14:18], "big")
+    return samples / rate
+
+
+def _transcode_cmd(source: Path, output: Path) -> list[str]:
+    return [
+        "ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+        "-i", str(source),
+        "-vn", "-map_metadata", "-1",
+        "-c:a", "flac", "-sample_fmt", "s16", "-ar", str(PCM_SAMPLE_RATE), "-ac", "2",
+        "-f", "flac", str(output),
+    ]
+
+
+def transcode_file(source: Path, force: bool = False) -> bool:
+    """Transcode one MP3 unless an up-to-date FLAC exists.  Returns True if it ran."""
+    output = get_pcm_path(source)
+    if not force and output.exists() and output.stat().st_mtime_ns >= source.stat().st_mtime_ns:
+        return False
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+    result = subprocess.run(_transcode_cmd(source, tmp), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"Transcode failed for {source}: {result.stderr.decode(errors='replace').strip()}")
+    os.replace(tmp, output)
+    get_library().add(output)
+    return True
+
+
+def _sources(reciter: str | None) -> list[Path]:
+    root = Path(settings.AUDIO_DIR)
+    dirs = [root / d for d in CLIP_DIRS] if reciter is None else [root / reciter]
+    return sorted(p for d in dirs if d.is_dir() for p in d.rglob("*.mp3"))
+
+
+def transcode_library(reciter: str | None = None, workers: int | None = None, force: bool = False) -> tuple[int, int]:
+    """
+    Transcode a reciter's ayahs (or the misc/silence clips when reciter is
+    None) in parallel.  Returns (transcoded, failed).  Blocking.
+    """
+    sources = _sources(reciter)
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2) as pool:
+        futures = {pool.submit(transcode_file, s, force): s for s in sources}
+        for future, source in futures.items():
+            try:
+                done += future.result()
+            except RuntimeError as e:
+                logger.error(str(e))
+                failed += 1
+    logger.info(f"Transcoded {reciter or 'clips'}: {done} new, {len(sources) - done - failed} up to date, {failed} failed")
+    return done, failed
@@ -0,0 +1,420 @@
+"""
+Virtual live streams — time-shifted HLS manifests over a cached program.
+
+In STREAM_MODE="virtual" no FFmpeg process runs per room.  start_stream_job
+only records RoomSlot.started_at; every request for a room's stream.m3u8 is
+answered by slicing the pre-encoded program playlist (see program_cache) at
+the wall-clock position `now - started_at`.
+
+A segment is published once the live position reaches its start, and the
+playlist carries the last HLS_WINDOW_SEGMENTS published segments, so a
+late joiner hears the room from its current position exactly as with a real
+encoder.  Once the whole program has been published the playlist gets
+#EXT-X-ENDLIST.
+
+With HLS_LOW_LATENCY the playlists are LL-HLS: partial segments,
+EXT-X-PRELOAD-HINT and blocking reload (see the section below).
+
+Rakah cues from the program's cue sheet are embedded as EXT-X-DATERANGE
+timed metadata, anchored by EXT-X-PROGRAM-DATE-TIME.
+
+The room's stream.m3u8 is a static master playlist over stream_<r>.m3u8, one
+live playlist per rendition of the program ladder (see renditions).
+"""
+import math
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+from pathlib import Path
+from config import get_settings
+from services.audio.cue_sheet import load_cue_sheet
+from services.audio.renditions import media_playlist_path
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class ProgramPlaylist:
+    segment_uris: tuple[str, ...]
+    durations: tuple[float, ...]
+    starts: tuple[float, ...]       # cumulative start offset of each segment
+    target_duration: int
+    byteranges: tuple[tuple[int, int], ...] | None = None   # (length, offset) per segment
+    map_uri: str | None = None      # fMP4 init section (EXT-X-MAP)
+    map_byterange: str | None = None
+
+    @property
+    def total_duration(self) -> float:
+        return self.starts[-1] + self.durations[-1] if self.durations else 0.0
+
+
+@lru_cache(maxsize=256)
+def load_program_playlist(program_path: str) -> ProgramPlaylist:
+    """
+    Parse a rendered VOD program playlist.  Program directories are
+    content-addressed and never rewritten, so the parse is cached forever.
+    """
+    uris: list[str] = []
+    durations: list[float] = []
+    ranges: list[tuple[int, int]] = []
+    target = 0
+    pending: float | None = None
+    pending_range: tuple[int, int] | None = None
+    map_attrs: dict[str, str] = {}
+    next_offset = 0
+    for line in Path(program_path).read_text().splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-TARGETDURATION:"):
+            target = int(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF:"):
+            pending = float(line.split(":", 1)[1].split(",", 1)[0])
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            length, _, offset = line.split(":", 1)[1].partition("@")
+            start = int(offset) if offset else next_offset
+            pending_range = (int(length), start)
+            next_offset = start + int(length)
+        elif line.startswith("#EXT-X-MAP:"):
+            map_attrs = _parse_attrs(line.split(":", 1)[1])
+        elif line and not line.startswith("#") and pending is not None:
+            uris.append(line)
+            durations.append(pending)
+            if pending_range is not None:
+                ranges.append(pending_range)
+            pending = pending_range = None
+
+    starts = [0.0, *accumulate(durations)][:-1] if durations else []
+    return ProgramPlaylist(
+        segment_uris=tuple(uris),
+        durations=tuple(durations),
+        starts=tuple(starts),
+        target_duration=target or math.ceil(max(durations, default=6)),
+        byteranges=tuple(ranges) if len(ranges) == len(uris) and ranges else None,
+        map_uri=map_attrs.get("URI"),
+        map_byterange=map_attrs.get("BYTERANGE"),
+    )
+
+
+def _parse_attrs(value: str) -> dict[str, str]:
+    """Parse an HLS attribute list (KEY=VALUE,KEY="quoted,value")."""
+    return {k: v.strip('"') for k, v in re.findall(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)', value)}
+
+
+def published_segment_count(program: ProgramPlaylist, elapsed: float) -> int:
+    """Number of segments whose start the live position has reached."""
+    if elapsed < 0:
+        return 0
+    return bisect_right(program.starts, elapsed)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _daterange_lines(program_path: str, started_at: datetime, window_start: float, window_end: float) -> list[str]:
+    """EXT-X-DATERANGE tags for the cues that start inside the playlist window."""
+    sheet = load_cue_sheet(program_path)
+    if not sheet:
+        return []
+    lines = []
+    for n, cue in enumerate(sheet["cues"]):
+        if window_start <= cue["offset"] < window_end:
+            start = started_at + timedelta(seconds=cue["offset"])
+            lines.append(
+                f'#EXT-X-DATERANGE:ID="cue-{n}",CLASS="live.tarteel.cue",'
+                f'START-DATE="{_iso(start)}",X-KIND="{cue["kind"]}",X-RAKAH={cue["rakah"]}'
+            )
+    return lines
+
+
+def _map_line(program: ProgramPlaylist, segment_prefix: str) -> list[str]:
+    if not program.map_uri:
+        return []
+    byterange = f',BYTERANGE="{program.map_byterange}"' if program.map_byterange else ""
+    return [f'#EXT-X-MAP:URI="{segment_prefix}{program.map_uri}"{byterange}']
+
+
+# ── Delta updates ─────────────────────────────────────────────────────────────
+#
+# Live playlists advertise CAN-SKIP-UNTIL (the spec minimum of six target
+# durations); a client reloading with _HLS_skip=YES gets the older part of the
+# window as a single EXT-X-SKIP tag instead of re-downloading it.  The
+# playlists of FFmpeg relays get the same treatment in add_delta_updates.
+
+SKIP_UNTIL_TARGETS = 6
+
+
+@dataclass
+class _Segment:
+    start: float            # program offset
+    duration: float
+    lines: list[str]        # EXT-X-PART / EXTINF / BYTERANGE / URI lines
+
+
+def _assemble(
+    program: ProgramPlaylist,
+    program_path: str,
+    started_at: datetime,
+    segment_prefix: str,
+    first_msn: int,
+    target: int,
+    segments: list[_Segment],
+    header: list[str],
+    trailer: list[str],
+    ended: bool,
+    skip: bool,
+) -> str:
+    """
+    Join header, window and trailer into a media playlist.  With skip (the
+    client sent _HLS_skip=YES) the segments older than CAN-SKIP-UNTIL are
+    replaced by one EXT-X-SKIP tag.
+    """
+    skip_until = SKIP_UNTIL_TARGETS * target
+
+    skipped = 0
+    if skip and segments and not ended:
+        window_end = segments[-1].start + segments[-1].duration
+        while skipped < len(segments) and segments[skipped].start + segments[skipped].duration < window_end - skip_until:
+            skipped += 1
+
+    ll = any(line.startswith("#EXT-X-PART-INF") for line in header)
+    version = 9 if skipped or ll else (7 if program.map_uri else 3)
+    lines = [
+        "#EXTM3U",
+        f"#EXT-X-VERSION:{version}",
+        f"#EXT-X-TARGETDURATION:{target}",
+        *header,
+        f"#EXT-X-MEDIA-SEQUENCE:{first_msn}",
+        *_map_line(program, segment_prefix),
+    ]
+    if segments:
+        window_start = segments[0].start
+        window_end = segments[-1].start + segments[-1].duration
+        lines.extend(_daterange_lines(program_path, started_at, window_start, window_end))
+    if skipped:
+        lines.append(f"#EXT-X-SKIP:SKIPPED-SEGMENTS={skipped}")
+    if len(segments) > skipped:
+        pdt = started_at + timedelta(seconds=segments[skipped].start)
+        lines.append(f"#EXT-X-PROGRAM-DATE-TIME:{_iso(pdt)}")
+    for segment in segments[skipped:]:
+        lines.extend(segment.lines)
+    lines.extend(trailer)
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def render_live_playlist(
+    program_path: str,
+    started_at: datetime,
+    now: datetime,
+    segment_prefix: str,
+    rendition: str,
+    full: bool = False,
+    skip: bool = False,
+) -> str:
+    """
+    Build the live playlist of one rendition for a room that started at
+    started_at.  segment_prefix is prepended to each program segment URI
+    (relative to the room's playlists).
+
+    The live playlist is a sliding window of HLS_WINDOW_SEGMENTS segments
+    that supports delta updates (skip); with full it lists every segment
+    published so far instead, for catch-up.
+    """
+    program = load_program_playlist(str(media_playlist_path(program_path, rendition)))
+    if settings.HLS_LOW_LATENCY and program.byteranges:
+        return _render_ll_playlist(program, program_path, started_at, now, segment_prefix, full, skip)
+
+    elapsed = (now - started_at).total_seconds()
+    published = published_segment_count(program, elapsed)
+    first = 0 if full else max(0, published - settings.HLS_WINDOW_SEGMENTS)
+
+    segments = []
+    for i in range(first, published):
+        lines = [f"#EXTINF:{program.durations[i]:.6f},"]
+        if program.byteranges:
+            length, offset = program.byteranges[i]
+            lines.append(f"#EXT-X-BYTERANGE:{length}@{offset}")
+        lines.append(f"{segment_prefix}{program.segment_uris[i]}")
+        segments.append(_Segment(program.starts[i], program.durations[i], lines))
+
+    ended = published >= len(program.segment_uris)
+    header = [] if full else [f"#EXT-X-SERVER-CONTROL:CAN-SKIP-UNTIL={SKIP_UNTIL_TARGETS * program.target_duration:.1f}"]
+    return _assemble(
+        program, program_path, started_at, segment_prefix, first, program.target_duration,
+        segments, header, [], ended, skip,
+    )
+
+
+def add_delta_updates(playlist: str, skip: bool) -> str:
+    """
+    Advertise CAN-SKIP-UNTIL in a live media playlist written by an FFmpeg
+    relay and, with skip, replace its older segments by EXT-X-SKIP — the
+    relay equivalent of render_live_playlist's delta updates.  A segment
+    that starts a discontinuity is never skipped, so the client's
+    discontinuity count stays right.
+    """
+    header: list[str] = []
+    segments: list[_Segment] = []
+    pending: list[str] = []
+    duration = 0.0
+    target = 0
+    ended = False
+    for line in playlist.splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#EXT-X-VERSION:", "#EXT-X-SERVER-CONTROL:")):
+            continue
+        if line == "#EXT-X-ENDLIST":
+            ended = True
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            target = int(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF:"):
+            duration = float(line.split(":", 1)[1].split(",", 1)[0])
+            pending.append(line)
+        elif line.startswith(("#EXT-X-DISCONTINUITY", "#EXT-X-PROGRAM-DATE-TIME:", "#EXT-X-BYTERANGE:")) \
+                and not line.startswith("#EXT-X-DISCONTINUITY-SEQUENCE:"):
+            pending.append(line)
+        elif not line.startswith("#"):
+            start = segments[-1].start + segments[-1].duration if segments else 0.0
+            segments.append(_Segment(start, duration, [*pending, line]))
+            pending, duration = [], 0.0
+        elif line != "#EXTM3U":
+            header.append(line)
+
+    skipped = 0
+    if skip and segments and not ended:
+        window_end = segments[-1].start + segments[-1].duration
+        while (
+            skipped < len(segments)
+            and "#EXT-X-DISCONTINUITY" not in segments[skipped].lines
+            and segments[skipped].start + segments[skipped].duration < window_end - SKIP_UNTIL_TARGETS * target
+        ):
+            skipped += 1
+
+    lines = [
+        "#EXTM3U",
+        f"#EXT-X-VERSION:{9 if skipped else 3}",
+        f"#EXT-X-TARGETDURATION:{target}",
+        *(h for h in header if not h.startswith("#EXT-X-TARGETDURATION:")),
+    ]
+    if not ended:
+        lines.append(f"#EXT-X-SERVER-CONTROL:CAN-SKIP-UNTIL={SKIP_UNTIL_TARGETS * target:.1f}")
+    if skipped:
+        lines.append(f"#EXT-X-SKIP:SKIPPED-SEGMENTS={skipped}")
+    for segment in segments[skipped:]:
+        lines.extend(segment.lines)
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+# ── Low-latency HLS ───────────────────────────────────────────────────────────
+#
+# With HLS_LOW_LATENCY the program is rendered as fMP4 in ~1 s chunks, all in
+# one file per rendition (-hls_flags single_file), and each chunk becomes an
+# LL-HLS partial segment.  LL_PARTS_PER_SEGMENT consecutive chunks form one
+# full segment — they are contiguous in the file, so the segment is simply
+# the byte range spanning its parts.
+
+LL_PARTS_PER_SEGMENT = 4
+LL_PART_SEGMENTS = 3        # trailing segments that still advertise their parts
+
+
+def _part_range(program: ProgramPlaylist, first: int, last: int) -> tuple[int, int]:
+    """(length, offset) covering parts first..last-1."""
+    offset = program.byteranges[first][1]
+    end_len, end_off = program.byteranges[last - 1]
+    return end_off + end_len - offset, offset
+
+
+def ll_segment_count(program: ProgramPlaylist) -> int:
+    return math.ceil(len(program.segment_uris) / LL_PARTS_PER_SEGMENT)
+
+
+def ll_last_msn(program_path: str, rendition: str, elapsed: float) -> int:
+    """Media sequence number of the last complete segment at elapsed (-1 if none)."""
+    program = load_program_playlist(str(media_playlist_path(program_path, rendition)))
+    parts = published_segment_count(program, elapsed)
+    if parts >= len(program.segment_uris):
+        return ll_segment_count(program) - 1
+    return parts // LL_PARTS_PER_SEGMENT - 1
+
+
+def ll_publish_offset(program_path: str, rendition: str, msn: int, part: int | None) -> float | None:
+    """
+    Program offset at which segment msn (or its part `part`) is published,
+    for blocking playlist reload.  None if it is past the end of the program.
+    """
+    program = load_program_playlist(str(media_playlist_path(program_path, rendition)))
+    first = msn * LL_PARTS_PER_SEGMENT
+    last = min(first + LL_PARTS_PER_SEGMENT, len(program.segment_uris))
+    index = last - 1 if part is None else first + part
+    if index >= len(program.starts):
+        return None
+    return program.starts[index]
+
+
+def _render_ll_playlist(
+    program: ProgramPlaylist,
+    program_path: str,
+    started_at: datetime,
+    now: datetime,
+    segment_prefix: str,
+    full: bool,
+    skip: bool,
+) -> str:
+    n = LL_PARTS_PER_SEGMENT
+    total_parts = len(program.segment_uris)
+    elapsed = (now - started_at).total_seconds()
+    parts = published_segment_count(program, elapsed)
+    ended = parts >= total_parts
+    complete = ll_segment_count(program) if ended else parts // n
+    first = 0 if full else max(0, complete - settings.HLS_WINDOW_SEGMENTS)
+    part_target = max(program.durations, default=1.0)
+
+    def part_lines(lo: int, hi: int) -> list[str]:
+        out = []
+        for i in range(lo, hi):
+            length, offset = program.byteranges[i]
+            out.append(
+                f'#EXT-X-PART:DURATION={program.durations[i]:.6f},'
+                f'URI="{segment_prefix}{program.segment_uris[i]}",'
+                f'BYTERANGE="{length}@{offset}",INDEPENDENT=YES'
+            )
+        return out
+
+    segments = []
+    for k in range(first, complete):
+        lo, hi = k * n, min((k + 1) * n, total_parts)
+        duration = sum(program.durations[lo:hi])
+        lines = part_lines(lo, hi) if not ended and k >= complete - LL_PART_SEGMENTS else []
+        length, offset = _part_range(program, lo, hi)
+        lines += [
+            f"#EXTINF:{duration:.6f},",
+            f"#EXT-X-BYTERANGE:{length}@{offset}",
+            f"{segment_prefix}{program.segment_uris[lo]}",
+        ]
+        segments.append(_Segment(program.starts[lo], duration, lines))
+
+    trailer = []
+    if not ended:
+        # Parts of the segment in progress, then a hint for the next one
+        trailer = part_lines(complete * n, parts)
+        length, offset = program.byteranges[parts]
+        trailer.append(
+            f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="{segment_prefix}{program.segment_uris[parts]}",'
+            f"BYTERANGE-START={offset},BYTERANGE-LENGTH={length}"
+        )
+
+    target = math.ceil(part_target * n)
+    server_control = f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK={3 * part_target:.3f}"
+    if not full:
+        server_control += f",CAN-SKIP-UNTIL={SKIP_UNTIL_TARGETS * target:.1f}"
+    header = [server_control, f"#EXT-X-PART-INF:PART-TARGET={part_target:.3f}"]
+    return _assemble(
+        program, program_path, started_at, segment_prefix, first, target,
+        segments, header, trailer, ended, skip,
+    )
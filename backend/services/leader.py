@@ -0,0 +1,157 @@
+"""
+Redis lease-based leader election.
+
+Every backend process (uvicorn worker or container) runs an election loop;
+the one holding the lease key runs the role — the APScheduler instance that
+creates rooms, sends reminders and starts/stops streams — so the API can
+scale out without jobs firing once per process.
+
+    SET <key> <node_id> NX PX <ttl>     acquire (only if nobody holds it)
+    PEXPIRE if the value is still ours  renew, every RENEW_INTERVAL
+    DEL if the value is still ours      release on shutdown
+
+A leader never waits on Redis past SAFETY_MARGIN before its lease could
+expire: each renew is bounded by what is left of the lease, and once that
+is used up it steps down without asking — whether the renew failed, hung
+or was refused — so two leaders never overlap.  The on_elected hook runs
+in the background, so a slow start-up cannot hold up renewals; it is
+cancelled on step-down.  Failover takes at most LEASE_TTL after a crash
+and about FOLLOWER_POLL after a clean shutdown.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+LEASE_TTL      = 15.0
+RENEW_INTERVAL = 5.0
+FOLLOWER_POLL  = 2.0
+SAFETY_MARGIN  = 2.0        # step down this long before the lease could expire
+
+_RENEW_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+Hook = Callable[[], Awaitable[None]]
+
+
+class LeaderElection:
+    def __init__(
+        self,
+        role: str,
+        on_elected: Hook,
+        on_demoted: Hook,
+        on_renewed: Hook | None = None,
+    ):
+        self.role = role
+        self.key = f"tarteel:leader:{role}"
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._on_renewed = on_renewed
+        self._lease_until = 0.0
+        self._elected_task: asyncio.Task | None = None
+
+    def _budget(self) -> float:
+        """How long the leader may still wait on Redis."""
+        return min(RENEW_INTERVAL, self._lease_until - time.monotonic() - SAFETY_MARGIN)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if self.is_leader:
+                    await self._renew()
+                else:
+                    await self._try_acquire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Leader election ({self.role}) error: {e!r}")
+            if self.is_leader and self._budget() <= 0:
+                # Not renewed in time — another node may take over soon
+                await self._demote("lease could not be renewed")
+            if self.is_leader:
+                await asyncio.sleep(max(self._budget(), 0.0))
+            else:
+                await asyncio.sleep(FOLLOWER_POLL)
+
+    async def _try_acquire(self) -> None:
+        redis = await get_redis()
+        started = time.monotonic()
+        acquired = await asyncio.wait_for(
+            redis.set(self.key, self.node_id, nx=True, px=int(LEASE_TTL * 1000)), RENEW_INTERVAL,
+        )
+        if acquired:
+            self._lease_until = started + LEASE_TTL
+            self.is_leader = True
+            logger.info(f"Elected {self.role} leader ({self.node_id})")
+            self._elected_task = asyncio.create_task(self._run_elected())
+
+    async def _run_elected(self) -> None:
+        try:
+            await self._on_elected()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"{self.role} leader start-up failed: {e}", exc_info=True)
+
+    async def _renew(self) -> None:
+        budget = self._budget()
+        if budget <= 0:
+            return      # too late to ask — run() steps down
+        redis = await get_redis()
+        started = time.monotonic()
+        renewed = await asyncio.wait_for(
+            redis.eval(_RENEW_SCRIPT, 1, self.key, self.node_id, int(LEASE_TTL * 1000)), budget,
+        )
+        if renewed:
+            self._lease_until = started + LEASE_TTL
+            if self._on_renewed:
+                await asyncio.wait_for(self._on_renewed(), self._budget())
+        else:
+            await self._demote("lease lost")
+
+    async def _stop_elected(self) -> None:
+        task, self._elected_task = self._elected_task, None
+        if task and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _demote(self, reason: str) -> None:
+        self.is_leader = False
+        logger.warning(f"Stepping down as {self.role} leader ({self.node_id}): {reason}")
+        await self._stop_elected()
+        await self._on_demoted()
+
+    async def release(self) -> None:
+        """Give up the lease (on shutdown) so a follower takes over quickly."""
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        await self._stop_elected()
+        try:
+            redis = await get_redis()
+            await asyncio.wait_for(redis.eval(_RELEASE_SCRIPT, 1, self.key, self.node_id), RENEW_INTERVAL)
+        except Exception as e:
+            logger.warning(f"Could not release {self.role} lease: {e}")
+        await self._on_demoted()
+
+    async def current_leader(self) -> str | None:
+        redis = await get_redis()
+        return await redis.get(self.key)
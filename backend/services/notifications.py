@@ -10,6 +10,8 @@ from config import get_settings
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Rough room lengths in minutes, used when the program length is not known
+# (no duration index for the reciter yet).
 ROOM_DURATION = {
     (8, 1.0): 45,
     (8, 0.5): 25,
@@ -18,6 +20,14 @@ ROOM_DURATION = {
 }
 
 
+def _room_duration_minutes(room_slot) -> int:
+    from services.audio.program_cache import ProgramKey, get_program_duration
+    seconds = get_program_duration(ProgramKey.for_slot(room_slot))
+    if seconds is not None:
+        return round(seconds / 60)
+    return ROOM_DURATION.get((room_slot.rakats, room_slot.juz_per_night), 60)
+
+
 def _e164(phone: str) -> str:
     """Ensure phone is in E.164 format: +<digits> with no spaces."""
     phone = phone.strip()
@@ -27,7 +37,7 @@ def _e164(phone: str) -> str:
 
 
 def _build_message(user_name: str, room_slot, join_url: str, minutes_before: int = 20) -> str:
-    duration = ROOM_DURATION.get((room_slot.rakats, room_slot.juz_per_night), 60)
+    duration = _room_duration_minutes(room_slot)
     juz_label = f"Juz {room_slot.juz_number}"
     if room_slot.juz_half == 1:
         juz_label += " (first half)"
@@ -53,7 +63,8 @@ async def send_whatsapp_reminder(user, room_slot, minutes_before: int = 20) -> b
     try:
         from twilio.rest import Client
         join_url = f"{settings.FRONTEND_URL}/room/{room_slot.id}"
-        msg = _build_message(user.name, room_slot, join_url, minutes_before)
+        # The room length may need a duration prediction — keep it off the event loop
+        msg = await asyncio.to_thread(_build_message, user.name, room_slot, join_url, minutes_before)
         to_number = f"whatsapp:{_e164(user.phone)}"
         client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
         # Run synchronous Twilio SDK call in a thread to avoid blocking the event loop
@@ -71,7 +82,7 @@ async def send_whatsapp_reminder(user, room_slot, minutes_before: int = 20) -> b
 
 def _build_html_email(user_name: str, room_slot, join_url: str, minutes_before: int) -> str:
     """Build a clean HTML email body."""
-    duration = ROOM_DURATION.get((room_slot.rakats, room_slot.juz_per_night), 60)
+    duration = _room_duration_minutes(room_slot)
     juz_label = f"Juz {room_slot.juz_number}"
     if room_slot.juz_half == 1:
         juz_label += " (first half)"
@@ -151,7 +162,7 @@ async def send_email_reminder(user, room_slot, minutes_before: int = 20) -> bool
         try:
             import sendgrid
             from sendgrid.helpers.mail import Mail
-            plain = _build_message(user.name, room_slot, join_url, minutes_before)
+            plain = await asyncio.to_thread(_build_message, user.name, room_slot, join_url, minutes_before)
             sg   = sendgrid.SendGridAPIClient(api_key=settings.SENDGRID_API_KEY)
             mail = Mail(from_email=settings.SENDGRID_FROM_EMAIL, to_emails=user.email,
                         subject=subject, plain_text_content=plain)
@@ -164,7 +175,7 @@ async def send_email_reminder(user, room_slot, minutes_before: int = 20) -> bool
     # ── Option 2: Gmail SMTP ──────────────────────────────────────────────
     if settings.GMAIL_USER and settings.GMAIL_APP_PASSWORD:
         try:
-            plain = _build_message(user.name, room_slot, join_url, minutes_before)
+            plain = await asyncio.to_thread(_build_message, user.name, room_slot, join_url, minutes_before)
             await asyncio.to_thread(
                 _send_via_gmail_smtp,
                 settings.GMAIL_USER, settings.GMAIL_APP_PASSWORD,
@@ -178,7 +189,7 @@ async def send_email_reminder(user, room_slot, minutes_before: int = 20) -> bool
     # ── Option 3: Brevo SMTP ─────────────────────────────────────────────
     if settings.BREVO_SMTP_USER and settings.BREVO_SMTP_KEY and settings.BREVO_FROM_EMAIL:
         try:
-            plain = _build_message(user.name, room_slot, join_url, minutes_before)
+            plain = await asyncio.to_thread(_build_message, user.name, room_slot, join_url, minutes_before)
             def _send():
                 msg = MIMEText(plain, "plain")
                 msg["Subject"] = subject
@@ -2,34 +2,156 @@ import asyncio
 import logging
 import uuid
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from apscheduler.events import EVENT_JOB_ADDED, EVENT_JOB_MODIFIED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlalchemy import select
+from apscheduler.schedulers.base import STATE_PAUSED, STATE_RUNNING, STATE_STOPPED
+from sqlalchemy import select, text, and_, or_, exists
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from config import get_settings
 from database import AsyncSessionLocal
+from redis_client import get_redis
 from models import RoomSlot, User, UserIshaSchedule, NotificationLog
 from services.notifications import send_whatsapp_reminder, send_email_reminder
-from services.audio.playlist_builder import build_concat_file
-from services.audio.stream_manager import start_stream, stop_stream, get_stream_url, get_m3u8_path
+from services.audio.program_cache import ProgramKey, program_duration
+from services.audio.encode_queue import priority_for_slot
+from services.audio.retention import retention_job, RETENTION_INTERVAL_MINUTES
+from services.audio.stream_manager import get_stream_url, is_virtual_mode
+from services.stream_control import (
+    start_room_stream, stop_room_stream, is_room_streaming, render_program_for,
+)
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-scheduler = AsyncIOScheduler(timezone="UTC")
+# How late a job may still run after downtime (seconds; None = always run).
+# Builds and cleanups are idempotent and status-checked, so they always run;
+# a reminder or a room start that is too late is skipped.
+JOB_DEFAULTS = {"coalesce": True, "max_instances": 1, "misfire_grace_time": 300}
+BUILD_MISFIRE_GRACE   = None
+NOTIFY_MISFIRE_GRACE  = 120
+START_MISFIRE_GRACE   = 600
+CLEANUP_MISFIRE_GRACE = None
 
-_scheduler_enabled: bool = True
+# Reminder waves: one job per distinct minute, shared by every room due then
+NOTIFY_MINUTES     = (10, 15, 20, 30)
+NOTIFY_CONCURRENCY = 20     # reminders in flight at once
+NOTIFY_STATUSES    = ("scheduled", "building")   # rooms that have not started yet
 
 
-def set_scheduler_enabled(enabled: bool) -> None:
-    global _scheduler_enabled
-    _scheduler_enabled = enabled
-    if enabled:
+def _jobstores() -> dict:
+    """
+    Jobs persist in Redis (SCHEDULER_JOBSTORE="redis"), so a restarted backend
+    picks up every room's build/notify/start/cleanup jobs where it left off
+    instead of recomputing them.
+    """
+    if settings.SCHEDULER_JOBSTORE != "redis":
+        return {}
+    from apscheduler.jobstores.redis import RedisJobStore
+    from redis.connection import parse_url
+    return {"default": RedisJobStore(
+        jobs_key="tarteel:apscheduler.jobs",
+        run_times_key="tarteel:apscheduler.run_times",
+        **parse_url(settings.REDIS_URL),
+    )}
+
+
+scheduler = AsyncIOScheduler(timezone="UTC", jobstores=_jobstores(), job_defaults=JOB_DEFAULTS)
+
+# ── Leadership ────────────────────────────────────────────────────────────────
+# Every process starts the scheduler paused, so API handlers on any node can
+# add jobs to the shared job store; only the elected leader (see
+# services.leader) resumes it and runs them.  The admin on/off switch is
+# shared through Redis and applied by the leader.
+#
+# The leader only re-reads the job store when its own next wakeup is due, so
+# a follower that adds or moves a job publishes on SCHEDULER_WAKEUP_CHANNEL
+# and the leader wakes its scheduler to pick the job up right away.
+
+SCHEDULER_ENABLED_KEY    = "tarteel:scheduler:enabled"
+SCHEDULER_WAKEUP_CHANNEL = "tarteel:scheduler:wakeup"
+
+_is_leader: bool = False
+_nudge_task: asyncio.Task | None = None
+
+
+async def set_scheduler_enabled(enabled: bool) -> None:
+    redis = await get_redis()
+    await redis.set(SCHEDULER_ENABLED_KEY, "1" if enabled else "0")
+    await sync_scheduler_enabled()
+
+
+async def is_scheduler_enabled() -> bool:
+    redis = await get_redis()
+    return await redis.get(SCHEDULER_ENABLED_KEY) != "0"
+
+
+async def sync_scheduler_enabled() -> None:
+    """Run jobs only on the leader, and only while the admin switch is on."""
+    run = _is_leader and await is_scheduler_enabled()
+    if run and scheduler.state == STATE_PAUSED:
         scheduler.resume()
-    else:
+    elif not run and scheduler.state == STATE_RUNNING:
         scheduler.pause()
 
 
-def is_scheduler_enabled() -> bool:
-    return _scheduler_enabled
+async def become_scheduler_leader() -> None:
+    global _is_leader
+    _is_leader = True
+    _add_leader_jobs()
+    await sync_scheduler_enabled()
+    logger.info("Scheduler running on this node")
+
+
+async def step_down_scheduler() -> None:
+    global _is_leader
+    _is_leader = False
+    await sync_scheduler_enabled()
+    logger.info("Scheduler paused on this node — another node is leader")
+
+
+async def _nudge_leader() -> None:
+    # Yield once so a handler adding several jobs sends a single message
+    await asyncio.sleep(0)
+    try:
+        redis = await get_redis()
+        await redis.publish(SCHEDULER_WAKEUP_CHANNEL, "1")
+    except Exception as e:
+        logger.warning(f"Could not wake the scheduler leader: {e}")
+
+
+def _on_job_stored(event) -> None:
+    """Job added or modified on a follower — tell the leader to re-read the store."""
+    global _nudge_task
+    if _is_leader or (_nudge_task and not _nudge_task.done()):
+        return
+    try:
+        _nudge_task = asyncio.get_running_loop().create_task(_nudge_leader())
+    except RuntimeError:
+        pass  # no event loop (scripts) — nobody is waiting on this node
+
+
+async def watch_scheduler_wakeups() -> None:
+    """Wake the local scheduler whenever a follower has stored a job."""
+    while True:
+        pubsub = None
+        try:
+            redis = await get_redis()
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(SCHEDULER_WAKEUP_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message" and _is_leader and scheduler.state == STATE_RUNNING:
+                    scheduler.wakeup()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Scheduler wakeup listener error: {e}")
+        finally:
+            if pubsub is not None:
+                await pubsub.aclose()
+        await asyncio.sleep(2)
+
 
 ROOM_TYPES = [
     {"rakats": 8,  "juz_per_night": 1.0},
@@ -47,11 +169,23 @@ RAKATS_START_DELAY: dict[int, int] = {
 }
 
 
+# Fallback room lifetime when the program length is unknown (no duration index)
+DEFAULT_CLEANUP_AFTER = timedelta(hours=3)
+# Slack after the predicted end of the program before cleanup runs
+CLEANUP_MARGIN = timedelta(minutes=30)
+
+
 def _get_stream_start(slot: "RoomSlot") -> datetime:
     delay = RAKATS_START_DELAY.get(slot.rakats, 30)
     return slot.isha_bucket_utc + timedelta(minutes=delay)
 
 
+def _get_cleanup_time(slot: "RoomSlot", duration: float | None) -> datetime:
+    if duration is None:
+        return _get_stream_start(slot) + DEFAULT_CLEANUP_AFTER
+    return _get_stream_start(slot) + timedelta(seconds=duration) + CLEANUP_MARGIN
+
+
 def _get_ramadan_start() -> datetime:
     from datetime import date
     parts = settings.RAMADAN_START_DATE.split("-")
@@ -77,8 +211,18 @@ def _get_juz_for_night(night: int, juz_per_night: float) -> tuple[int, int | Non
     return juz_number, juz_half
 
 
+# Rows per INSERT — keeps a statement well under PostgreSQL's bind-parameter limit
+_ROOM_INSERT_CHUNK = 2000
+
+
 async def daily_room_creation() -> None:
-    """Create room_slot rows for all upcoming Isha buckets in the next 30 hours."""
+    """
+    Create room_slot rows for all upcoming Isha buckets in the next 30 hours.
+
+    One query finds the buckets and one set-based INSERT ... ON CONFLICT DO
+    NOTHING (on uq_room_slots_public_identity) creates the missing rooms;
+    jobs are scheduled only for the rows it returns.
+    """
     now = datetime.now(timezone.utc)
     window_end = now + timedelta(hours=30)
     async with AsyncSessionLocal() as db:
@@ -92,82 +236,91 @@ async def daily_room_creation() -> None:
         )
         buckets = result.all()
 
+        rows = []
         for bucket_utc, night in buckets:
             if night is None:
                 continue
             for room_type in ROOM_TYPES:
-                rakats = room_type["rakats"]
-                jpn = room_type["juz_per_night"]
-                juz_num, juz_half = _get_juz_for_night(night, jpn)
-
-                existing = await db.execute(
-                    select(RoomSlot).where(
-                        RoomSlot.isha_bucket_utc == bucket_utc,
-                        RoomSlot.rakats == rakats,
-                        RoomSlot.juz_per_night == jpn,
-                        RoomSlot.reciter == settings.DEFAULT_RECITER,
-                        RoomSlot.is_private == False,   # noqa: E712
-                    )
-                )
-                if existing.scalar_one_or_none():
-                    continue
-
-                slot = RoomSlot(
-                    isha_bucket_utc=bucket_utc,
-                    ramadan_night=night,
-                    rakats=rakats,
-                    juz_per_night=jpn,
-                    juz_number=juz_num,
-                    juz_half=juz_half,
-                    reciter=settings.DEFAULT_RECITER,
-                    status="scheduled",
+                juz_num, juz_half = _get_juz_for_night(night, room_type["juz_per_night"])
+                rows.append({
+                    "id": uuid.uuid4(),
+                    "isha_bucket_utc": bucket_utc,
+                    "ramadan_night": night,
+                    "rakats": room_type["rakats"],
+                    "juz_per_night": room_type["juz_per_night"],
+                    "juz_number": juz_num,
+                    "juz_half": juz_half,
+                    "reciter": settings.DEFAULT_RECITER,
+                    "status": "scheduled",
+                    "is_private": False,
+                })
+
+        created: list[RoomSlot] = []
+        for i in range(0, len(rows), _ROOM_INSERT_CHUNK):
+            stmt = (
+                pg_insert(RoomSlot)
+                .values(rows[i:i + _ROOM_INSERT_CHUNK])
+                .on_conflict_do_nothing(
+                    index_elements=["isha_bucket_utc", "rakats", "juz_per_night", "reciter"],
+                    index_where=text("NOT is_private AND ramadan_night > 0"),
                 )
-                db.add(slot)
-                await db.flush()
-                _schedule_room_jobs(slot)
-
+                .returning(RoomSlot)
+            )
+            created += (await db.scalars(stmt)).all()
         await db.commit()
-    logger.info("daily_room_creation complete")
+
+    for slot in created:
+        _schedule_room_jobs(slot, await program_duration(ProgramKey.for_slot(slot)))
+    logger.info(f"daily_room_creation complete — {len(created)} new rooms in {len(buckets)} buckets")
 
 
-def _schedule_room_jobs(slot: RoomSlot) -> None:
-    """Schedule playlist build, notification, stream start, and cleanup jobs for a slot."""
+def _schedule_room_jobs(slot: RoomSlot, duration: float | None) -> None:
+    """Schedule playlist build, notification, stream start, and cleanup jobs for a
+    slot.  duration is the program length (see program_duration), None if unknown."""
     slot_id      = str(slot.id)
     stream_start = _get_stream_start(slot)
     build_time   = stream_start - timedelta(minutes=90)
-    cleanup_time = stream_start + timedelta(hours=3)
+    cleanup_time = _get_cleanup_time(slot, duration)
     now          = datetime.now(timezone.utc)
 
     if build_time > now:
         scheduler.add_job(build_playlist_job, "date", run_date=build_time,
-                          args=[slot_id], id=f"build_{slot_id}", replace_existing=True)
-
-    # Notify at 30/20/15/10 min before the stream starts (not before isha)
-    for mins in (10, 15, 20, 30):
-        notify_time = stream_start - timedelta(minutes=mins)
-        if notify_time > now:
+                          args=[slot_id], id=f"build_{slot_id}", replace_existing=True,
+                          misfire_grace_time=BUILD_MISFIRE_GRACE)
+
+    # Notify at 30/20/15/10 min before the stream starts (not before isha).
+    # Rooms due in the same minute share one wave job, so re-adding is a no-op.
+    for mins in NOTIFY_MINUTES:
+        wave_at = (stream_start - timedelta(minutes=mins)).replace(second=0, microsecond=0)
+        if wave_at > now:
             scheduler.add_job(
-                send_notifications_job, "date",
-                run_date=notify_time,
-                args=[slot_id, mins],
-                id=f"notify_{slot_id}_{mins}",
+                send_notification_wave, "date",
+                run_date=wave_at,
+                args=[wave_at],
+                id=f"notify_wave_{wave_at:%Y%m%d%H%M}",
                 replace_existing=True,
+                misfire_grace_time=NOTIFY_MISFIRE_GRACE,
             )
 
     if stream_start > now:
         scheduler.add_job(start_stream_job, "date", run_date=stream_start,
-                          args=[slot_id], id=f"start_{slot_id}", replace_existing=True)
+                          args=[slot_id], id=f"start_{slot_id}", replace_existing=True,
+                          misfire_grace_time=START_MISFIRE_GRACE)
 
     scheduler.add_job(room_cleanup_job, "date", run_date=cleanup_time,
-                      args=[slot_id], id=f"cleanup_{slot_id}", replace_existing=True)
+                      args=[slot_id], id=f"cleanup_{slot_id}", replace_existing=True,
+                      misfire_grace_time=CLEANUP_MISFIRE_GRACE)
 
 
 async def reschedule_pending_rooms() -> None:
-    """On startup: reset interrupted builds, reschedule pending rooms, restart live streams.
-
-    Fixes the problem where APScheduler loses all jobs on every container
-    restart (it uses an in-memory store by default).  Also restarts any
-    'live' rooms whose FFmpeg process was killed by the container restart.
+    """On startup: reset interrupted builds, restart live streams, and schedule
+    jobs for rooms the job store does not know.
+
+    With the Redis job store every pending room's jobs survive the restart
+    (missed ones run within their misfire grace), so only rooms without a
+    cleanup job — the in-memory store, or a store that was wiped — get their
+    job graph recomputed.  Live rooms whose FFmpeg relay survived the restart
+    are re-adopted; the rest are restarted.
     """
     now = datetime.now(timezone.utc)
     async with AsyncSessionLocal() as db:
@@ -189,9 +342,17 @@ async def reschedule_pending_rooms() -> None:
 
         await db.commit()
 
+        # One read of the store instead of a lookup per room
+        known_jobs = {job.id for job in scheduler.get_jobs()}
         for slot in slots:
+            if slot.status == "live" and is_virtual_mode():
+                # Virtual rooms are pure wall-clock arithmetic — nothing to restart
+                continue
+            if slot.status == "live" and await is_room_streaming(str(slot.id)):
+                # The relay outlived the backend restart — keep it playing
+                continue
             if slot.status == "live":
-                # Restart the stream — FFmpeg was killed by the container restart
+                # Restart the stream — the relay died with its streamer container
                 logger.info(f"Restarting stream for live room {slot.id}")
                 scheduler.add_job(
                     _restart_live_room, "date",
@@ -201,12 +362,15 @@ async def reschedule_pending_rooms() -> None:
                     replace_existing=True,
                 )
             else:
-                # Reschedule downstream jobs for pending rooms
-                _schedule_room_jobs(slot)
-                # If build window already passed but playlist not yet built → build now
+                if f"cleanup_{slot.id}" not in known_jobs:
+                    # Reschedule downstream jobs for pending rooms
+                    _schedule_room_jobs(slot, await program_duration(ProgramKey.for_slot(slot)))
+                # If build window already passed but playlist not yet built
+                # (or the build was interrupted) → build now
                 stream_start = _get_stream_start(slot)
                 build_time = stream_start - timedelta(minutes=90)
-                if not slot.playlist_built and build_time <= now and stream_start > now:
+                if (not slot.playlist_built and build_time <= now and stream_start > now
+                        and f"build_{slot.id}" not in known_jobs):
                     scheduler.add_job(
                         build_playlist_job, "date",
                         run_date=now + timedelta(seconds=5),
@@ -220,7 +384,11 @@ async def reschedule_pending_rooms() -> None:
 
 
 async def _restart_live_room(room_slot_id: str) -> None:
-    """Restart FFmpeg for a room that was live when the backend restarted."""
+    """
+    Restart FFmpeg for a room that was live when the backend restarted,
+    resuming at the room's current position (now - started_at) so listeners
+    are not thrown back to the first takbeer.
+    """
     try:
         async with AsyncSessionLocal() as db:
             slot = await db.get(RoomSlot, uuid.UUID(room_slot_id))
@@ -230,33 +398,36 @@ async def _restart_live_room(room_slot_id: str) -> None:
                 logger.warning(f"_restart_live_room: no stream_path for {room_slot_id}")
                 return
 
+        elapsed = (datetime.now(timezone.utc) - slot.started_at).total_seconds() if slot.started_at else 0.0
+        duration = await program_duration(ProgramKey.for_slot(slot))
+        if duration is not None and elapsed >= duration:
+            logger.info(f"_restart_live_room: program already over for {room_slot_id} — not restarting")
+            return
+
         from services.audio.stream_manager import get_m3u8_path
         m3u8 = get_m3u8_path(room_slot_id)
-        # Clean old segments so the playlist starts fresh
-        hls_dir = m3u8.parent
-        for f in hls_dir.glob("seg*.ts"):
-            f.unlink(missing_ok=True)
-        if m3u8.exists():
-            m3u8.unlink()
-
-        proc = await start_stream(room_slot_id, slot.stream_path)
-        if not proc:
+        if elapsed <= 0:
+            # Nothing played yet — start the playlist fresh
+            for f in m3u8.parent.glob("*.m3u8"):
+                f.unlink(missing_ok=True)
+            for f in m3u8.parent.glob("seg*.ts"):
+                f.unlink(missing_ok=True)
+
+        result = await start_room_stream(
+            room_slot_id, slot.stream_path, offset=max(elapsed, 0.0), priority=priority_for_slot(slot),
+        )
+        if not result["started"]:
             logger.error(f"_restart_live_room: FFmpeg failed to start for {room_slot_id}")
             return
 
-        # Wait for manifest
-        for _ in range(90):
-            await asyncio.sleep(0.5)
-            if m3u8.exists() and m3u8.stat().st_size > 50:
-                break
-        else:
+        if not result["ready"]:
             logger.error(f"_restart_live_room: manifest not ready after 45s for {room_slot_id}")
             return
 
         from ws.events import sio
         from services.audio.stream_manager import get_stream_url
         await sio.emit("room_started", {"stream_url": get_stream_url(room_slot_id)}, room=room_slot_id)
-        logger.info(f"_restart_live_room: stream restarted for {room_slot_id}")
+        logger.info(f"_restart_live_room: stream resumed for {room_slot_id} at {elapsed:.0f}s")
     except Exception as e:
         logger.error(f"_restart_live_room failed for {room_slot_id}: {e}", exc_info=True)
 
@@ -272,17 +443,17 @@ async def build_playlist_job(room_slot_id: str) -> None:
             slot.status = "building"
             await db.commit()
 
-        loop = asyncio.get_event_loop()
-        concat_path = await loop.run_in_executor(
-            None, build_concat_file,
-            room_slot_id, slot.rakats, slot.juz_number, slot.juz_half, slot.reciter, slot.juz_per_night,
+        # Rooms sharing reciter/juz/rakats reuse one cached render of the program;
+        # a new render waits for CPU in a streamer's encode queue
+        program_path = await render_program_for(
+            ProgramKey.for_slot(slot), priority_for_slot(slot), f"render {room_slot_id}",
         )
         async with AsyncSessionLocal() as db:
             s = await db.get(RoomSlot, uuid.UUID(room_slot_id))
             if s:
                 s.playlist_built = True
                 s.status = "scheduled"
-                s.stream_path = str(concat_path)
+                s.stream_path = str(program_path)
                 await db.commit()
         logger.info(f"Playlist built for {room_slot_id}")
 
@@ -299,61 +470,155 @@ async def build_playlist_job(room_slot_id: str) -> None:
             pass
 
 
-async def send_notifications_job(room_slot_id: str, minutes_before: int = 20) -> None:
+async def _deliver_reminders(db, recipients: list[tuple[RoomSlot, User, int]]) -> int:
+    """
+    Send (slot, user, minutes_before) reminders concurrently and log each
+    attempt.  Channels already sent for a room are skipped — one dedup query
+    covers every room in the batch.  Returns the number of messages sent.
+    """
+    if not recipients:
+        return 0
+    dedup_result = await db.execute(
+        select(NotificationLog.room_slot_id, NotificationLog.user_id, NotificationLog.channel)
+        .where(
+            NotificationLog.room_slot_id.in_({slot.id for slot, _, _ in recipients}),
+            NotificationLog.status == "sent",
+        )
+    )
+    already_sent = {(row.room_slot_id, row.user_id, row.channel) for row in dedup_result}
+
+    limit = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+
+    async def send(slot: RoomSlot, user: User, channel: str, minutes_before: int):
+        async with limit:
+            if channel == "whatsapp":
+                ok = await send_whatsapp_reminder(user, slot, minutes_before)
+            else:
+                ok = await send_email_reminder(user, slot, minutes_before)
+        return slot, user, channel, ok
+
+    sends = []
+    for slot, user, minutes_before in recipients:
+        if user.notify_whatsapp and user.phone and (slot.id, user.id, "whatsapp") not in already_sent:
+            sends.append(send(slot, user, "whatsapp", minutes_before))
+        if user.notify_email and user.email and (slot.id, user.id, "email") not in already_sent:
+            sends.append(send(slot, user, "email", minutes_before))
+
+    sent_count = 0
+    for slot, user, channel, ok in await asyncio.gather(*sends):
+        db.add(NotificationLog(user_id=user.id, room_slot_id=slot.id, channel=channel, status="sent" if ok else "failed"))
+        if ok:
+            sent_count += 1
+    await db.commit()
+    return sent_count
+
+
+def _reminder_recipients(statuses: tuple[str, ...] | None = NOTIFY_STATUSES):
+    """
+    (RoomSlot, User) pairs of rooms in one of statuses (any status if None)
+    and the active users who should hear about them: same bucket, night and
+    room type, and the room of the user's preferred reciter — or the default
+    reciter's room when the bucket has none for their reciter.
+    """
+    preferred = aliased(RoomSlot)
+    has_preferred_room = exists().where(
+        preferred.isha_bucket_utc == RoomSlot.isha_bucket_utc,
+        preferred.ramadan_night == RoomSlot.ramadan_night,
+        preferred.rakats == RoomSlot.rakats,
+        preferred.juz_per_night == RoomSlot.juz_per_night,
+        preferred.is_private == RoomSlot.is_private,
+        *([preferred.status.in_(statuses)] if statuses else []),
+        preferred.reciter == User.preferred_reciter,
+    )
+    return (
+        select(RoomSlot, User)
+        .join(UserIshaSchedule, and_(
+            UserIshaSchedule.isha_bucket_utc == RoomSlot.isha_bucket_utc,
+            UserIshaSchedule.ramadan_night == RoomSlot.ramadan_night,
+        ))
+        .join(User, and_(
+            User.id == UserIshaSchedule.user_id,
+            User.rakats == RoomSlot.rakats,
+            User.juz_per_night == RoomSlot.juz_per_night,
+        ))
+        .where(
+            *([RoomSlot.status.in_(statuses)] if statuses else []),
+            User.is_active == True,
+            or_(
+                RoomSlot.reciter == User.preferred_reciter,
+                and_(RoomSlot.reciter == settings.DEFAULT_RECITER, ~has_preferred_room),
+            ),
+        )
+    )
+
+
+def _wave_query(wave_at: datetime):
+    """
+    Every public room due wave_at with its recipients.  A room's stream starts
+    RAKATS_START_DELAY after its isha bucket, so each (rakats, minutes_before)
+    pair maps to one bucket minute.
+    """
+    buckets = []
+    for minutes_before in NOTIFY_MINUTES:
+        for rakats, delay in RAKATS_START_DELAY.items():
+            bucket = wave_at + timedelta(minutes=minutes_before - delay)
+            buckets.append(and_(
+                User.notify_minutes_before == minutes_before,
+                RoomSlot.rakats == rakats,
+                RoomSlot.isha_bucket_utc >= bucket,
+                RoomSlot.isha_bucket_utc < bucket + timedelta(minutes=1),
+            ))
+    return _reminder_recipients().where(or_(*buckets), RoomSlot.is_private == False)
+
+
+async def send_notification_wave(wave_at: datetime) -> None:
+    """Remind every user whose room starts notify_minutes_before after wave_at (one query)."""
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(_wave_query(wave_at))
+            recipients = [(slot, user, user.notify_minutes_before) for slot, user in result.all()]
+            sent_count = await _deliver_reminders(db, recipients)
+
+        rooms = len({slot.id for slot, _, _ in recipients})
+        logger.info(
+            f"Notification wave {wave_at:%Y-%m-%d %H:%M}: {sent_count} messages "
+            f"to {len(recipients)} users in {rooms} rooms"
+        )
+    except Exception as e:
+        logger.error(f"send_notification_wave failed for {wave_at}: {e}", exc_info=True)
+
+
+async def send_notifications_job(room_slot_id: str, minutes_before: int = 20) -> int:
+    """
+    One room's reminders (admin trigger; also runs per-room jobs queued
+    before waves).  Unlike a wave it does not skip rooms that have already
+    started.  Returns the number of users reminded.
+    """
     try:
         async with AsyncSessionLocal() as db:
             slot = await db.get(RoomSlot, uuid.UUID(room_slot_id))
             if not slot:
-                return
+                return 0
 
             result = await db.execute(
-                select(User)
-                .join(UserIshaSchedule, UserIshaSchedule.user_id == User.id)
-                .where(
-                    UserIshaSchedule.isha_bucket_utc == slot.isha_bucket_utc,
-                    UserIshaSchedule.ramadan_night == slot.ramadan_night,
-                    User.rakats == slot.rakats,
-                    User.juz_per_night == slot.juz_per_night,
+                _reminder_recipients(statuses=None).where(
+                    RoomSlot.id == slot.id,
                     User.notify_minutes_before == minutes_before,
-                    User.is_active == True,
                 )
             )
-            users = result.scalars().all()
-
-            dedup_result = await db.execute(
-                select(NotificationLog.user_id, NotificationLog.channel)
-                .where(
-                    NotificationLog.room_slot_id == slot.id,
-                    NotificationLog.status == "sent",
-                )
-            )
-            already_sent = {(row.user_id, row.channel) for row in dedup_result}
-
-            sent_count = 0
-            for user in users:
-                if user.notify_whatsapp and user.phone:
-                    if (user.id, "whatsapp") not in already_sent:
-                        ok = await send_whatsapp_reminder(user, slot, minutes_before)
-                        db.add(NotificationLog(user_id=user.id, room_slot_id=slot.id, channel="whatsapp", status="sent" if ok else "failed"))
-                        if ok:
-                            sent_count += 1
-                if user.notify_email and user.email:
-                    if (user.id, "email") not in already_sent:
-                        ok = await send_email_reminder(user, slot, minutes_before)
-                        db.add(NotificationLog(user_id=user.id, room_slot_id=slot.id, channel="email", status="sent" if ok else "failed"))
-                        if ok:
-                            sent_count += 1
-
-            await db.commit()
+            users = [user for _, user in result.all()]
+            sent_count = await _deliver_reminders(db, [(slot, user, minutes_before) for user in users])
         logger.info(f"Notifications sent for {room_slot_id} ({minutes_before}min wave): {sent_count} messages to {len(users)} users")
+        return len(users)
     except Exception as e:
         logger.error(f"send_notifications_job failed for {room_slot_id}: {e}", exc_info=True)
+        return 0
 
 
 async def start_stream_job(room_slot_id: str) -> None:
     try:
-        # 1. Start FFmpeg (non-blocking — Popen returns immediately)
-        proc = None
+        # 1. Start FFmpeg (waits in the encode queue if the node is busy)
+        result = None
         async with AsyncSessionLocal() as db:
             slot = await db.get(RoomSlot, uuid.UUID(room_slot_id))
             if not slot:
@@ -362,21 +627,25 @@ async def start_stream_job(room_slot_id: str) -> None:
             if not slot.stream_path:
                 logger.error(f"start_stream_job: no playlist for {room_slot_id} — run build first")
                 return
-            proc = await start_stream(room_slot_id, slot.stream_path)
+            if is_virtual_mode():
+                # Virtual rooms only need started_at; the manifest endpoint does the rest
+                if not Path(slot.stream_path).exists():
+                    logger.error(f"start_stream_job: program render missing for {room_slot_id}")
+                    return
+            else:
+                result = await start_room_stream(
+                    room_slot_id, slot.stream_path, priority=priority_for_slot(slot),
+                )
 
-        if not proc:
-            logger.error(f"FFmpeg failed to start for {room_slot_id}")
-            return
+        if not is_virtual_mode():
+            if not result["started"]:
+                logger.error(f"FFmpeg failed to start for {room_slot_id}")
+                return
 
-        # 2. Wait for the HLS manifest to be written (first segment takes ~6–10s)
-        m3u8 = get_m3u8_path(room_slot_id)
-        for _ in range(90):          # up to 45 s
-            await asyncio.sleep(0.5)
-            if m3u8.exists() and m3u8.stat().st_size > 50:
-                break
-        else:
-            logger.error(f"HLS manifest not ready after 45s for {room_slot_id}")
-            return
+            # 2. Wait for the first (short, ~2s) HLS segment to be written
+            if not result["ready"]:
+                logger.error(f"HLS manifest not ready after 45s for {room_slot_id}")
+                return
 
         # 3. Mark live in DB and notify all connected clients
         async with AsyncSessionLocal() as db:
@@ -396,7 +665,7 @@ async def start_stream_job(room_slot_id: str) -> None:
 
 async def room_cleanup_job(room_slot_id: str) -> None:
     try:
-        await stop_stream(room_slot_id)
+        await stop_room_stream(room_slot_id)
         async with AsyncSessionLocal() as db:
             slot = await db.get(RoomSlot, uuid.UUID(room_slot_id))
             if slot:
@@ -433,6 +702,18 @@ async def expire_private_rooms_job() -> None:
 
 
 def start_scheduler() -> None:
+    """Start paused: jobs can be added from here, but run only once elected."""
+    scheduler.add_listener(_on_job_stored, EVENT_JOB_ADDED | EVENT_JOB_MODIFIED)
+    scheduler.start(paused=True)
+    logger.info("Scheduler started (paused until elected leader)")
+
+
+def stop_scheduler() -> None:
+    if scheduler.state != STATE_STOPPED:
+        scheduler.shutdown(wait=False)
+
+
+def _add_leader_jobs() -> None:
     # Create rooms every 4 hours so new users and missed runs are covered quickly
     scheduler.add_job(daily_room_creation, "interval", hours=4,
                       id="daily_room_creation", replace_existing=True)
@@ -443,11 +724,13 @@ def start_scheduler() -> None:
     # Expire private rooms older than 6 hours — runs every 30 minutes
     scheduler.add_job(expire_private_rooms_job, "interval", minutes=30,
                       id="expire_private_rooms", replace_existing=True)
-    # On every startup: reset interrupted builds and reschedule pending rooms
+    # Delete finished rooms' HLS output and keep HLS_OUTPUT_DIR within its budget
+    scheduler.add_job(retention_job, "interval", minutes=RETENTION_INTERVAL_MINUTES,
+                      id="hls_retention", replace_existing=True)
+    # On every election: reset interrupted builds, adopt/restart live rooms and
+    # schedule rooms the job store does not know
     scheduler.add_job(
         reschedule_pending_rooms, "date",
         run_date=datetime.now(timezone.utc) + timedelta(seconds=5),
         id="startup_reschedule", replace_existing=True,
     )
-    scheduler.start()
-    logger.info("Scheduler started")
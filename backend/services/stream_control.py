@@ -0,0 +1,261 @@
+"""
+Stream control across process roles (see Settings.ROLE).
+
+All FFmpeg work — program renders and room relays — runs in processes with
+the "streamer" role.  The scheduler and API call the functions here; in a
+process that is itself a streamer they run locally, otherwise they become
+commands on a Redis queue and the caller waits for the reply:
+
+    tarteel:stream:commands               shared queue (renders, new rooms)
+    tarteel:streamer:<node_id>:commands   one streamer (its running rooms)
+    tarteel:stream:reply:<command_id>     reply list, read once by the caller
+    tarteel:streamers                     hash node_id → heartbeat JSON
+                                          (time, live rooms, encode queues)
+
+Every command carries the wall-clock deadline its caller stops waiting at;
+a streamer drops commands that are already past it (stop excepted), and a
+start that got a relay slot too late gives it back instead of spawning.
+
+A room's commands go to the streamer whose heartbeat lists it, so stop and
+status reach the node that owns the FFmpeg process.  Streamers pull from
+their own queue before the shared one; adding a streamer node adds capacity
+without configuration.  Program renders and room directories live under
+HLS_OUTPUT_DIR, which streamer nodes share.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import asdict
+from config import get_settings
+from redis_client import get_redis
+from services.audio.encode_queue import get_encode_queue, encode_status, PRIORITY_PUBLIC, RENDER_COST
+from services.audio.program_cache import ProgramKey, render_program, is_program_rendered
+from services.audio import stream_manager
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SHARED_QUEUE    = "tarteel:stream:commands"
+STREAMERS_KEY   = "tarteel:streamers"
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TTL      = 15.0     # a streamer silent for longer is considered gone
+
+RENDER_TIMEOUT = 1800.0
+START_TIMEOUT  = 120.0        # encode queue + first segment
+CALL_TIMEOUT   = 15.0
+REPLY_MARGIN   = 2.0          # deadline slack for the reply to reach the caller
+
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_streamer() -> bool:
+    return "streamer" in settings.roles
+
+
+def _node_queue(node_id: str) -> str:
+    return f"tarteel:streamer:{node_id}:commands"
+
+
+# ── Local execution (streamer role) ───────────────────────────────────────────
+
+async def _render(key: ProgramKey, priority: int, label: str) -> str:
+    """Cached program manifest for key; a new render waits in the encode queue."""
+    loop = asyncio.get_running_loop()
+    if is_program_rendered(key):
+        return str(await loop.run_in_executor(None, render_program, key))
+    async with get_encode_queue().slot(RENDER_COST, priority, label):
+        return str(await loop.run_in_executor(None, render_program, key))
+
+
+async def _execute(cmd: str, args: dict, deadline: float | None = None):
+    if cmd == "render":
+        return await _render(ProgramKey(**args["key"]), args["priority"], args["label"])
+    if cmd == "start":
+        room = args["room_slot_id"]
+        proc = await stream_manager.start_stream(
+            room, args["program_path"], args["offset"], args["priority"], deadline=deadline,
+        )
+        if not proc:
+            return {"started": False, "ready": False}
+        timeout = stream_manager.READY_TIMEOUT
+        if deadline is not None:
+            timeout = max(0.0, min(timeout, deadline - time.time()))
+        return {"started": True, "ready": await stream_manager.wait_until_ready(room, timeout)}
+    if cmd == "stop":
+        await stream_manager.stop_stream(args["room_slot_id"])
+        return None
+    if cmd == "status":
+        return stream_manager.get_stream_status(args["room_slot_id"])
+    raise ValueError(f"Unknown stream command {cmd!r}")
+
+
+# ── Remote calls (api / scheduler roles) ──────────────────────────────────────
+
+async def _live_streamers() -> dict[str, dict]:
+    redis = await get_redis()
+    now = time.time()
+    live = {}
+    for node_id, raw in (await redis.hgetall(STREAMERS_KEY)).items():
+        beat = json.loads(raw)
+        if now - beat["time"] <= HEARTBEAT_TTL:
+            live[node_id] = beat
+    return live
+
+
+async def _owner(room_slot_id: str) -> str | None:
+    for node_id, beat in (await _live_streamers()).items():
+        if room_slot_id in beat["rooms"]:
+            return node_id
+    return None
+
+
+async def _call(cmd: str, args: dict, timeout: float, node_id: str | None = None):
+    """Queue a command for a streamer (node_id, or whichever is free) and await its reply."""
+    if not await _live_streamers():
+        raise RuntimeError("No streamer node is running")
+    redis = await get_redis()
+    command_id = uuid.uuid4().hex
+    reply_key = f"tarteel:stream:reply:{command_id}"
+    deadline = time.time() + max(timeout - REPLY_MARGIN, 0.0)
+    await redis.rpush(
+        _node_queue(node_id) if node_id else SHARED_QUEUE,
+        json.dumps({"id": command_id, "cmd": cmd, "args": args, "reply_to": reply_key, "deadline": deadline}),
+    )
+    reply = await redis.blpop([reply_key], timeout=timeout)
+    if reply is None:
+        raise TimeoutError(f"Stream command {cmd} got no reply in {timeout:.0f}s")
+    result = json.loads(reply[1])
+    if "error" in result:
+        raise RuntimeError(f"Stream command {cmd} failed on {result['node']}: {result['error']}")
+    return result["result"]
+
+
+async def render_program_for(key: ProgramKey, priority: int = PRIORITY_PUBLIC, label: str = "render") -> str:
+    """Path of the program's master playlist, rendering it on a streamer if needed."""
+    args = {"key": asdict(key), "priority": priority, "label": label}
+    if is_streamer():
+        return await _execute("render", args)
+    return await _call("render", args, RENDER_TIMEOUT)
+
+
+async def start_room_stream(
+    room_slot_id: str, program_path: str, offset: float = 0.0, priority: int = PRIORITY_PUBLIC,
+) -> dict:
+    """Start (or restart) a room's relay and wait for its first segment: {started, ready}."""
+    args = {"room_slot_id": room_slot_id, "program_path": program_path, "offset": offset, "priority": priority}
+    if is_streamer():
+        return await _execute("start", args)
+    try:
+        return await _call("start", args, START_TIMEOUT, await _owner(room_slot_id))
+    except TimeoutError:
+        # The streamer may still have started it — don't leave a relay nobody awaited
+        try:
+            await stop_room_stream(room_slot_id)
+        except Exception as e:
+            logger.warning(f"Could not stop timed-out start for room {room_slot_id}: {e}")
+        raise
+
+
+async def stop_room_stream(room_slot_id: str) -> None:
+    args = {"room_slot_id": room_slot_id}
+    if is_streamer():
+        await _execute("stop", args)
+        return
+    node_id = await _owner(room_slot_id)
+    if node_id:
+        await _call("stop", args, CALL_TIMEOUT, node_id)
+
+
+async def room_stream_status(room_slot_id: str) -> dict | None:
+    args = {"room_slot_id": room_slot_id}
+    if is_streamer():
+        return await _execute("status", args)
+    node_id = await _owner(room_slot_id)
+    return await _call("status", args, CALL_TIMEOUT, node_id) if node_id else None
+
+
+async def list_streamers() -> dict[str, dict]:
+    """Live streamer nodes and their last heartbeat (rooms, encode queues)."""
+    return await _live_streamers()
+
+
+async def encode_queue_status() -> dict[str, dict]:
+    """Encode queues of every live streamer node (node_id → queues); this node's are current."""
+    nodes = {node_id: beat.get("encode") for node_id, beat in (await _live_streamers()).items()}
+    if is_streamer():
+        nodes[NODE_ID] = encode_status()
+    return nodes
+
+
+async def is_room_streaming(room_slot_id: str) -> bool:
+    """True if a relay for the room is running (re-adopting it locally if need be)."""
+    if is_streamer() and stream_manager.adopt_stream(room_slot_id):
+        return True
+    return await _owner(room_slot_id) is not None
+
+
+# ── Streamer worker ───────────────────────────────────────────────────────────
+
+async def _heartbeat() -> None:
+    redis = await get_redis()
+    while True:
+        rooms = [r for r in stream_manager.ACTIVE_STREAMS if stream_manager.is_stream_alive(r)]
+        try:
+            await redis.hset(STREAMERS_KEY, NODE_ID, json.dumps({
+                "time": time.time(),
+                "rooms": rooms,
+                "encode": encode_status(),
+            }))
+        except Exception as e:
+            logger.error(f"Streamer heartbeat failed: {e}")
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+async def _handle(redis, raw: str) -> None:
+    command = json.loads(raw)
+    deadline = command.get("deadline")
+    if deadline is not None and command["cmd"] != "stop" and time.time() >= deadline:
+        logger.warning(f"Dropping stream command {command['cmd']} {command['id']} — its caller has given up")
+        return
+    try:
+        reply = {"result": await _execute(command["cmd"], command["args"], deadline)}
+    except Exception as e:
+        logger.error(f"Stream command {command['cmd']} failed: {e}", exc_info=True)
+        reply = {"error": str(e)}
+    reply["node"] = NODE_ID
+    await redis.rpush(command["reply_to"], json.dumps(reply))
+    await redis.expire(command["reply_to"], 60)
+
+
+async def run_streamer() -> None:
+    """Streamer role: adopt this host's relays, heartbeat, and serve commands."""
+    adopted = await asyncio.to_thread(stream_manager.adopt_local_streams)
+    logger.info(f"Streamer {NODE_ID} ready ({adopted} relays adopted)")
+    redis = await get_redis()
+    heartbeat = asyncio.create_task(_heartbeat())
+    tasks: set[asyncio.Task] = set()
+    try:
+        while True:
+            try:
+                item = await redis.blpop([_node_queue(NODE_ID), SHARED_QUEUE], timeout=5)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Streamer command queue error: {e}")
+                await asyncio.sleep(1)
+                continue
+            if item is None:
+                continue
+            task = asyncio.create_task(_handle(redis, item[1]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        heartbeat.cancel()
+        try:
+            await redis.hdel(STREAMERS_KEY, NODE_ID)
+        except Exception:
+            pass
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Backend modules import each other from the backend root (as under uvicorn)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings  # noqa: E402
+
+
+@pytest.fixture
+def hls_dir(tmp_path, monkeypatch) -> Path:
+    """A fresh HLS_OUTPUT_DIR for the test."""
+    root = tmp_path / "hls"
+    root.mkdir()
+    monkeypatch.setattr(get_settings(), "HLS_OUTPUT_DIR", str(root))
+    return root
+
+
+@pytest.fixture
+def audio_dir(tmp_path, monkeypatch) -> Path:
+    """A fresh AUDIO_DIR for the test."""
+    root = tmp_path / "audio"
+    root.mkdir()
+    monkeypatch.setattr(get_settings(), "AUDIO_DIR", str(root))
+    return root
@@ -0,0 +1,106 @@
+"""Re-adopting relays left running by a previous backend process."""
+import asyncio
+import json
+import socket
+import subprocess
+import time
+import uuid
+import pytest
+from services.audio import stream_manager
+
+
+@pytest.fixture
+def room(hls_dir):
+    """A room directory; everything adopted for it is dropped afterwards."""
+    room_slot_id = str(uuid.uuid4())
+    stream_manager.get_stream_dir(room_slot_id).mkdir()
+    yield room_slot_id
+    stream_manager.ACTIVE_STREAMS.pop(room_slot_id, None)
+    stream_manager.SUPERVISED.pop(room_slot_id, None)
+    lease = stream_manager.RELAY_LEASES.pop(room_slot_id, None)
+    if lease:
+        lease.release()
+
+
+@pytest.fixture
+def relay(room):
+    """A process that looks like the room's FFmpeg relay in /proc/<pid>/cmdline."""
+    # The trailing command keeps sh from exec'ing sleep (and losing argv)
+    proc = subprocess.Popen(["sh", "-c", "sleep 30; :", "ffmpeg", str(stream_manager.get_stream_dir(room))])
+    deadline = time.monotonic() + 5
+    while not stream_manager._is_room_ffmpeg(proc.pid, room) and time.monotonic() < deadline:
+        time.sleep(0.01)        # until sh has exec'd
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+def _pid_file(room: str, pid: int, origin: float, host: str | None = None) -> None:
+    stream_manager.get_pid_path(room).write_text(json.dumps({
+        "pid": pid, "host": host or socket.gethostname(), "started_at": origin, "origin": origin,
+        "program": "/programs/abc/program.m3u8",
+    }))
+
+
+def _adopt(room: str) -> bool:
+    async def run():
+        adopted = stream_manager.adopt_stream(room)
+        state = stream_manager.SUPERVISED.get(room)
+        if state and state.task:
+            state.task.cancel()
+        return adopted
+    return asyncio.run(run())
+
+
+def test_running_relay_is_adopted_and_supervised(room, relay):
+    origin = time.time() - 300
+    _pid_file(room, relay.pid, origin)
+
+    assert _adopt(room)
+    proc = stream_manager.ACTIVE_STREAMS[room]
+    assert isinstance(proc, stream_manager.AdoptedProcess) and proc.pid == relay.pid
+    assert proc.returncode is None
+    state = stream_manager.SUPERVISED[room]
+    assert (state.program_path, state.origin) == ("/programs/abc/program.m3u8", origin)
+    assert room in stream_manager.RELAY_LEASES
+
+    relay.kill()
+    relay.wait()
+    assert proc.returncode == -1
+
+
+def test_dead_relay_pid_file_is_removed(room, relay):
+    relay.kill()
+    relay.wait()
+    _pid_file(room, relay.pid, time.time())
+    assert not _adopt(room)
+    assert not stream_manager.get_pid_path(room).exists()
+
+
+def test_reused_pid_is_not_adopted(room):
+    stranger = subprocess.Popen(["sleep", "30"])
+    try:
+        _pid_file(room, stranger.pid, time.time())
+        assert not _adopt(room)
+    finally:
+        stranger.kill()
+        stranger.wait()
+
+
+def test_another_hosts_relay_is_left_alone(room, relay):
+    _pid_file(room, relay.pid, time.time(), host="other-streamer")
+    assert not _adopt(room)
+    assert stream_manager.get_pid_path(room).exists()
+    assert room not in stream_manager.ACTIVE_STREAMS
+
+
+def test_adopt_local_streams(room, relay, hls_dir):
+    _pid_file(room, relay.pid, time.time())
+    (hls_dir / "programs").mkdir()
+
+    async def run():
+        count = stream_manager.adopt_local_streams()
+        stream_manager.SUPERVISED[room].task.cancel()
+        return count
+
+    assert asyncio.run(run()) == 1
@@ -0,0 +1,77 @@
+"""Checksum manifest: verification statuses, persistence and checkpoints."""
+import pytest
+from services.audio import checksums
+from services.audio.checksums import ChecksumManifest, file_sha256, verify_files
+
+RECITER = "Checksum_Test"
+
+
+def _write(manifest: ChecksumManifest, name: str, body: bytes, record: bool = True):
+    path = manifest.root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(body)
+    if record:
+        manifest.record(path, len(body), file_sha256(path))
+    return path
+
+
+def test_verify_statuses(audio_dir):
+    manifest = ChecksumManifest(RECITER)
+    ok = _write(manifest, "001/001.mp3", b"intact")
+    flipped = _write(manifest, "001/002.mp3", b"original")
+    truncated = _write(manifest, "001/003.mp3", b"complete file")
+    missing = _write(manifest, "001/004.mp3", b"gone")
+    adopted = _write(manifest, "001/005.mp3", b"downloaded before the manifest", record=False)
+    empty = _write(manifest, "001/006.mp3", b"", record=False)
+    flipped.write_bytes(b"0riginal")
+    truncated.write_bytes(b"complete")
+    missing.unlink()
+
+    statuses = verify_files(manifest, [ok, flipped, truncated, missing, adopted, empty], workers=3)
+
+    assert statuses == {
+        ok: "ok", flipped: "corrupt", truncated: "corrupt",
+        missing: "missing", adopted: "adopted", empty: "corrupt",
+    }
+    # Adopted files are recorded and the manifest saved
+    assert ChecksumManifest(RECITER).get(adopted) == (len(adopted.read_bytes()), file_sha256(adopted))
+
+
+def test_manifest_round_trip_and_forget(audio_dir):
+    manifest = ChecksumManifest(RECITER)
+    path = _write(manifest, "002/001.mp3", b"ayah")
+    manifest.save()
+    assert ChecksumManifest(RECITER).get(path) == (4, file_sha256(path))
+    assert not list(manifest.root.glob("*.tmp"))
+
+    manifest.forget(path)
+    manifest.save()
+    assert ChecksumManifest(RECITER).get(path) is None
+
+
+def test_unreadable_manifest_starts_empty(audio_dir):
+    root = audio_dir / RECITER
+    root.mkdir()
+    (root / checksums.MANIFEST_FILENAME).write_text("{not json")
+    assert ChecksumManifest(RECITER).entries == {}
+
+
+def test_checkpoint_after_records_or_time(audio_dir, monkeypatch):
+    monkeypatch.setattr(checksums, "CHECKPOINT_RECORDS", 3)
+    clock = [100.0]
+    monkeypatch.setattr(checksums.time, "monotonic", lambda: clock[0])
+    manifest = ChecksumManifest(RECITER)
+    assert not manifest.checkpoint_due
+
+    _write(manifest, "003/001.mp3", b"a")
+    _write(manifest, "003/002.mp3", b"b")
+    assert not manifest.checkpoint_due
+    _write(manifest, "003/003.mp3", b"c")
+    assert manifest.checkpoint_due
+
+    manifest.save()
+    assert not manifest.checkpoint_due
+    _write(manifest, "003/004.mp3", b"d")
+    assert not manifest.checkpoint_due
+    clock[0] += checksums.CHECKPOINT_INTERVAL
+    assert manifest.checkpoint_due
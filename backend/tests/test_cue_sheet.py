@@ -0,0 +1,90 @@
+"""Rakah cue sheets: offsets, HLS timed metadata and the timeline API."""
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from api.rooms import get_room_timeline
+from services.audio.cue_sheet import (
+    CUE_BREAK, CUE_RAKAH, CUE_RUKU, CueMark, build_cue_sheet, load_cue_sheet, write_cue_sheet,
+)
+from services.audio.virtual_stream import render_live_playlist
+
+FRAME = b"\xff\xfb\x90\x00" + bytes(413)    # MPEG-1 Layer III, 128 kb/s, 44.1 kHz
+FRAME_SECONDS = 1152 / 44100
+STARTED = datetime(2026, 3, 1, 19, 0, tzinfo=timezone.utc)
+
+
+def _mp3(path, frames: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(FRAME * frames)
+    return path
+
+
+@pytest.fixture
+def sheet(audio_dir):
+    """Cue sheet of a four-entry program: 100, 200, 300 and 50 frames."""
+    entries = [_mp3(audio_dir / "Cue_Test" / f"{i}.mp3", n) for i, n in enumerate((100, 200, 300, 50))]
+    marks = [CueMark(CUE_RAKAH, 1, 0), CueMark(CUE_RUKU, 1, 2), CueMark(CUE_BREAK, 1, 3)]
+    return build_cue_sheet(entries, marks, "Cue_Test", 2)
+
+
+def test_cue_offsets_are_running_sums_of_entry_durations(sheet):
+    assert sheet["rakats"] == 2
+    assert sheet["total_duration"] == pytest.approx(650 * FRAME_SECONDS, abs=1e-3)
+    assert [(c["kind"], c["rakah"]) for c in sheet["cues"]] == [(CUE_RAKAH, 1), (CUE_RUKU, 1), (CUE_BREAK, 1)]
+    assert [c["offset"] for c in sheet["cues"]] == pytest.approx(
+        [0.0, 300 * FRAME_SECONDS, 600 * FRAME_SECONDS], abs=1e-3,
+    )
+
+
+def test_cues_in_the_window_become_dateranges(sheet, tmp_path):
+    program = tmp_path / "program"
+    program.mkdir()
+    write_cue_sheet(sheet, program)
+    lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:6"]
+    for i in range(3):
+        lines += ["#EXTINF:6.000000,", f"seg_64k_{i:05d}.ts"]
+    (program / "program_64k.m3u8").write_text("\n".join(lines + ["#EXT-X-ENDLIST"]) + "\n")
+    master = str(program / "program.m3u8")
+
+    early = render_live_playlist(master, STARTED, STARTED, "", "64k")
+    later = render_live_playlist(master, STARTED, STARTED.replace(second=12), "", "64k")
+
+    # Only the rakah cue (0 s) is inside the first segment; ruku is at ~7.8 s
+    assert early.count("#EXT-X-DATERANGE") == 1
+    assert ('#EXT-X-DATERANGE:ID="cue-0",CLASS="live.tarteel.cue",'
+            'START-DATE="2026-03-01T19:00:00.000Z",X-KIND="rakah",X-RAKAH=1') in early
+    assert later.count("#EXT-X-DATERANGE") == 3
+    assert 'ID="cue-1"' in later and 'START-DATE="2026-03-01T19:00:07.837Z"' in later
+
+
+class FakeDB:
+    def __init__(self, slot):
+        self.slot = slot
+
+    async def get(self, model, room_id):
+        return self.slot
+
+
+def test_timeline_api(sheet, tmp_path):
+    write_cue_sheet(sheet, tmp_path)
+    slot = SimpleNamespace(
+        status="live", rakats=2, started_at=STARTED, playlist_built=True, stream_path=str(tmp_path / "program.m3u8"),
+    )
+    room_id = uuid.uuid4()
+
+    timeline = asyncio.run(get_room_timeline(room_id, FakeDB(slot)))
+
+    assert timeline.started_at == STARTED
+    assert timeline.total_duration == sheet["total_duration"]
+    assert [c.kind for c in timeline.cues] == [CUE_RAKAH, CUE_RUKU, CUE_BREAK]
+    assert load_cue_sheet(slot.stream_path) == sheet
+
+
+def test_timeline_waits_for_the_build():
+    slot = SimpleNamespace(status="scheduled", playlist_built=False, stream_path=None)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(get_room_timeline(uuid.uuid4(), FakeDB(slot)))
+    assert e.value.status_code == 404
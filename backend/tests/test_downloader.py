@@ -0,0 +1,217 @@
+"""Downloader engine against a local stand-in for EveryAyah."""
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from services.audio import downloader, library
+from services.audio.checksums import ChecksumManifest, file_sha256
+from utils.juz_data import AyahKey
+
+RECITER = "Stand_In_64kbps"
+
+
+class StandIn(ThreadingHTTPServer):
+    """Serves files by URL path with Range support; scripted failures per path."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.files: dict[str, bytes] = {}
+        self.failures: dict[str, list[tuple[int, dict]]] = {}
+        self.requests: list[tuple[str, str | None]] = []
+        self.delay = 0.0
+        self.range_shift = 0            # misreport Content-Range starts by this much
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/data"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandIn
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        s = self.server
+        with s.lock:
+            s.requests.append((self.path, self.headers.get("Range")))
+            s.active += 1
+            s.peak = max(s.peak, s.active)
+        try:
+            time.sleep(s.delay)
+            self._respond()
+        finally:
+            with s.lock:
+                s.active -= 1
+
+    def _respond(self):
+        s = self.server
+        if s.failures.get(self.path):
+            status, headers = s.failures[self.path].pop(0)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = s.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        start = 0
+        requested = self.headers.get("Range")
+        if requested:
+            start = int(requested.removeprefix("bytes=").split("-")[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            start += s.range_shift
+            s.range_shift = 0
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+
+@pytest.fixture
+def server(audio_dir, monkeypatch):
+    monkeypatch.setattr(library, "_library", None)
+    monkeypatch.setattr(downloader, "BACKOFF_BASE", 0.0)
+    s = StandIn()
+    thread = threading.Thread(target=s.serve_forever, daemon=True)
+    thread.start()
+    yield s
+    s.shutdown()
+    s.server_close()
+
+
+def _publish(server, ayahs, size=20000) -> list[tuple[AyahKey, bytes]]:
+    bodies = []
+    for a in ayahs:
+        body = bytes((a.surah * 31 + a.ayah + i) % 251 for i in range(size))
+        server.files[f"/data/{RECITER}/{a.surah:03d}{a.ayah:03d}.mp3"] = body
+        bodies.append((a, body))
+    return bodies
+
+
+def _download(server, ayahs, **kwargs):
+    return asyncio.run(downloader.download_ayahs(RECITER, ayahs, base_url=server.base_url, rate=1000, **kwargs))
+
+
+def test_concurrency_limit_is_respected(server):
+    ayahs = [AyahKey(2, a) for a in range(1, 13)]
+    bodies = _publish(server, ayahs)
+    server.delay = 0.05
+
+    progress = _download(server, ayahs, concurrency=3)
+
+    assert progress.downloaded == len(ayahs) and progress.failed == 0
+    assert server.peak <= 3
+    for a, body in bodies:
+        assert downloader.get_audio_path(RECITER, a).read_bytes() == body
+
+
+def test_429_and_5xx_are_retried(server):
+    throttled, flaky = AyahKey(1, 1), AyahKey(1, 2)
+    bodies = _publish(server, [throttled, flaky])
+    server.failures[f"/data/{RECITER}/001001.mp3"] = [(429, {"Retry-After": "0"})]
+    server.failures[f"/data/{RECITER}/001002.mp3"] = [(503, {}), (502, {})]
+
+    progress = _download(server, [throttled, flaky])
+
+    assert progress.downloaded == 2 and progress.failed == 0
+    assert [p for p, _ in server.requests].count(f"/data/{RECITER}/001002.mp3") == 3
+    for a, body in bodies:
+        assert downloader.get_audio_path(RECITER, a).read_bytes() == body
+
+
+def test_permanent_errors_are_not_retried(server):
+    progress = _download(server, [AyahKey(1, 3)])
+    assert progress.failed == 1
+    assert len(server.requests) == 1
+
+
+def test_partial_file_is_resumed_with_a_range_request(server):
+    ayah = AyahKey(1, 4)
+    [(_, body)] = _publish(server, [ayah])
+    path = downloader.get_audio_path(RECITER, ayah)
+    part = path.with_name(path.name + ".part")
+    part.parent.mkdir(parents=True)
+    part.write_bytes(body[:7000])
+
+    progress = _download(server, [ayah])
+
+    assert progress.downloaded == 1
+    assert server.requests == [(f"/data/{RECITER}/001004.mp3", "bytes=7000-")]
+    assert path.read_bytes() == body and not part.exists()
+    assert ChecksumManifest(RECITER).get(path) == (len(body), file_sha256(path))
+
+
+def test_complete_part_is_committed_on_416(server):
+    ayah = AyahKey(1, 5)
+    [(_, body)] = _publish(server, [ayah])
+    path = downloader.get_audio_path(RECITER, ayah)
+    part = path.with_name(path.name + ".part")
+    part.parent.mkdir(parents=True)
+    part.write_bytes(body)
+
+    assert _download(server, [ayah]).downloaded == 1
+    assert path.read_bytes() == body and len(server.requests) == 1
+
+
+def test_oversized_part_is_discarded_on_416(server):
+    ayah = AyahKey(1, 6)
+    [(_, body)] = _publish(server, [ayah])
+    path = downloader.get_audio_path(RECITER, ayah)
+    part = path.with_name(path.name + ".part")
+    part.parent.mkdir(parents=True)
+    part.write_bytes(body + b"garbage from another file")
+
+    assert _download(server, [ayah]).downloaded == 1
+    assert path.read_bytes() == body
+    assert [r for _, r in server.requests] == [f"bytes={len(body) + 25}-", None]
+
+
+def test_range_that_does_not_resume_at_the_offset_restarts(server):
+    ayah = AyahKey(1, 7)
+    [(_, body)] = _publish(server, [ayah])
+    path = downloader.get_audio_path(RECITER, ayah)
+    part = path.with_name(path.name + ".part")
+    part.parent.mkdir(parents=True)
+    part.write_bytes(body[:5000])
+    server.range_shift = -1000
+
+    assert _download(server, [ayah]).downloaded == 1
+    assert path.read_bytes() == body
+    assert [r for _, r in server.requests] == ["bytes=5000-", None]
+
+
+def test_verify_replaces_corrupt_and_missing_files(server):
+    fatiha = [AyahKey(1, a) for a in range(1, 8)]
+    bodies = dict(((a.surah, a.ayah), body) for a, body in _publish(server, fatiha))
+    assert _download(server, fatiha).downloaded == 7
+    corrupt, missing = (downloader.get_audio_path(RECITER, AyahKey(1, a)) for a in (2, 5))
+    corrupt.write_bytes(b"truncated")
+    missing.unlink()
+    server.requests.clear()
+
+    progress = asyncio.run(downloader.verify_reciter(RECITER, juz_list=[], base_url=server.base_url, rate=1000))
+
+    assert progress.downloaded == 2
+    assert sorted(p for p, _ in server.requests) == [f"/data/{RECITER}/001002.mp3", f"/data/{RECITER}/001005.mp3"]
+    for a in fatiha:
+        path = downloader.get_audio_path(RECITER, a)
+        assert path.read_bytes() == bodies[(a.surah, a.ayah)]
+        assert ChecksumManifest(RECITER).get(path) == (path.stat().st_size, file_sha256(path))
@@ -0,0 +1,78 @@
+"""Duration index build, incremental refresh and reload."""
+import math
+import os
+import pytest
+from services.audio import duration_index
+from services.audio.downloader import get_audio_path
+from utils.juz_data import AyahKey
+
+RECITER = "Index_Test_64kbps"
+FRAME = b"\xff\xfb\x90\x00" + bytes(413)    # MPEG-1 Layer III, 128 kb/s, 44.1 kHz: 417 bytes
+
+
+def _mp3(path, frames: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(FRAME * frames)
+
+
+@pytest.fixture
+def probes(audio_dir, monkeypatch):
+    """Paths probed by the index builder."""
+    monkeypatch.setattr(duration_index, "_loaded", {})
+    probed = []
+    probe = duration_index.probe_mp3
+
+    def counting_probe(path):
+        probed.append(path)
+        return probe(path)
+
+    monkeypatch.setattr(duration_index, "probe_mp3", counting_probe)
+    return probed
+
+
+def test_build_and_incremental_refresh(audio_dir, probes):
+    first, second = get_audio_path(RECITER, AyahKey(1, 1)), get_audio_path(RECITER, AyahKey(1, 2))
+    _mp3(first, 10)
+    _mp3(second, 20)
+    _mp3(audio_dir / "silence" / "Silence_10.mp3", 5)
+
+    duration_index.build_duration_index(RECITER)
+    index = duration_index.get_duration_index(RECITER)
+    assert index.ayah_duration(AyahKey(1, 1)) == pytest.approx(10 * 1152 / 44100)
+    assert index.ayah_duration(AyahKey(1, 2)) == pytest.approx(20 * 1152 / 44100)
+    assert math.isnan(index.ayah_duration(AyahKey(1, 3)))
+    assert index.clip_duration("silence/Silence_10") == pytest.approx(5 * 1152 / 44100)
+    assert len(probes) == 3
+
+    # Only the changed file is parsed again
+    _mp3(second, 30)
+    os.utime(second, ns=(1, 1))
+    probes.clear()
+    duration_index.build_duration_index(RECITER)
+    assert probes == [second]
+    refreshed = duration_index.get_duration_index(RECITER)
+    assert refreshed.ayah_duration(AyahKey(1, 2)) == pytest.approx(30 * 1152 / 44100)
+    assert refreshed.ayah_duration(AyahKey(1, 1)) == pytest.approx(10 * 1152 / 44100)
+
+
+def test_replaced_index_is_closed(audio_dir, probes):
+    _mp3(get_audio_path(RECITER, AyahKey(1, 1)), 10)
+    duration_index.build_duration_index(RECITER)
+    old = duration_index.get_duration_index(RECITER)
+    assert duration_index.get_duration_index(RECITER) is old
+
+    duration_index.build_duration_index(RECITER, force=True)
+    assert old._mm.closed and old._file.closed
+    new = duration_index.get_duration_index(RECITER)
+    assert new is not old
+
+    # Rebuilt by another process: noticed by the file's mtime
+    path = duration_index.get_index_path(RECITER)
+    os.utime(path, ns=(1, 1))
+    assert duration_index.get_duration_index(RECITER) is not new
+    assert new._mm.closed and new._file.closed
+
+    path.unlink()
+    latest = duration_index._loaded[RECITER][1]
+    assert duration_index.get_duration_index(RECITER) is None
+    assert latest._mm.closed
@@ -0,0 +1,89 @@
+"""Encode admission: priority order for renders, relays on their own limit."""
+import asyncio
+import os
+from services.audio import encode_queue, stream_manager
+from services.audio.encode_queue import (
+    EncodeQueue, PRIORITY_PRIVATE, PRIORITY_PUBLIC, PRIORITY_TEST, RENDER_COST,
+)
+
+
+def test_waiting_jobs_are_admitted_by_priority_then_arrival():
+    async def run():
+        queue = EncodeQueue(budget=RENDER_COST)
+        running = await queue.acquire(RENDER_COST, PRIORITY_PUBLIC, "running")
+        admitted = []
+
+        async def job(priority, label):
+            async with queue.slot(RENDER_COST, priority, label):
+                admitted.append(label)
+                await asyncio.sleep(0)
+
+        jobs = [
+            asyncio.create_task(job(PRIORITY_TEST, "test")),
+            asyncio.create_task(job(PRIORITY_PRIVATE, "private-1")),
+            asyncio.create_task(job(PRIORITY_PUBLIC, "public")),
+            asyncio.create_task(job(PRIORITY_PRIVATE, "private-2")),
+        ]
+        await asyncio.sleep(0)
+        assert queue.status()["queue_depth"] == 4
+        running.release()
+        await asyncio.gather(*jobs)
+        assert queue.in_use == 0
+        return admitted
+
+    assert asyncio.run(run()) == ["public", "private-1", "private-2", "test"]
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        queue = EncodeQueue(budget=1.0)
+        lease = await queue.acquire(1.0, PRIORITY_PUBLIC, "running")
+        waiter = asyncio.create_task(queue.acquire(1.0, PRIORITY_PUBLIC, "waiting"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        lease.release()
+        return queue.status()
+
+    status = asyncio.run(run())
+    assert status["queue_depth"] == 0 and status["in_use"] == 0
+
+
+def test_burst_of_relay_starts_is_admitted_beyond_the_cpu_budget(hls_dir, monkeypatch):
+    monkeypatch.setattr(encode_queue, "_queue", None)
+    monkeypatch.setattr(encode_queue, "_relay_queue", None)
+    monkeypatch.setattr(encode_queue.settings, "ENCODE_CPU_BUDGET", 0)
+    monkeypatch.setattr(encode_queue.settings, "MAX_RELAYS", 0)
+
+    class Running:
+        pid = 1
+        returncode = None
+
+    async def fake_spawn(room_slot_id, program_path, offset):
+        stream_manager.ACTIVE_STREAMS[room_slot_id] = Running()
+        return stream_manager.ACTIVE_STREAMS[room_slot_id]
+
+    monkeypatch.setattr(stream_manager, "_spawn", fake_spawn)
+    monkeypatch.setattr(stream_manager, "_supervise", lambda *args, **kwargs: None)
+    rooms = [f"burst-{i}" for i in range((os.cpu_count() or 2) * 4 + 10)]
+
+    async def run():
+        # A render in progress takes the whole CPU budget
+        render = await encode_queue.get_encode_queue().acquire(
+            encode_queue.get_encode_queue().budget, PRIORITY_PUBLIC, "render",
+        )
+        procs = await asyncio.wait_for(
+            asyncio.gather(*(stream_manager.start_stream(r, "/programs/p/program.m3u8") for r in rooms)), 2,
+        )
+        render.release()
+        return procs
+
+    try:
+        procs = asyncio.run(run())
+        assert all(procs)
+        assert encode_queue.get_relay_queue().status()["in_use"] == len(rooms)
+        assert encode_queue.get_relay_queue().status()["queue_depth"] == 0
+    finally:
+        for room in rooms:
+            stream_manager.ACTIVE_STREAMS.pop(room, None)
+            stream_manager.RELAY_LEASES.pop(room, None)
@@ -0,0 +1,151 @@
+"""Redis lease leader election: one leader, and a stuck leader steps down in time."""
+import asyncio
+import time
+import pytest
+from services import leader
+from services.leader import LeaderElection
+
+
+class FakeRedis:
+    """SET NX PX, GET and the lease scripts, with TTLs on the monotonic clock."""
+
+    def __init__(self):
+        self.values: dict[str, tuple[str, float]] = {}
+        self.hang = False
+        self.fail_next = 0
+
+    def _get(self, key):
+        value, expires = self.values.get(key, (None, 0.0))
+        return value if time.monotonic() < expires else None
+
+    async def _maybe_hang(self):
+        if self.fail_next:
+            self.fail_next -= 1
+            raise ConnectionError("connection reset")
+        if self.hang:
+            await asyncio.sleep(3600)
+
+    async def set(self, key, value, nx=False, px=None):
+        await self._maybe_hang()
+        if nx and self._get(key) is not None:
+            return None
+        self.values[key] = (value, time.monotonic() + px / 1000)
+        return True
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def eval(self, script, numkeys, key, value, *args):
+        await self._maybe_hang()
+        if self._get(key) != value:
+            return 0
+        if script == leader._RENEW_SCRIPT:
+            self.values[key] = (value, time.monotonic() + int(args[0]) / 1000)
+        else:
+            del self.values[key]
+        return 1
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+
+    async def get_redis():
+        return fake
+
+    monkeypatch.setattr(leader, "get_redis", get_redis)
+    # The production timings, ten times faster
+    monkeypatch.setattr(leader, "LEASE_TTL", 1.5)
+    monkeypatch.setattr(leader, "RENEW_INTERVAL", 0.5)
+    monkeypatch.setattr(leader, "FOLLOWER_POLL", 0.05)
+    monkeypatch.setattr(leader, "SAFETY_MARGIN", 0.2)
+    return fake
+
+
+class Node:
+    def __init__(self, name, events, elected_hook=None):
+        self.name = name
+        self.events = events
+
+        async def on_elected():
+            events.append((time.monotonic(), self.name, "elected"))
+            if elected_hook:
+                await elected_hook()
+
+        async def on_demoted():
+            events.append((time.monotonic(), self.name, "demoted"))
+
+        self.election = LeaderElection("test", on_elected, on_demoted)
+
+
+def test_only_one_node_leads_and_a_clean_release_hands_over(redis):
+    events = []
+    a, b = Node("a", events), Node("b", events)
+
+    async def run():
+        tasks = [asyncio.create_task(n.election.run()) for n in (a, b)]
+        await asyncio.sleep(0.3)
+        leaders = [n for n in (a, b) if n.election.is_leader]
+        assert len(leaders) == 1
+        first = leaders[0]
+        other = b if first is a else a
+        tasks[(a, b).index(first)].cancel()
+        await first.election.release()
+        await asyncio.sleep(0.2)
+        assert other.election.is_leader and not first.election.is_leader
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_hung_redis_demotes_the_leader_before_its_lease_expires(redis):
+    events = []
+    node = Node("a", events)
+
+    async def run():
+        task = asyncio.create_task(node.election.run())
+        while not node.election.is_leader:
+            await asyncio.sleep(0.005)
+        # One renew fails outright, the next one hangs
+        redis.fail_next = 1
+        redis.hang = True
+        _, expires = redis.values[node.election.key]
+        while node.election.is_leader:
+            await asyncio.sleep(0.005)
+        demoted_at = time.monotonic()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return demoted_at, expires
+
+    demoted_at, expires = asyncio.run(run())
+    # Stepped down with the safety margin to spare, not at expiry
+    assert demoted_at <= expires - leader.SAFETY_MARGIN / 2
+    assert [e[2] for e in events] == ["elected", "demoted"]
+
+
+def test_slow_elected_hook_does_not_hold_up_renewals(redis):
+    events = []
+    cancelled = []
+
+    async def slow_start():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    node = Node("a", events, elected_hook=slow_start)
+
+    async def run():
+        task = asyncio.create_task(node.election.run())
+        await asyncio.sleep(2.0)          # well past LEASE_TTL
+        still_leader = node.election.is_leader
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await node.election.release()
+        return still_leader
+
+    assert asyncio.run(run())
+    assert cancelled == [True]
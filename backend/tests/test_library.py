@@ -0,0 +1,77 @@
+"""In-memory audio library manifest."""
+import os
+import pytest
+from services.audio import library
+from services.audio.library import MANIFEST_FILENAME, AudioLibrary
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+    return path
+
+
+@pytest.fixture
+def scans(monkeypatch):
+    """Directories listed by the library."""
+    listed = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        listed.append(os.fspath(path))
+        return scandir(path)
+
+    monkeypatch.setattr(library.os, "scandir", counting_scandir)
+    return listed
+
+
+def test_answers_from_the_listing(audio_dir, scans):
+    ayah = _touch(audio_dir / "Alafasy_128kbps" / "001" / "001.mp3")
+    clip = _touch(audio_dir / "misc" / "Takbeer.mp3")
+    _touch(audio_dir / "Alafasy_128kbps" / ".durations.idx")
+
+    lib = AudioLibrary(audio_dir)
+    assert lib.exists(ayah) and lib.exists(clip)
+    assert len(lib) == 2                        # hidden files are not listed
+    listed = len(scans)
+
+    assert not lib.exists(audio_dir / "misc" / "Salam.mp3")
+    assert lib.exists(ayah)
+    assert len(scans) == listed                 # no re-listing per query
+    assert (audio_dir / MANIFEST_FILENAME).exists()
+
+
+def test_reload_relists_only_changed_directories(audio_dir, scans):
+    _touch(audio_dir / "Alafasy_128kbps" / "001" / "001.mp3")
+    _touch(audio_dir / "Alafasy_128kbps" / "002" / "001.mp3")
+    AudioLibrary(audio_dir).ensure_loaded()
+
+    added = _touch(audio_dir / "Alafasy_128kbps" / "002" / "002.mp3")
+    scans.clear()
+    lib = AudioLibrary(audio_dir)
+    lib.ensure_loaded()
+
+    # The root holds the manifest itself, so it always changes
+    assert sorted(scans) == [str(audio_dir), str(audio_dir / "Alafasy_128kbps" / "002")]
+    assert lib.exists(added) and len(lib) == 3
+
+
+def test_miss_is_confirmed_on_disk(audio_dir):
+    lib = AudioLibrary(audio_dir)
+    lib.ensure_loaded()
+    written_elsewhere = _touch(audio_dir / "misc" / "Dua.mp3")
+    assert lib.exists(written_elsewhere)
+    assert len(lib) == 1
+
+
+def test_add_and_discard(audio_dir):
+    path = _touch(audio_dir / "silence" / "Silence_10.mp3")
+    lib = AudioLibrary(audio_dir)
+    lib.ensure_loaded()
+    path.unlink()
+    lib.discard(path)
+    assert not lib.exists(path)
+    lib.add(path)
+    assert lib.exists(path)
+    lib.add(audio_dir.parent / "elsewhere.mp3")     # outside the library: ignored
+    assert len(lib) == 1
@@ -0,0 +1,75 @@
+"""Recipient matching of the coalesced reminder wave (run on SQLite)."""
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from config import get_settings
+from models import RoomSlot, User, UserIshaSchedule
+from services.scheduler import RAKATS_START_DELAY, _reminder_recipients, _wave_query
+
+DEFAULT = get_settings().DEFAULT_RECITER
+NIGHT = 5
+BUCKET = datetime(2026, 3, 1, 19, 0, tzinfo=timezone.utc)
+
+
+def _room(juz_per_night: float, reciter: str, status: str) -> RoomSlot:
+    return RoomSlot(
+        isha_bucket_utc=BUCKET, ramadan_night=NIGHT, rakats=8, juz_per_night=juz_per_night,
+        juz_number=NIGHT, juz_half=None, reciter=reciter, status=status, is_private=False,
+    )
+
+
+def _user(name: str, juz_per_night: float, reciter: str) -> User:
+    user = User(
+        email=f"{name}@example.com", name=name, password_hash="x", rakats=8,
+        juz_per_night=juz_per_night, preferred_reciter=reciter, notify_minutes_before=20, is_active=True,
+    )
+    user.isha_schedule.append(UserIshaSchedule(ramadan_night=NIGHT, isha_utc=BUCKET, isha_bucket_utc=BUCKET))
+    return user
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    tables = [User.__table__, UserIshaSchedule.__table__, RoomSlot.__table__]
+    User.metadata.create_all(engine, tables=tables)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def test_one_bucket_mixed_statuses_and_reciters(db):
+    default_full   = _room(1.0, DEFAULT, "scheduled")
+    husary_full    = _room(1.0, "Husary_128kbps", "building")
+    default_half   = _room(0.5, DEFAULT, "live")
+    husary_half    = _room(0.5, "Husary_128kbps", "completed")
+    users = {
+        "default": _user("default", 1.0, DEFAULT),
+        "husary": _user("husary", 1.0, "Husary_128kbps"),
+        "no_room": _user("no_room", 1.0, "Minshawy_Murattal_128kbps"),
+        "live": _user("live", 0.5, DEFAULT),
+        "finished": _user("finished", 0.5, "Husary_128kbps"),
+    }
+    db.add_all([default_full, husary_full, default_half, husary_half, *users.values()])
+    db.commit()
+
+    wave_at = BUCKET + timedelta(minutes=RAKATS_START_DELAY[8] - 20)
+    pairs = {(slot.id, user.name) for slot, user in db.execute(_wave_query(wave_at)).all()}
+
+    assert pairs == {
+        (default_full.id, "default"),
+        (husary_full.id, "husary"),
+        (default_full.id, "no_room"),   # no room for their reciter — the default one
+    }
+
+
+def test_admin_trigger_reaches_rooms_that_already_started(db):
+    live = _room(0.5, DEFAULT, "live")
+    db.add_all([live, _user("late", 0.5, DEFAULT), _user("other", 1.0, DEFAULT)])
+    db.commit()
+
+    def names(query):
+        return {user.name for _, user in db.execute(query.where(RoomSlot.id == live.id)).all()}
+
+    assert names(_reminder_recipients()) == set()
+    assert names(_reminder_recipients(statuses=None)) == {"late"}
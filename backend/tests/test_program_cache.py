@@ -0,0 +1,119 @@
+"""Program render cache: renders once, publishes atomically, never returns a missing program."""
+import subprocess
+import threading
+from datetime import datetime, timedelta, timezone
+import pytest
+from config import get_settings
+from models import RoomSlot
+from services.audio import program_cache
+from services.audio.program_cache import ProgramKey, render_program
+
+KEY = ProgramKey("Alafasy_128kbps", 3, None, 8, 1.0)
+
+
+@pytest.fixture
+def fake_render(hls_dir, monkeypatch):
+    """Replace the concat build and FFmpeg with a render that writes a playlist."""
+    calls, hooks = [], []
+
+    def build_concat_file(output_dir, *args, **kwargs):
+        concat = output_dir / "concat.txt"
+        concat.write_text("")
+        return concat, False
+
+    def run(cmd, **kwargs):
+        output_dir = next(p for p in program_cache.get_programs_root().iterdir() if ".tmp-" in p.name)
+        (output_dir / program_cache.PROGRAM_MANIFEST).write_text("#EXTM3U\n")
+        calls.append(cmd)
+        for hook in hooks:
+            hook()
+        return subprocess.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr(program_cache, "build_concat_file", build_concat_file)
+    monkeypatch.setattr(program_cache.subprocess, "run", run)
+    return calls, hooks
+
+
+def _slot(bucket_minutes: int, **overrides) -> RoomSlot:
+    fields = dict(
+        isha_bucket_utc=datetime(2026, 3, 1, 17, 0, tzinfo=timezone.utc) + timedelta(minutes=bucket_minutes),
+        ramadan_night=3, rakats=8, juz_per_night=1.0, juz_number=3, juz_half=None,
+        reciter="Alafasy_128kbps", status="scheduled", is_private=False,
+    )
+    return RoomSlot(**{**fields, **overrides})
+
+
+def test_every_bucket_of_a_night_shares_one_program():
+    keys = {ProgramKey.for_slot(_slot(minutes)) for minutes in range(0, 24 * 60, 15)}
+    assert keys == {KEY}
+    assert ProgramKey.for_slot(_slot(0, juz_per_night=1)).digest == KEY.digest
+
+    others = [
+        _slot(0, rakats=20), _slot(0, reciter="Husary_128kbps"),
+        _slot(0, juz_number=4), _slot(0, juz_half=1, juz_per_night=0.5),
+    ]
+    digests = {ProgramKey.for_slot(slot).digest for slot in others}
+    assert len(digests) == len(others) and KEY.digest not in digests
+
+
+def test_render_settings_change_the_digest(monkeypatch):
+    before = KEY.digest
+    monkeypatch.setattr(get_settings(), "AUDIO_CODEC", "flac")
+    assert KEY.digest != before
+
+
+def test_program_is_rendered_once_and_reused(fake_render):
+    calls, _ = fake_render
+    first = render_program(KEY)
+    second = render_program(KEY)
+    assert first == second == program_cache.get_program_manifest(KEY)
+    assert first.exists()
+    assert len(calls) == 1
+    assert not [p for p in program_cache.get_programs_root().iterdir() if ".tmp-" in p.name]
+
+
+def test_losing_the_rename_race_returns_the_winners_program(fake_render):
+    _, hooks = fake_render
+    final_dir = program_cache.get_program_dir(KEY)
+
+    def other_worker_finishes():
+        final_dir.mkdir(parents=True)
+        (final_dir / program_cache.PROGRAM_MANIFEST).write_text("#EXTM3U\n")
+
+    hooks.append(other_worker_finishes)
+    assert render_program(KEY) == program_cache.get_program_manifest(KEY)
+
+
+def test_failed_rename_without_a_winner_raises(fake_render):
+    _, hooks = fake_render
+    final_dir = program_cache.get_program_dir(KEY)
+
+    def something_else_in_the_way():
+        final_dir.mkdir(parents=True)
+        (final_dir / "junk").write_text("")
+
+    hooks.append(something_else_in_the_way)
+    with pytest.raises(RuntimeError, match="into place"):
+        render_program(KEY)
+    assert not program_cache.get_program_manifest(KEY).exists()
+    assert not [p for p in program_cache.get_programs_root().iterdir() if ".tmp-" in p.name]
+
+
+def test_concurrent_builds_wait_for_one_render(fake_render):
+    calls, hooks = fake_render
+    started = threading.Event()
+    release = threading.Event()
+    hooks.append(lambda: (started.set(), release.wait(5)))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(render_program(KEY))) for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert results == [program_cache.get_program_manifest(KEY)] * 4
@@ -0,0 +1,76 @@
+"""Splitting a night's ayahs across rakats by count and by duration."""
+import math
+from config import get_settings
+from services.audio.playlist_builder import _rakat_durations
+from utils.juz_data import AyahKey, distribute_ayahs_to_rakats
+
+
+def _surah(surah: int, count: int) -> list[AyahKey]:
+    return [AyahKey(surah, a) for a in range(1, count + 1)]
+
+
+def _sizes(rakats: list[list[AyahKey]]) -> list[int]:
+    return [len(r) for r in rakats]
+
+
+def test_count_split_is_the_default():
+    assert get_settings().RAKAT_SPLIT_MODE == "count"
+    assert _rakat_durations(_surah(2, 10), "Any_Reciter") is None
+    assert _sizes(distribute_ayahs_to_rakats(_surah(2, 10), 4)) == [3, 3, 2, 2]
+
+
+def test_cuts_balance_recitation_time():
+    # Eight long ayahs then twenty short ones: 60 s either side of ayah 6
+    ayahs = _surah(2, 28)
+    durations = [10.0] * 8 + [2.0] * 20
+
+    rakats = distribute_ayahs_to_rakats(ayahs, 2, durations=durations)
+
+    assert _sizes(rakats) == [6, 22]
+    assert [r[0] for r in rakats] == [AyahKey(2, 1), AyahKey(2, 7)]
+
+
+def test_cut_goes_to_the_nearer_ayah_boundary():
+    ayahs = _surah(2, 4)
+    # Share is 13 s: the boundary after ayah 2 (12 s) is nearer than after 3 (20 s)
+    assert _sizes(distribute_ayahs_to_rakats(ayahs, 2, durations=[6.0, 6.0, 8.0, 6.0])) == [2, 2]
+    # Share is 15 s: after ayah 3 (16 s) is nearer than after 2 (8 s)
+    assert _sizes(distribute_ayahs_to_rakats(ayahs, 2, durations=[4.0, 4.0, 8.0, 14.0])) == [3, 1]
+
+
+def test_cut_snaps_to_a_surah_end_within_tolerance():
+    # 9 + 11 ayahs of 5 s: the share is 50 s, the surah ends at 45 s
+    ayahs = _surah(78, 9) + _surah(79, 11)
+    durations = [5.0] * 20
+
+    exact = distribute_ayahs_to_rakats(ayahs, 2, durations=durations)
+    snapped = distribute_ayahs_to_rakats(ayahs, 2, durations=durations, tolerance=0.15)
+    too_far = distribute_ayahs_to_rakats(ayahs, 2, durations=durations, tolerance=0.05)
+
+    assert _sizes(exact) == [10, 10]
+    assert _sizes(snapped) == [9, 11] and snapped[1][0] == AyahKey(79, 1)
+    assert _sizes(too_far) == [10, 10]
+
+
+def test_snap_picks_the_nearest_surah_end():
+    # Surah ends at 30 s and 55 s; the share is 50 s
+    ayahs = _surah(80, 6) + _surah(81, 5) + _surah(82, 9)
+    durations = [5.0] * 20
+    rakats = distribute_ayahs_to_rakats(ayahs, 2, durations=durations, tolerance=0.5)
+    assert _sizes(rakats) == [11, 9] and rakats[1][0] == AyahKey(82, 1)
+
+
+def test_every_rakat_keeps_an_ayah():
+    ayahs = _surah(2, 4)
+    rakats = distribute_ayahs_to_rakats(ayahs, 4, durations=[100.0, 1.0, 1.0, 1.0])
+    assert _sizes(rakats) == [1, 1, 1, 1]
+
+
+def test_missing_durations():
+    ayahs = _surah(2, 6)
+    # A missing file counts as 0 s
+    partial = distribute_ayahs_to_rakats(ayahs, 2, durations=[math.nan, 6.0, 6.0, math.nan, 1.0, 11.0])
+    assert _sizes(partial) == [3, 3]
+    # Nothing indexed: split by count
+    unknown = distribute_ayahs_to_rakats(ayahs, 4, durations=[math.nan] * 6)
+    assert _sizes(unknown) == [2, 2, 1, 1]
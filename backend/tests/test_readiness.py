@@ -0,0 +1,118 @@
+"""Waiting for a starting relay's first segment without polling each room."""
+import asyncio
+import time
+import pytest
+from config import get_settings
+from services.audio import stream_manager
+from services.audio.renditions import RENDITIONS
+from services.audio.segment_store import get_segment_store
+
+MASTER = "#EXTM3U\n" + "#EXT-X-STREAM-INF:BANDWIDTH=140000\nstream_128k.m3u8\n" * 2
+MEDIA = "#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXTINF:2.0,\nstream_128k0.ts\n"
+TOP = f"stream_{RENDITIONS[0].name}.m3u8"
+
+
+def _publish(room: str) -> None:
+    room_dir = stream_manager.get_stream_dir(room)
+    room_dir.mkdir(exist_ok=True)
+    (room_dir / TOP).write_text(MEDIA)
+    (room_dir / "stream.m3u8").write_text(MASTER)
+
+
+async def _publish_later(room: str, delay: float) -> None:
+    await asyncio.sleep(delay)
+    _publish(room)
+
+
+@pytest.fixture(autouse=True)
+def no_waiters():
+    yield
+    assert not stream_manager._ready_waiters
+    assert stream_manager._ready_task is None
+
+
+def test_waiters_are_answered_when_the_first_segment_lands(hls_dir):
+    async def run():
+        later = [asyncio.create_task(_publish_later(room, 0.3)) for room in ("a", "b")]
+        started = time.monotonic()
+        ready = await asyncio.gather(
+            stream_manager.wait_until_ready("a", 5), stream_manager.wait_until_ready("a", 5),
+            stream_manager.wait_until_ready("b", 5),
+        )
+        await asyncio.gather(*later)
+        await asyncio.sleep(0)      # let the watcher exit
+        return ready, time.monotonic() - started
+
+    ready, took = asyncio.run(run())
+    assert ready == [True, True, True]
+    assert took < 2
+
+
+def test_already_published_room_is_ready_at_once(hls_dir):
+    _publish("c")
+    assert asyncio.run(stream_manager.wait_until_ready("c", 0.01))
+
+
+def test_timeout_answers_false_and_forgets_the_waiter(hls_dir):
+    async def run():
+        ready = await stream_manager.wait_until_ready("never", 0.2)
+        if stream_manager._ready_task:
+            await stream_manager._ready_task
+        return ready
+
+    assert asyncio.run(run()) is False
+
+
+def test_broken_watch_falls_back_to_polling(hls_dir, monkeypatch):
+    watchfiles = pytest.importorskip("watchfiles")
+
+    async def broken_awatch(*args, **kwargs):
+        raise OSError("inotify watch limit reached")
+        yield
+
+    monkeypatch.setattr(watchfiles, "awatch", broken_awatch)
+
+    async def run():
+        later = asyncio.create_task(_publish_later("d", 0.2))
+        ready = await stream_manager.wait_until_ready("d", 5)
+        await later
+        return ready
+
+    assert asyncio.run(run())
+
+
+def test_failed_watcher_answers_every_waiter(hls_dir, monkeypatch):
+    def broken(rooms):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(stream_manager, "_resolve_ready", broken)
+
+    async def run():
+        started = time.monotonic()
+        ready = await asyncio.gather(stream_manager.wait_until_ready("e", 30), stream_manager.wait_until_ready("f", 30))
+        return ready, time.monotonic() - started
+
+    ready, took = asyncio.run(run())
+    assert ready == [False, False] and took < 1
+
+
+def test_memory_ingest_wakes_waiters(hls_dir, monkeypatch):
+    monkeypatch.setattr(get_settings(), "HLS_INGEST", "memory")
+    store = get_segment_store()
+
+    async def ingest():
+        await asyncio.sleep(0.2)
+        store.put("g", TOP, MEDIA.encode())
+        store.put("g", "stream.m3u8", MASTER.encode())
+        stream_manager.notify_ingest("g")
+
+    async def run():
+        task = asyncio.create_task(ingest())
+        ready = await stream_manager.wait_until_ready("g", 5)
+        await task
+        return ready
+
+    try:
+        assert asyncio.run(run())
+    finally:
+        store.drop("g")
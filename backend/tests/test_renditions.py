@@ -0,0 +1,56 @@
+"""Adaptive-bitrate ladder: master playlist and aligned renditions."""
+import shutil
+import subprocess
+import pytest
+from services.audio import program_cache
+from services.audio.renditions import (
+    AAC_CODECS, RENDITIONS, hls_ladder_args, media_playlist_path, render_master_playlist,
+)
+from services.audio.virtual_stream import load_program_playlist
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+
+
+def test_master_playlist_lists_every_rendition_highest_first():
+    lines = render_master_playlist("stream").splitlines()
+    assert lines[:2] == ["#EXTM3U", "#EXT-X-VERSION:3"]
+    variants = list(zip(lines[2::2], lines[3::2]))
+    assert variants == [
+        (f'#EXT-X-STREAM-INF:BANDWIDTH={r.bandwidth},CODECS="{AAC_CODECS}"', f"stream_{r.name}.m3u8")
+        for r in RENDITIONS
+    ]
+    bandwidths = [r.bandwidth for r in RENDITIONS]
+    assert bandwidths == sorted(bandwidths, reverse=True)
+
+
+def test_ladder_args_name_one_stream_per_rendition():
+    args = hls_ladder_args("http://ingest/room/", "stream", "stream.m3u8")
+    assert args[args.index("-var_stream_map") + 1] == " ".join(
+        f"a:{i},name:{r.name}" for i, r in enumerate(RENDITIONS)
+    )
+    assert args[-1] == "http://ingest/room/stream_%v.m3u8"
+    assert media_playlist_path("/p/program.m3u8", "64k").as_posix() == "/p/program_64k.m3u8"
+
+
+@needs_ffmpeg
+def test_rendered_ladder_has_aligned_segments(tmp_path):
+    source = tmp_path / "tone.wav"
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", "sine=f=441:d=20:r=44100", str(source),
+    ], check=True)
+    concat = tmp_path / "concat.txt"
+    concat.write_text(f"file '{source}'\n")
+    out = tmp_path / "out"
+    out.mkdir()
+
+    subprocess.run(program_cache._render_cmd(concat, out), check=True, stderr=subprocess.DEVNULL)
+
+    master = (out / program_cache.PROGRAM_MANIFEST).read_text()
+    assert master.count("#EXT-X-STREAM-INF") == len(RENDITIONS)
+    playlists = [load_program_playlist(str(media_playlist_path(out / "program.m3u8", r.name))) for r in RENDITIONS]
+    # One encode pass: every rendition is cut at the same points
+    assert len({p.starts for p in playlists}) == 1
+    assert playlists[0].total_duration == pytest.approx(20, abs=0.1)
+    for r, p in zip(RENDITIONS, playlists):
+        assert all((out / uri).is_file() for uri in p.segment_uris)
+        assert all(uri.startswith(f"seg_{r.name}_") for uri in p.segment_uris)
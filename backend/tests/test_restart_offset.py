@@ -0,0 +1,79 @@
+"""Live rooms restarted after a backend restart resume at their position."""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from services import scheduler
+from services.audio import stream_manager
+from ws import events
+
+
+class FakeSession:
+    def __init__(self, slot):
+        self.slot = slot
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, model, room_id):
+        return self.slot
+
+
+@pytest.fixture
+def live_room(hls_dir, monkeypatch):
+    """A room live for 600 s of a 1800 s program; returns (slot, relay starts)."""
+    slot = SimpleNamespace(
+        id=uuid.uuid4(), status="live", stream_path=str(hls_dir / "programs" / "abc" / "program.m3u8"),
+        started_at=datetime.now(timezone.utc) - timedelta(seconds=600),
+        reciter="Alafasy_128kbps", juz_number=1, juz_half=None, rakats=8, juz_per_night=1.0,
+        ramadan_night=3, is_private=False,
+    )
+    starts = []
+
+    async def start_room_stream(room_slot_id, program_path, offset=0.0, priority=0):
+        starts.append((room_slot_id, program_path, offset))
+        return {"started": True, "ready": True}
+
+    async def program_duration(key):
+        return 1800.0
+
+    async def emit(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(scheduler, "AsyncSessionLocal", lambda: FakeSession(slot))
+    monkeypatch.setattr(scheduler, "start_room_stream", start_room_stream)
+    monkeypatch.setattr(scheduler, "program_duration", program_duration)
+    monkeypatch.setattr(events.sio, "emit", emit)
+    return slot, starts
+
+
+def test_restart_resumes_at_the_current_position(live_room):
+    slot, starts = live_room
+    asyncio.run(scheduler._restart_live_room(str(slot.id)))
+    [(room_slot_id, program_path, offset)] = starts
+    assert (room_slot_id, program_path) == (str(slot.id), slot.stream_path)
+    assert offset == pytest.approx(600, abs=5)
+
+
+def test_finished_program_is_not_restarted(live_room):
+    slot, starts = live_room
+    slot.started_at -= timedelta(seconds=1200)
+    asyncio.run(scheduler._restart_live_room(str(slot.id)))
+    assert starts == []
+
+
+def test_relay_command_seeks_and_continues_the_playlist(hls_dir):
+    room = str(uuid.uuid4())
+    resumed = stream_manager._relay_cmd(room, "/programs/abc/program.m3u8", 600.0)
+    fresh = stream_manager._relay_cmd(room, "/programs/abc/program.m3u8", 0.0)
+
+    assert resumed[resumed.index("-ss") + 1] == "600.000"
+    assert resumed.index("-ss") < resumed.index("-i")           # input seek
+    assert "append_list" in resumed[resumed.index("-hls_flags") + 1].split("+")
+    assert "discont_start" in resumed[resumed.index("-hls_flags") + 1].split("+")
+    assert "-ss" not in fresh
+    assert "append_list" not in " ".join(fresh)
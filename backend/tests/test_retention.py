@@ -0,0 +1,84 @@
+"""HLS output retention: unfinished renders, room directories, LRU eviction."""
+import os
+import socket
+import time
+import uuid
+from services.audio import program_cache, retention
+
+HOST = socket.gethostname()
+
+
+def _dead_pid() -> int:
+    pid = 2 ** 22 - 1
+    while True:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return pid
+        except PermissionError:
+            pass
+        pid -= 1
+
+
+def _age(path, seconds: float) -> None:
+    then = time.time() - seconds
+    for p in [path, *path.rglob("*")]:
+        os.utime(p, (then, then))
+
+
+def _program(root, name: str, size: int, age: float):
+    program = root / name
+    program.mkdir(parents=True)
+    (program / program_cache.PROGRAM_MANIFEST).write_text("#EXTM3U\n")
+    (program / "seg.ts").write_bytes(b"\0" * size)
+    _age(program, age)
+    return program
+
+
+def test_stale_renders_are_judged_by_their_own_host(hls_dir):
+    programs = hls_dir / "programs"
+    own_alive = programs / f"a.tmp-{HOST}-{os.getpid()}"
+    own_dead = programs / f"b.tmp-{HOST}-{_dead_pid()}"
+    # Another container's pid means nothing here — only its age does
+    other_fresh = programs / f"c.tmp-tarteel-streamer-{os.getpid()}"
+    other_old = programs / f"d.tmp-tarteel-streamer-{os.getpid()}"
+    for d in (own_alive, own_dead, other_fresh, other_old):
+        d.mkdir(parents=True)
+        (d / "render.log").write_text("")
+    _age(other_old, program_cache.STALE_RENDER_AGE + 60)
+
+    assert program_cache.remove_stale_renders() == 2
+    assert own_alive.exists() and other_fresh.exists()
+    assert not own_dead.exists() and not other_old.exists()
+
+
+def test_finished_room_dirs_are_removed_after_idling(hls_dir):
+    finished_old, finished_recent, active = (hls_dir / str(uuid.uuid4()) for _ in range(3))
+    for d in (finished_old, finished_recent, active):
+        d.mkdir()
+        (d / "stream.m3u8").write_text("#EXTM3U\n")
+    _age(finished_old, 3600)
+    _age(active, 3600)
+
+    removed = retention._remove_room_dirs({finished_old.name, finished_recent.name}, max_idle=600)
+    assert removed == 1
+    assert not finished_old.exists()
+    assert finished_recent.exists() and active.exists()
+
+
+def test_eviction_drops_least_recently_used_programs_until_under_budget(hls_dir, tmp_path, monkeypatch):
+    archive = tmp_path / "archive"
+    monkeypatch.setattr(retention.settings, "PROGRAM_ARCHIVE_DIR", str(archive))
+    programs = hls_dir / "programs"
+    oldest = _program(programs, "oldest", 4000, age=300)
+    in_use = _program(programs, "in_use", 4000, age=200)
+    older = _program(programs, "older", 4000, age=100)
+    newest = _program(programs, "newest", 4000, age=0)
+
+    evicted = retention._evict_programs(keep={"in_use"}, budget=9000)
+
+    assert evicted == 2
+    assert not oldest.exists() and not older.exists()
+    assert in_use.exists() and newest.exists()
+    # Evicted renders are archived for a later restore
+    assert (archive / "oldest" / program_cache.PROGRAM_MANIFEST).exists()
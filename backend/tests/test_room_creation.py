@@ -0,0 +1,100 @@
+"""daily_room_creation: one set-based upsert per chunk of rooms."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+from models import RoomSlot
+from services import scheduler
+
+NIGHT = 5
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Answers the bucket query; every upsert "creates" its first row only."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.upserts = []
+        self.committed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt):
+        return FakeResult(self.buckets)
+
+    async def scalars(self, stmt):
+        self.upserts.append(stmt)
+        first = stmt.compile(dialect=postgresql.dialect()).params
+        return FakeResult([SimpleNamespace(id=first["id_m0"], isha_bucket_utc=first["isha_bucket_utc_m0"])])
+
+    async def commit(self):
+        self.committed = True
+
+
+@pytest.fixture
+def create_rooms(monkeypatch):
+    scheduled = []
+
+    async def program_duration(key):
+        return None
+
+    monkeypatch.setattr(scheduler, "_schedule_room_jobs", lambda slot, duration: scheduled.append(slot))
+    monkeypatch.setattr(scheduler, "program_duration", program_duration)
+    monkeypatch.setattr(scheduler.ProgramKey, "for_slot", classmethod(lambda cls, slot: None))
+
+    def run(buckets):
+        session = FakeSession(buckets)
+        monkeypatch.setattr(scheduler, "AsyncSessionLocal", lambda: session)
+        asyncio.run(scheduler.daily_room_creation())
+        return session, scheduled
+
+    return run
+
+
+def test_one_upsert_targets_the_public_identity_index(create_rooms):
+    start = datetime.now(timezone.utc) + timedelta(hours=2)
+    buckets = [(start + timedelta(minutes=15 * i), NIGHT) for i in range(3)] + [(start, None)]
+
+    session, scheduled = create_rooms(buckets)
+
+    [stmt] = session.upserts
+    sql = " ".join(str(stmt.compile(dialect=postgresql.dialect())).split())
+    index = next(i for i in RoomSlot.__table__.indexes if i.name == "uq_room_slots_public_identity")
+    columns = ", ".join(c.name for c in index.columns)
+    predicate = str(index.dialect_options["postgresql"]["where"])
+    assert f"ON CONFLICT ({columns}) WHERE {predicate} DO NOTHING" in sql
+    assert "RETURNING" in sql
+    ddl = " ".join(str(CreateIndex(index).compile(dialect=postgresql.dialect())).split())
+    assert ddl.endswith(f"({columns}) WHERE {predicate}")
+
+    rows = stmt.compile(dialect=postgresql.dialect()).params
+    assert len([k for k in rows if k.startswith("rakats_m")]) == 3 * len(scheduler.ROOM_TYPES)
+    assert session.committed
+    assert len(scheduled) == 1          # jobs only for the rows the upsert returned
+
+
+def test_large_windows_are_inserted_in_chunks(create_rooms, monkeypatch):
+    monkeypatch.setattr(scheduler, "_ROOM_INSERT_CHUNK", 10)
+    start = datetime.now(timezone.utc) + timedelta(hours=2)
+    buckets = [(start + timedelta(minutes=i), NIGHT) for i in range(6)]     # 24 rooms
+
+    session, scheduled = create_rooms(buckets)
+
+    sizes = [len([k for k in s.compile(dialect=postgresql.dialect()).params if k.startswith("rakats_m")])
+             for s in session.upserts]
+    assert sizes == [10, 10, 4]
+    assert len(scheduled) == 3
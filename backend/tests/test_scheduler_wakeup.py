@@ -0,0 +1,145 @@
+"""Shared job store: followers wake the leader's scheduler; only the leader runs jobs."""
+import asyncio
+import pytest
+from apscheduler.jobstores.redis import RedisJobStore
+from apscheduler.schedulers.base import STATE_PAUSED, STATE_RUNNING
+from config import get_settings
+from services import scheduler
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def subscribe(self, channel):
+        self.channel = channel
+
+    async def listen(self):
+        yield {"type": "subscribe", "data": 1}
+        for message in self.redis.published:
+            yield {"type": "message", "data": message}
+        await asyncio.Event().wait()
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.published = []
+        self.values = {}
+
+    async def publish(self, channel, message):
+        assert channel == scheduler.SCHEDULER_WAKEUP_CHANNEL
+        self.published.append(message)
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value):
+        self.values[key] = value
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FakeScheduler:
+    def __init__(self, state=STATE_PAUSED):
+        self.state = state
+        self.wakeups = 0
+
+    def wakeup(self):
+        self.wakeups += 1
+
+    def pause(self):
+        self.state = STATE_PAUSED
+
+    def resume(self):
+        self.state = STATE_RUNNING
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+
+    async def get_redis():
+        return fake
+
+    monkeypatch.setattr(scheduler, "get_redis", get_redis)
+    monkeypatch.setattr(scheduler, "_nudge_task", None)
+    return fake
+
+
+def test_follower_sends_one_nudge_per_burst(redis, monkeypatch):
+    monkeypatch.setattr(scheduler, "_is_leader", False)
+
+    async def run():
+        for _ in range(5):
+            scheduler._on_job_stored(None)
+        await scheduler._nudge_task
+        scheduler._on_job_stored(None)
+        await scheduler._nudge_task
+
+    asyncio.run(run())
+    assert redis.published == ["1", "1"]
+
+
+def test_leader_does_not_nudge_itself(redis, monkeypatch):
+    monkeypatch.setattr(scheduler, "_is_leader", True)
+
+    async def run():
+        scheduler._on_job_stored(None)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert redis.published == [] and scheduler._nudge_task is None
+
+
+@pytest.mark.parametrize("leader, state, wakeups", [
+    (True, STATE_RUNNING, 2), (False, STATE_PAUSED, 0), (True, STATE_PAUSED, 0),
+])
+def test_nudges_wake_only_a_running_leader(redis, monkeypatch, leader, state, wakeups):
+    fake = FakeScheduler(state)
+    monkeypatch.setattr(scheduler, "scheduler", fake)
+    monkeypatch.setattr(scheduler, "_is_leader", leader)
+    redis.published = ["1", "1"]
+
+    async def run():
+        listener = asyncio.create_task(scheduler.watch_scheduler_wakeups())
+        await asyncio.sleep(0.05)
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+
+    asyncio.run(run())
+    assert fake.wakeups == wakeups
+
+
+def test_jobs_run_only_on_the_enabled_leader(redis, monkeypatch):
+    fake = FakeScheduler()
+    monkeypatch.setattr(scheduler, "scheduler", fake)
+    monkeypatch.setattr(scheduler, "_add_leader_jobs", lambda: None)
+
+    async def run():
+        await scheduler.become_scheduler_leader()
+        assert fake.state == STATE_RUNNING
+        await scheduler.set_scheduler_enabled(False)
+        assert fake.state == STATE_PAUSED
+        await scheduler.set_scheduler_enabled(True)
+        assert fake.state == STATE_RUNNING
+        await scheduler.step_down_scheduler()
+        assert fake.state == STATE_PAUSED
+
+    try:
+        asyncio.run(run())
+    finally:
+        scheduler._is_leader = False
+
+
+def test_redis_job_store_is_shared_under_fixed_keys(monkeypatch):
+    monkeypatch.setattr(get_settings(), "SCHEDULER_JOBSTORE", "redis")
+    store = scheduler._jobstores()["default"]
+    assert isinstance(store, RedisJobStore)
+    assert (store.jobs_key, store.run_times_key) == ("tarteel:apscheduler.jobs", "tarteel:apscheduler.run_times")
+
+    monkeypatch.setattr(get_settings(), "SCHEDULER_JOBSTORE", "memory")
+    assert scheduler._jobstores() == {}
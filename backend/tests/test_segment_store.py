@@ -0,0 +1,79 @@
+"""In-memory relay output: ingest, ring eviction and serving from the buffer."""
+import uuid
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from config import get_settings
+from api import hls
+from services.audio import segment_store
+from services.audio.segment_store import SegmentStore
+from services.audio.stream_manager import get_ingest_key
+
+ROOM = str(uuid.uuid4())
+PLAYLIST = b"#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXT-X-MEDIA-SEQUENCE:0\n#EXTINF:6.0,\nseg_64k_00000.ts\n"
+
+
+def test_ring_keeps_the_newest_segments_and_latest_playlists():
+    store = SegmentStore(max_segments=3)
+    for i in range(5):
+        store.put("room", f"seg_64k_{i:05d}.ts", bytes([i]) * 10)
+    store.put("room", "stream_64k.m3u8", b"old")
+    store.put("room", "stream_64k.m3u8", b"new")
+
+    assert [store.get("room", f"seg_64k_{i:05d}.ts") for i in range(5)] == [None, None, b"\2" * 10, b"\3" * 10, b"\4" * 10]
+    assert store.get("room", "stream_64k.m3u8") == b"new"
+    assert store.status() == {"rooms": 1, "segments": 3, "bytes": 33}
+
+    store.drop("room")
+    assert store.get("room", "stream_64k.m3u8") is None and store.status()["rooms"] == 0
+
+
+@pytest.fixture
+def client(hls_dir, monkeypatch):
+    monkeypatch.setattr(get_settings(), "HLS_INGEST", "memory")
+    monkeypatch.setattr(get_settings(), "STREAM_MODE", "ffmpeg")
+    monkeypatch.setattr(segment_store, "_store", None)
+    notified = []
+    monkeypatch.setattr(hls, "notify_ingest", notified.append)
+    app = FastAPI()
+    app.include_router(hls.router)
+    app.include_router(hls.ingest_router)
+    with TestClient(app) as c:
+        c.notified = notified
+        yield c
+
+
+def _put(client, name: str, body: bytes, key: str | None = None):
+    return client.put(f"/hls-ingest/{ROOM}/{name}", content=body, headers={"X-Ingest-Key": key or get_ingest_key()})
+
+
+def test_relay_output_is_served_from_memory(client):
+    segment = bytes(range(256)) * 1000         # several response chunks
+    assert _put(client, "seg_64k_00000.ts", segment).status_code == 204
+    assert _put(client, "stream_64k.m3u8", PLAYLIST).status_code == 204
+    assert client.notified == [ROOM]
+
+    resp = client.get(f"/hls/{ROOM}/seg_64k_00000.ts")
+    assert resp.status_code == 200 and resp.content == segment
+    assert resp.headers["content-length"] == str(len(segment))
+    assert resp.headers["cache-control"].startswith("public, max-age=")
+
+    playlist = client.get(f"/hls/{ROOM}/stream_64k.m3u8")
+    assert playlist.status_code == 200 and "seg_64k_00000.ts" in playlist.text
+    # FFmpeg's append_list reads its own playlist back verbatim
+    assert client.get(f"/hls-ingest/{ROOM}/stream_64k.m3u8", headers={"X-Ingest-Key": get_ingest_key()}).content == PLAYLIST
+    assert not any(hls.get_stream_dir(ROOM).parent.iterdir())    # nothing on disk
+
+
+def test_ingest_is_authenticated_and_limited_to_hls_files(client):
+    assert _put(client, "seg_64k_00000.ts", b"x", key="wrong").status_code == 403
+    assert _put(client, "evil.sh", b"x").status_code == 400
+    assert client.get(f"/hls/{ROOM}/seg_64k_00000.ts").status_code == 404
+
+
+def test_evicted_segment_is_gone(client):
+    limit = segment_store.get_segment_store().max_segments
+    for i in range(limit + 1):
+        _put(client, f"seg_64k_{i:05d}.ts", b"audio")
+    assert client.get(f"/hls/{ROOM}/seg_64k_00000.ts").status_code == 404
+    assert client.get(f"/hls/{ROOM}/seg_64k_{limit:05d}.ts").status_code == 200
@@ -0,0 +1,135 @@
+"""Stream commands over the Redis queue between api/scheduler and streamer roles."""
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+import pytest
+from services import stream_control
+from services.audio import program_cache
+from services.audio.program_cache import ProgramKey
+
+
+class FakeRedis:
+    """The list and hash commands stream_control uses, in memory."""
+
+    def __init__(self):
+        self.lists = defaultdict(deque)
+        self.hashes = defaultdict(dict)
+
+    async def rpush(self, key, value):
+        self.lists[key].append(value)
+
+    async def blpop(self, keys, timeout=0):
+        deadline = time.monotonic() + timeout
+        while True:
+            for key in keys:
+                if self.lists[key]:
+                    return key, self.lists[key].popleft()
+            if timeout and time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(0.005)
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def hset(self, key, field, value):
+        self.hashes[key][field] = value
+
+    async def hgetall(self, key):
+        return dict(self.hashes[key])
+
+    async def hdel(self, key, field):
+        self.hashes[key].pop(field, None)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+
+    async def get_redis():
+        return fake
+
+    monkeypatch.setattr(stream_control, "get_redis", get_redis)
+    monkeypatch.setattr(stream_control.settings, "ROLE", "api")
+    return fake
+
+
+def _beat(redis, node_id, rooms=()):
+    redis.hashes[stream_control.STREAMERS_KEY][node_id] = json.dumps(
+        {"time": time.time(), "rooms": list(rooms), "encode": {"renders": {}, "relays": {}}}
+    )
+
+
+def test_api_render_call_is_served_by_a_streamer(redis, hls_dir):
+    key = ProgramKey("Alafasy_128kbps", 1, None, 8, 1.0)
+    manifest = program_cache.get_program_manifest(key)
+    manifest.parent.mkdir(parents=True)
+    manifest.write_text("#EXTM3U\n")
+
+    async def run():
+        streamer = asyncio.create_task(stream_control.run_streamer())
+        try:
+            while not redis.hashes[stream_control.STREAMERS_KEY]:
+                await asyncio.sleep(0.005)
+            path = await asyncio.wait_for(stream_control.render_program_for(key), 2)
+            queues = await stream_control.encode_queue_status()
+        finally:
+            streamer.cancel()
+            await asyncio.gather(streamer, return_exceptions=True)
+        return path, queues
+
+    path, queues = asyncio.run(run())
+    assert path == str(manifest)
+    # The api process reports the streamer's queues, not its own empty ones
+    assert set(queues) == {stream_control.NODE_ID}
+    assert set(queues[stream_control.NODE_ID]) == {"renders", "relays"}
+    assert not redis.hashes[stream_control.STREAMERS_KEY]   # deregistered on shutdown
+
+
+def test_streamer_drops_expired_commands_but_still_stops(redis, monkeypatch):
+    executed = []
+
+    async def execute(cmd, args, deadline=None):
+        executed.append(cmd)
+
+    monkeypatch.setattr(stream_control, "_execute", execute)
+
+    async def run():
+        for cmd in ("start", "render", "status", "stop"):
+            await stream_control._handle(redis, json.dumps({
+                "id": cmd, "cmd": cmd, "args": {}, "reply_to": f"reply:{cmd}", "deadline": time.time() - 1,
+            }))
+
+    asyncio.run(run())
+    assert executed == ["stop"]
+    assert [k for k, v in redis.lists.items() if v] == ["reply:stop"]
+
+
+def test_start_that_times_out_sends_a_stop_to_the_owner(redis, monkeypatch):
+    monkeypatch.setattr(stream_control, "START_TIMEOUT", 0.05)
+    monkeypatch.setattr(stream_control, "CALL_TIMEOUT", 0.05)
+    _beat(redis, "streamer-a", rooms=["room-1"])
+
+    async def run():
+        with pytest.raises(TimeoutError):
+            await stream_control.start_room_stream("room-1", "/programs/p/program.m3u8")
+
+    asyncio.run(run())
+    queued = [json.loads(c) for c in redis.lists[stream_control._node_queue("streamer-a")]]
+    assert [c["cmd"] for c in queued] == ["start", "stop"]
+    assert all(c["deadline"] <= time.time() for c in queued)
+
+
+def test_room_commands_go_to_the_streamer_running_the_room(redis, monkeypatch):
+    monkeypatch.setattr(stream_control, "CALL_TIMEOUT", 0.05)
+    _beat(redis, "streamer-a", rooms=["room-a"])
+    _beat(redis, "streamer-b", rooms=["room-b"])
+
+    async def run():
+        with pytest.raises(TimeoutError):
+            await stream_control.room_stream_status("room-b")
+
+    asyncio.run(run())
+    assert len(redis.lists[stream_control._node_queue("streamer-b")]) == 1
+    assert not redis.lists[stream_control._node_queue("streamer-a")]
+    assert not redis.lists[stream_control.SHARED_QUEUE]
@@ -0,0 +1,41 @@
+"""FFmpeg relay supervisor: restarts within budget, then gives up for good."""
+import asyncio
+import time
+from services.audio import stream_manager
+
+ROOM = "room-supervised"
+
+
+class ExitedProcess:
+    pid = 4242
+    returncode = 1
+
+
+def test_gives_up_after_max_restarts_and_never_respawns(hls_dir, monkeypatch):
+    monkeypatch.setattr(stream_manager, "WATCHDOG_INTERVAL", 0.01)
+    spawns = []
+
+    async def fake_spawn(room_slot_id, program_path, offset):
+        spawns.append(offset)
+        stream_manager.ACTIVE_STREAMS[room_slot_id] = ExitedProcess()
+        return stream_manager.ACTIVE_STREAMS[room_slot_id]
+
+    monkeypatch.setattr(stream_manager, "_spawn", fake_spawn)
+
+    async def run():
+        stream_manager.ACTIVE_STREAMS[ROOM] = ExitedProcess()
+        stream_manager._supervise(ROOM, "/programs/p/master.m3u8", time.time())
+        task = stream_manager.SUPERVISED[ROOM].task
+        await asyncio.wait_for(task, 2)
+        # Past the restart window nothing may bring the room back either
+        monkeypatch.setattr(stream_manager, "RESTART_WINDOW", 0.0)
+        await asyncio.sleep(0.1)
+        return task
+
+    try:
+        task = asyncio.run(run())
+    finally:
+        stream_manager.ACTIVE_STREAMS.pop(ROOM, None)
+    assert task.done() and not task.cancelled()
+    assert len(spawns) == stream_manager.MAX_RESTARTS
+    assert ROOM not in stream_manager.SUPERVISED
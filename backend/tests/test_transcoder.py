@@ -0,0 +1,54 @@
+"""Gapless joins of the pre-transcoded FLAC library (needs ffmpeg)."""
+import shutil
+import subprocess
+from array import array
+import pytest
+from services.audio import library, transcoder
+from services.audio.playlist_builder import _write_concat
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+
+RATE = 44100
+
+
+def _tone_mp3(path, seconds: float) -> None:
+    """441 Hz tone as an MP3, with LAME's encoder delay and padding."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=f=441:d={seconds}:r={RATE}",
+        "-ac", "2", "-c:a", "libmp3lame", "-b:a", "128k", str(path),
+    ], check=True)
+
+
+def _decode(*input_args: str) -> array:
+    """Decoded mono 16-bit samples of an FFmpeg input."""
+    result = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", *input_args, "-f", "s16le", "-ac", "1", "-ar", str(RATE), "pipe:1"],
+        check=True, stdout=subprocess.PIPE,
+    )
+    return array("h", result.stdout)
+
+
+def test_two_file_concat_has_no_inserted_gap(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcoder.settings, "AUDIO_DIR", str(tmp_path))
+    monkeypatch.setattr(library, "_library", None)
+    sources = [tmp_path / "misc" / "a.mp3", tmp_path / "misc" / "b.mp3"]
+    for source in sources:
+        _tone_mp3(source, 1.0)
+        assert transcoder.transcode_file(source)
+
+    flacs = [transcoder.get_pcm_path(s) for s in sources]
+    assert [transcoder.flac_duration(f) for f in flacs] == [1.0, 1.0]
+
+    concat = tmp_path / "concat.txt"
+    _write_concat(flacs, concat)
+    samples = _decode("-f", "concat", "-safe", "0", "-i", str(concat))
+
+    # Exactly the two files' samples — no priming or padding between them
+    assert len(samples) == 2 * RATE
+    # ...and no silence at the join: every 2.5 ms window of the tone has signal
+    window = 110
+    join = samples[RATE - 10 * window:RATE + 10 * window]
+    for i in range(0, len(join), window):
+        assert max(abs(s) for s in join[i:i + window]) > 1000
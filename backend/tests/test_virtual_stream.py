@@ -0,0 +1,250 @@
+"""Live playlist rendering over a synthetic program (no FFmpeg)."""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from api import hls
+from config import get_settings
+from services.audio.virtual_stream import SKIP_UNTIL_TARGETS, add_delta_updates, render_live_playlist
+
+STARTED = datetime(2026, 3, 1, 19, 0, tzinfo=timezone.utc)
+RENDITION = "64k"
+
+
+def _uris(playlist: str) -> list[str]:
+    return [line for line in playlist.splitlines() if line and not line.startswith("#")]
+
+
+@pytest.fixture
+def program(tmp_path):
+    """A rendered 30-segment × 6 s TS program; returns its master playlist path."""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:6", "#EXT-X-PLAYLIST-TYPE:VOD"]
+    for i in range(30):
+        lines += ["#EXTINF:6.000000,", f"seg_{RENDITION}_{i:05d}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    (tmp_path / f"program_{RENDITION}.m3u8").write_text("\n".join(lines) + "\n")
+    master = tmp_path / "program.m3u8"
+    master.write_text("#EXTM3U\n")
+    return str(master)
+
+
+def _live(program: str, elapsed: float, **kwargs) -> str:
+    return render_live_playlist(program, STARTED, STARTED + timedelta(seconds=elapsed), "p/", RENDITION, **kwargs)
+
+
+def test_segments_publish_as_the_live_position_reaches_them(program):
+    assert _uris(_live(program, -5)) == []
+    assert _uris(_live(program, 0)) == [f"p/seg_{RENDITION}_00000.ts"]
+    assert _uris(_live(program, 5.9)) == [f"p/seg_{RENDITION}_00000.ts"]
+    assert _uris(_live(program, 6))[-1] == f"p/seg_{RENDITION}_00001.ts"
+    # Ends once the last segment (174 s) is published
+    assert "#EXT-X-ENDLIST" not in _live(program, 173.9)
+    assert "#EXT-X-ENDLIST" in _live(program, 174)
+
+
+def test_live_window_advertises_delta_updates(program, monkeypatch):
+    monkeypatch.setattr(get_settings(), "HLS_WINDOW_SEGMENTS", 10)
+    body = _live(program, 100)
+
+    assert f"#EXT-X-SERVER-CONTROL:CAN-SKIP-UNTIL={SKIP_UNTIL_TARGETS * 6:.1f}" in body
+    assert "#EXT-X-MEDIA-SEQUENCE:7" in body
+    assert _uris(body) == [f"p/seg_{RENDITION}_{i:05d}.ts" for i in range(7, 17)]
+    assert "#EXT-X-SKIP" not in body and "#EXT-X-ENDLIST" not in body
+
+
+def test_skip_replaces_segments_older_than_skip_until(program, monkeypatch):
+    monkeypatch.setattr(get_settings(), "HLS_WINDOW_SEGMENTS", 10)
+    body = _live(program, 100, skip=True)
+
+    # Window ends at 102 s; segments ending before 102 - 36 s are skipped
+    assert "#EXT-X-SKIP:SKIPPED-SEGMENTS=3" in body
+    assert "#EXT-X-VERSION:9" in body
+    assert "#EXT-X-MEDIA-SEQUENCE:7" in body
+    assert _uris(body) == [f"p/seg_{RENDITION}_{i:05d}.ts" for i in range(10, 17)]
+    assert "#EXT-X-PROGRAM-DATE-TIME:2026-03-01T19:01:00.000Z" in body
+
+
+def test_ended_program_is_never_skipped(program):
+    body = _live(program, 10_000, skip=True)
+    assert "#EXT-X-SKIP" not in body and body.rstrip().endswith("#EXT-X-ENDLIST")
+
+
+def test_full_playlist_lists_everything_published(program):
+    body = _live(program, 100, full=True)
+    assert _uris(body) == [f"p/seg_{RENDITION}_{i:05d}.ts" for i in range(17)]
+    assert "CAN-SKIP-UNTIL" not in body
+
+
+# ── Room routes ───────────────────────────────────────────────────────────────
+
+class FakeDB:
+    def __init__(self, slot):
+        self.slot = slot
+        self.gets = 0
+
+    async def get(self, model, room_id):
+        self.gets += 1
+        return self.slot
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def virtual_room(hls_dir, monkeypatch):
+    """A live virtual room 100 s into a program under HLS_OUTPUT_DIR."""
+    monkeypatch.setattr(get_settings(), "STREAM_MODE", "virtual")
+    monkeypatch.setattr(hls, "_live_cache", {})
+    monkeypatch.setattr(hls, "utc_now", lambda: STARTED + timedelta(seconds=100))
+    program_dir = hls_dir / "programs" / "abc123"
+    program_dir.mkdir(parents=True)
+    lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:6"]
+    for i in range(30):
+        lines += ["#EXTINF:6.000000,", f"seg_{RENDITION}_{i:05d}.ts"]
+    (program_dir / f"program_{RENDITION}.m3u8").write_text("\n".join(lines + ["#EXT-X-ENDLIST"]) + "\n")
+    slot = SimpleNamespace(status="live", stream_path=str(program_dir / "program.m3u8"), started_at=STARTED)
+    return uuid.uuid4(), FakeDB(slot)
+
+
+def test_virtual_room_playlists(virtual_room):
+    room_id, db = virtual_room
+
+    master = asyncio.run(hls.room_manifest(room_id, db)).body.decode()
+    assert f"stream_{RENDITION}.m3u8" in master
+
+    body = asyncio.run(hls.room_rendition_manifest(room_id, RENDITION, None, None, None, db)).body.decode()
+    assert _uris(body)[-1] == f"../programs/abc123/seg_{RENDITION}_00016.ts"
+    assert db.gets == 1         # the live program is cached between polls
+
+
+def test_room_that_is_not_live_is_404(virtual_room):
+    room_id, db = virtual_room
+    db.slot.status = "scheduled"
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(hls.room_rendition_manifest(room_id, RENDITION, None, None, None, db))
+    assert e.value.status_code == 404
+
+
+# ── FFmpeg relay playlists ────────────────────────────────────────────────────
+
+def _relay(discontinuity_at: int | None = None, ended: bool = False) -> str:
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:6", "#EXT-X-MEDIA-SEQUENCE:40"]
+    for i in range(40, 50):
+        if i == discontinuity_at:
+            lines.append("#EXT-X-DISCONTINUITY")
+        lines += ["#EXTINF:6.000000,", f"stream_{RENDITION}{i}.ts"]
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def test_relay_playlist_gets_server_control():
+    body = add_delta_updates(_relay(), skip=False)
+    assert "#EXT-X-SERVER-CONTROL:CAN-SKIP-UNTIL=36.0" in body
+    assert "#EXT-X-MEDIA-SEQUENCE:40" in body
+    assert _uris(body) == [f"stream_{RENDITION}{i}.ts" for i in range(40, 50)]
+
+
+def test_relay_playlist_skip():
+    body = add_delta_updates(_relay(), skip=True)
+    assert "#EXT-X-SKIP:SKIPPED-SEGMENTS=3" in body
+    assert "#EXT-X-VERSION:9" in body
+    assert "#EXT-X-MEDIA-SEQUENCE:40" in body
+    assert _uris(body) == [f"stream_{RENDITION}{i}.ts" for i in range(43, 50)]
+
+
+def test_relay_skip_stops_at_a_discontinuity():
+    body = add_delta_updates(_relay(discontinuity_at=42), skip=True)
+    assert "#EXT-X-SKIP:SKIPPED-SEGMENTS=2" in body
+    assert body.index("#EXT-X-DISCONTINUITY") < body.index(f"stream_{RENDITION}42.ts")
+
+
+def test_finished_relay_playlist_is_not_skipped():
+    body = add_delta_updates(_relay(ended=True), skip=True)
+    assert "#EXT-X-SKIP" not in body and "CAN-SKIP-UNTIL" not in body
+    assert body.rstrip().endswith("#EXT-X-ENDLIST")
+
+
+# ── Low-latency HLS ───────────────────────────────────────────────────────────
+
+PART = 1000     # bytes per 1 s fMP4 part
+
+
+@pytest.fixture
+def ll_program(tmp_path, monkeypatch):
+    """A 40-part × 1 s single-file fMP4 program (10 LL segments of 4 parts)."""
+    monkeypatch.setattr(get_settings(), "HLS_LOW_LATENCY", True)
+    lines = [
+        "#EXTM3U", "#EXT-X-VERSION:7", "#EXT-X-TARGETDURATION:1", "#EXT-X-PLAYLIST-TYPE:VOD",
+        f'#EXT-X-MAP:URI="init_{RENDITION}.mp4",BYTERANGE="800@0"',
+    ]
+    for i in range(40):
+        lines += ["#EXTINF:1.000000,", f"#EXT-X-BYTERANGE:{PART}@{800 + i * PART}", f"media_{RENDITION}.m4s"]
+    lines.append("#EXT-X-ENDLIST")
+    (tmp_path / f"program_{RENDITION}.m3u8").write_text("\n".join(lines) + "\n")
+    master = tmp_path / "program.m3u8"
+    master.write_text("#EXTM3U\n")
+    return str(master)
+
+
+def test_ll_playlist_parts_and_preload_hint(ll_program):
+    body = _live(ll_program, 10.5)
+    lines = body.splitlines()
+
+    assert "#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK=3.000,CAN-SKIP-UNTIL=24.0" in lines
+    assert "#EXT-X-PART-INF:PART-TARGET=1.000" in lines
+    assert f'#EXT-X-MAP:URI="p/init_{RENDITION}.mp4",BYTERANGE="800@0"' in lines
+    # Two complete segments, each the byte range over its four parts
+    assert [line for line in lines if line.startswith("#EXT-X-BYTERANGE")] == [
+        f"#EXT-X-BYTERANGE:{4 * PART}@800", f"#EXT-X-BYTERANGE:{4 * PART}@{800 + 4 * PART}",
+    ]
+    parts = [line for line in lines if line.startswith("#EXT-X-PART:")]
+    assert len(parts) == 11             # 8 of the complete segments + 3 in progress
+    assert parts[-1] == (
+        f'#EXT-X-PART:DURATION=1.000000,URI="p/media_{RENDITION}.m4s",'
+        f'BYTERANGE="{PART}@{800 + 10 * PART}",INDEPENDENT=YES'
+    )
+    assert lines[-1] == (
+        f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="p/media_{RENDITION}.m4s",'
+        f"BYTERANGE-START={800 + 11 * PART},BYTERANGE-LENGTH={PART}"
+    )
+
+
+def test_ll_playlist_ends_without_parts(ll_program):
+    body = _live(ll_program, 100)
+    assert "#EXT-X-PART:" not in body and "#EXT-X-PRELOAD-HINT" not in body
+    assert body.count("#EXTINF:") == 10 and body.rstrip().endswith("#EXT-X-ENDLIST")
+
+
+@pytest.fixture
+def blocking(ll_program, monkeypatch):
+    """_block_until_published at 10.5 s into the program; returns (block, sleeps)."""
+    sleeps: list[float] = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(hls, "utc_now", lambda: STARTED + timedelta(seconds=10.5))
+    monkeypatch.setattr(hls.asyncio, "sleep", sleep)
+
+    def block(msn: int, part: int | None = None):
+        asyncio.run(hls._block_until_published(ll_program, STARTED, RENDITION, msn, part))
+
+    return block, sleeps
+
+
+def test_blocking_reload_waits_for_the_part(blocking):
+    block, sleeps = blocking
+    block(2, 3)         # part 11 starts at 11 s
+    block(3)            # segment 3 is complete once its last part starts at 15 s
+    block(1)            # already published
+    assert sleeps == [pytest.approx(0.5), pytest.approx(4.5)]
+
+
+def test_blocking_reload_too_far_ahead_is_400(blocking):
+    block, sleeps = blocking
+    with pytest.raises(HTTPException) as e:
+        block(4)        # last complete segment is 1; at most 1 + 2 may block
+    assert e.value.status_code == 400 and sleeps == []
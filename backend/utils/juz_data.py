@@ -1,4 +1,7 @@
 import json
+import math
+from bisect import bisect_left
+from itertools import accumulate
 from pathlib import Path
 from dataclasses import dataclass
 
@@ -76,6 +79,24 @@ SURAH_AYAH_COUNT = [
 ]
 
 
+# Offset of each surah's first ayah in mushaf order (0-based global ayah index)
+_SURAH_OFFSETS = [0]
+for _count in SURAH_AYAH_COUNT:
+    _SURAH_OFFSETS.append(_SURAH_OFFSETS[-1] + _count)
+
+TOTAL_AYAHS = _SURAH_OFFSETS[-1]  # 6236
+
+
+def ayah_index(ayah: AyahKey) -> int:
+    """0-based position of an ayah in mushaf order (1:1 → 0, 114:6 → 6235)."""
+    return _SURAH_OFFSETS[ayah.surah - 1] + ayah.ayah - 1
+
+
+def all_ayahs() -> list[AyahKey]:
+    """Every ayah of the Quran in mushaf order."""
+    return get_ayahs_in_range(1, 1, 114, SURAH_AYAH_COUNT[-1])
+
+
 def get_ayahs_in_range(start_surah: int, start_ayah: int, end_surah: int, end_ayah: int) -> list[AyahKey]:
     """Return all AyahKey objects from start to end inclusive."""
     ayahs = []
@@ -120,8 +141,24 @@ def get_juz_quarter(juz_num: int, quarter: int) -> list[AyahKey]:
     return all_ayahs[start:end]
 
 
-def distribute_ayahs_to_rakats(ayahs: list[AyahKey], num_rakats: int) -> list[list[AyahKey]]:
-    """Distribute ayahs as evenly as possible across rakats."""
+def distribute_ayahs_to_rakats(
+    ayahs: list[AyahKey],
+    num_rakats: int,
+    durations: list[float] | None = None,
+    tolerance: float = 0.0,
+) -> list[list[AyahKey]]:
+    """
+    Distribute ayahs as evenly as possible across rakats.
+
+    Without durations the split is by ayah count.  With durations (seconds,
+    parallel to ayahs) each rakat gets as close as possible to an equal share
+    of recitation time.  tolerance is a fraction of one rakat's share: a cut
+    that can move to a surah boundary within that distance does so, so rakats
+    prefer to end where a surah ends.
+    """
+    if durations is not None:
+        return _distribute_by_duration(ayahs, num_rakats, durations, tolerance)
+
     total = len(ayahs)
     base_size = total // num_rakats
     remainder = total % num_rakats
@@ -132,3 +169,40 @@ def distribute_ayahs_to_rakats(ayahs: list[AyahKey], num_rakats: int) -> list[li
         result.append(ayahs[idx:idx + size])
         idx += size
     return result
+
+
+def _distribute_by_duration(
+    ayahs: list[AyahKey],
+    num_rakats: int,
+    durations: list[float],
+    tolerance: float,
+) -> list[list[AyahKey]]:
+    # prefix[i] = recitation time before ayah i; missing files count as 0s
+    prefix = [0.0, *accumulate(0.0 if math.isnan(d) else d for d in durations)]
+    total = prefix[-1]
+    n = len(ayahs)
+    if total <= 0 or n < num_rakats:
+        return distribute_ayahs_to_rakats(ayahs, num_rakats)
+
+    share = total / num_rakats
+    # Cut positions that end a surah (the next ayah starts a new one)
+    surah_ends = [i for i in range(1, n) if ayahs[i].surah != ayahs[i - 1].surah]
+
+    cuts = [0]
+    for k in range(1, num_rakats):
+        target = k * share
+        i = bisect_left(prefix, target)
+        if i > 0 and (i > n or target - prefix[i - 1] < prefix[i] - target):
+            i -= 1
+        if tolerance > 0 and surah_ends:
+            j = bisect_left(surah_ends, i)
+            nearby = [surah_ends[x] for x in (j - 1, j) if 0 <= x < len(surah_ends)]
+            best = min(nearby, key=lambda c: abs(prefix[c] - target))
+            if abs(prefix[best] - target) <= tolerance * share:
+                i = best
+        # Keep at least one ayah per rakat on both sides of the cut
+        i = max(i, cuts[-1] + 1)
+        i = min(i, n - (num_rakats - k))
+        cuts.append(i)
+    cuts.append(n)
+    return [ayahs[cuts[k]:cuts[k + 1]] for k in range(num_rakats)]
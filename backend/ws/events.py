@@ -10,13 +10,17 @@ from utils.time_utils import utc_now
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Emits go through Redis pub/sub, so room_started/room_ended from a
+# scheduler-only process reach clients connected to any API process
 sio = socketio.AsyncServer(
     async_mode="asgi",
     cors_allowed_origins="*",
     logger=False,
     engineio_logger=False,
+    client_manager=socketio.AsyncRedisManager(settings.REDIS_URL, write_only="api" not in settings.roles),
 )
 
+# Per-process: a socket's session lives on the API process it connected to
 # Maps session_id → (user_id, room_slot_id)
 _sessions: dict[str, tuple[str, str]] = {}
 # Maps session_id → user_id (populated at connect time)
@@ -1,7 +1,7 @@
 "use client";
 import { useEffect, useState, useCallback } from "react";
 import Link from "next/link";
-import { roomsApi, privateRoomsApi, friendsApi, RoomSlot, Friend } from "@/lib/api";
+import { roomsApi, privateRoomsApi, friendsApi, RoomSlot, RoomTimeline, Friend } from "@/lib/api";
 import { getSocket } from "@/lib/socket";
 import { useAuthStore } from "@/lib/auth";
 import AudioPlayer from "@/components/AudioPlayer";
@@ -147,6 +147,7 @@ export default function RoomPage({ params }: { params: { id: string } }) {
   const [inviteBusy, setInviteBusy]         = useState<Record<string, boolean>>({});
   const [inviteDone, setInviteDone]         = useState<Record<string, boolean>>({});
   const [breakCountdown, setBreakCountdown] = useState<number | null>(null);
+  const [timeline, setTimeline]             = useState<RoomTimeline | null>(null);
 
   const isCreator = !!(room?.is_private && user && room.creator_id === user.id);
 
@@ -208,6 +209,13 @@ export default function RoomPage({ params }: { params: { id: string } }) {
     };
   }, [params.id, user]);
 
+  // Fetch the rakah cue sheet once live — progress is then derived locally
+  // from the playback position instead of waiting for server pushes.
+  useEffect(() => {
+    if (status !== "live" || timeline) return;
+    roomsApi.getTimeline(params.id).then((res) => setTimeline(res.data)).catch(() => {});
+  }, [status, timeline, params.id]);
+
   // Load friends once we know this is a private room and the user is the creator
   useEffect(() => {
     if (isCreator) loadFriends();
@@ -450,9 +458,24 @@ export default function RoomPage({ params }: { params: { id: string } }) {
             <div className="glass-card p-6 mosque-glow text-center">
               <AudioPlayer
                 streamUrl={streamUrl}
-                onProgress={(pct, current, total) => {
+                onProgress={(pct, current, total, playingAt) => {
                   setProgress({ pct, current, total });
                   if (!room) return;
+                  if (timeline) {
+                    // Cue offsets count from started_at, not from the first
+                    // segment this player happened to load
+                    const startedAt = timeline.started_at ?? room.started_at;
+                    const position = startedAt
+                      ? Math.max((playingAt.getTime() - new Date(startedAt).getTime()) / 1000, 0)
+                      : current;
+                    const passed = timeline.cues.filter(c => c.offset <= position);
+                    const lastRakah = [...passed].reverse().find(c => c.kind === "rakah");
+                    if (lastRakah) setRakah({ current: lastRakah.rakah, total: timeline.rakats });
+                    const last = passed[passed.length - 1];
+                    const breakEnd = last?.kind === "inter_prayer_break" ? last.offset + INTER_PRAYER_BREAK : 0;
+                    setBreakCountdown(position < breakEnd ? Math.ceil(breakEnd - position) : null);
+                    return;
+                  }
                   const breaks = computePrayerBreaks(total, room.rakats);
                   const active = breaks.find(b => current >= b.start && current < b.end);
                   setBreakCountdown(active ? Math.ceil(active.end - current) : null);
@@ -472,7 +495,7 @@ export default function RoomPage({ params }: { params: { id: string } }) {
               )}
             </div>
 
-            {/* Rakat dots (from WebSocket, shown alongside time-based progress when available) */}
+            {/* Rakat dots (from the room timeline, shown alongside time-based progress) */}
             {rakah && <RakahIndicator current={rakah.current} total={rakah.total} />}
           </div>
         )}
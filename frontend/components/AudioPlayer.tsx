@@ -3,7 +3,8 @@ import { useEffect, useRef, useState, useCallback } from "react";
 
 interface Props {
   streamUrl: string;
-  onProgress?: (pct: number, current: number, total: number) => void;
+  // playingAt: wall-clock time of the audio being heard (see playingAt below)
+  onProgress?: (pct: number, current: number, total: number, playingAt: Date) => void;
 }
 
 const BAR_HEIGHTS = [28, 44, 60, 44, 36, 52, 28, 48, 40, 56];
@@ -48,7 +49,7 @@ export default function AudioPlayer({ streamUrl, onProgress }: Props) {
         if (hlsRef.current) (hlsRef.current as InstanceType<typeof Hls>).destroy();
 
         const hls = new Hls({
-          lowLatencyMode: false,
+          lowLatencyMode: true,            // used only when the playlist is LL-HLS (HLS_LOW_LATENCY)
           enableWorker: true,
           // Always start from segment 0 — the prayer recording begins at the
           // start of the playlist, not at the live edge. Without this, hls.js
@@ -115,6 +116,23 @@ export default function AudioPlayer({ streamUrl, onProgress }: Props) {
       }
     };
 
+    // Wall-clock time of the audio being heard.  currentTime counts from the
+    // first segment this player loaded, so it is not a program position for
+    // late joiners or restarted relays.  Prefer EXT-X-PROGRAM-DATE-TIME
+    // (virtual rooms), else the live edge minus the player's latency.
+    const playingAt = (): Date => {
+      const hls = hlsRef.current as { playingDate?: Date | null; latency?: number } | null;
+      if (hls) {
+        if (hls.playingDate) return hls.playingDate;
+        if (hls.latency && isFinite(hls.latency)) return new Date(Date.now() - hls.latency * 1000);
+      } else {
+        // Safari native HLS: getStartDate() is the first segment's PROGRAM-DATE-TIME
+        const start = (audio as HTMLAudioElement & { getStartDate?: () => Date }).getStartDate?.();
+        if (start && !isNaN(start.getTime())) return new Date(start.getTime() + audio.currentTime * 1000);
+      }
+      return new Date();
+    };
+
     // Progress updates — use the ref so the HLS effect doesn't re-run when
     // the parent passes a new inline function on each render.
     const onTimeUpdate = () => {
@@ -122,7 +140,7 @@ export default function AudioPlayer({ streamUrl, onProgress }: Props) {
       const current = audioRef.current.currentTime;
       const total = totalDurationRef.current || audioRef.current.duration;
       if (total > 0 && isFinite(total)) {
-        onProgressRef.current(Math.min((current / total) * 100, 100), current, total);
+        onProgressRef.current(Math.min((current / total) * 100, 100), current, total, playingAt());
       }
     };
 
@@ -84,6 +84,21 @@ export interface TonightRooms {
   registered_users?: Record<string, number>; // e.g. {"8_1.0": 12, "8_0.5": 5}
 }
 
+export interface RoomCue {
+  kind: "rakah" | "ruku" | "sujood" | "tashahhud" | "inter_prayer_break" | "dua";
+  rakah: number;
+  offset: number; // seconds from the start of the program
+}
+
+export interface RoomTimeline {
+  room_id: string;
+  status: string;
+  rakats: number;
+  started_at: string | null;
+  total_duration: number;
+  cues: RoomCue[];
+}
+
 // Auth
 export const authApi = {
   register: (data: Record<string, unknown>) =>
@@ -99,6 +114,7 @@ export const roomsApi = {
   getTonight: () => api.get<TonightRooms>("/rooms/tonight"),
   getRoom: (id: string) => api.get<RoomSlot>(`/rooms/${id}`),
   joinRoom: (id: string) => api.post(`/rooms/${id}/join`),
+  getTimeline: (id: string) => api.get<RoomTimeline>(`/rooms/${id}/timeline`),
 };
 
 export interface UserHistory {
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Build (or incrementally refresh) the per-reciter ayah duration index.
+
+Only files whose size or mtime changed since the last build are re-parsed.
+
+Usage:
+    python scripts/build_duration_index.py                       # default reciter
+    python scripts/build_duration_index.py --reciter Alafasy_128kbps
+    python scripts/build_duration_index.py --force               # re-parse everything
+"""
+import argparse
+import logging
+import math
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+def main() -> None:
+    from config import get_settings
+    from services.audio.duration_index import build_duration_index, get_duration_index
+
+    parser = argparse.ArgumentParser(description="Build the ayah duration index for a reciter")
+    parser.add_argument("--reciter", default=get_settings().DEFAULT_RECITER)
+    parser.add_argument("--force", action="store_true", help="Ignore the existing index and re-parse every file")
+    args = parser.parse_args()
+
+    build_duration_index(args.reciter, force=args.force)
+
+    index = get_duration_index(args.reciter)
+    ayahs = index.durations[:index.n_ayahs]
+    present = [d for d in ayahs if not math.isnan(d)]
+    print(f"Ayahs indexed: {len(present)}/{index.n_ayahs}  ({sum(present) / 3600:.1f} h of recitation)")
+    print(f"Clips indexed: {index.n_clips}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,9 @@ Usage:
     python scripts/download_audio.py --juz 1 2 3           # specific juz
     python scripts/download_audio.py --reciter Alafasy_128kbps
     python scripts/download_audio.py --list-reciters
+    python scripts/download_audio.py --concurrency 16 --rate 12
+    python scripts/download_audio.py --verify                # re-fetch missing/corrupt files only
+    python scripts/download_audio.py --base-url http://localhost:8080/data   # local mirror
 """
 import argparse
 import asyncio
@@ -34,6 +37,10 @@ async def main():
     parser.add_argument("--reciter", default="Alafasy_128kbps", choices=AVAILABLE_RECITERS)
     parser.add_argument("--juz", nargs="*", type=int, help="Juz numbers to download (1-30). Default: all.")
     parser.add_argument("--list-reciters", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=None, help="Requests in flight (default: 8)")
+    parser.add_argument("--rate", type=float, default=None, help="Requests per second per host (default: 8)")
+    parser.add_argument("--verify", action="store_true", help="Check files against the checksum manifest and re-fetch bad ones")
+    parser.add_argument("--base-url", default=None, help="Audio mirror base URL (default: EveryAyah)")
     args = parser.parse_args()
 
     if args.list_reciters:
@@ -42,12 +49,26 @@ async def main():
             print(f"  {r}")
         return
 
-    from services.audio.downloader import download_all
+    from services.audio.downloader import (
+        download_all, verify_reciter, DEFAULT_CONCURRENCY, DEFAULT_RATE, EVERYAYAH_BASE,
+    )
 
     juz_list = args.juz or list(range(1, 31))
+    engine = dict(
+        concurrency=args.concurrency or DEFAULT_CONCURRENCY,
+        rate=args.rate or DEFAULT_RATE,
+        base_url=(args.base_url or EVERYAYAH_BASE).rstrip("/"),
+    )
+
+    if args.verify:
+        print(f"Verifying {len(juz_list)} juz for reciter: {args.reciter}")
+        progress = await verify_reciter(args.reciter, juz_list, **engine)
+        print(f"Re-fetched: {progress.summary()}")
+        return
+
     print(f"Downloading {len(juz_list)} juz for reciter: {args.reciter}")
-    print("This will take a while. Press Ctrl+C to stop.")
-    await download_all([args.reciter], juz_list)
+    print("Interrupted downloads resume where they stopped. Press Ctrl+C to stop.")
+    await download_all([args.reciter], juz_list, **engine)
     print("Done!")
 
 
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Fill the program cache for every night of Ramadan ahead of time, so no
+encoding happens in the evening while rooms are streaming.
+
+Every (reciter, night, room type) combination across RAMADAN_TOTAL_NIGHTS is
+rendered into the same content-addressed cache the scheduler uses (see
+program_cache).  Programs already in the cache are skipped, so an
+interrupted run resumes where it stopped when started again; run it from
+cron during the day.
+
+Renders run in a process pool at a lowered CPU priority (nice) so a live
+backend on the same machine keeps precedence.
+
+Usage:
+    python scripts/prerender_programs.py                          # all nights, default reciter
+    python scripts/prerender_programs.py --nights 1 2 3 --workers 2
+    python scripts/prerender_programs.py --reciter Alafasy_128kbps --reciter Maher_AlMuaiqly_128kbps
+    python scripts/prerender_programs.py --nice 19 --dry-run
+"""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+def _init_worker(nice: int) -> None:
+    # FFmpeg children inherit the niceness
+    os.nice(nice)
+
+
+def _render(key):
+    from services.audio.program_cache import render_program
+    return str(render_program(key))
+
+
+def main() -> None:
+    from config import get_settings
+    from services.audio.program_cache import ProgramKey, is_program_rendered, remove_stale_renders
+    from services.scheduler import ROOM_TYPES, _get_juz_for_night
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Pre-render every Ramadan program into the cache")
+    parser.add_argument("--reciter", action="append", help="Reciter to render (repeatable). Default: DEFAULT_RECITER")
+    parser.add_argument("--nights", nargs="*", type=int, help="Ramadan nights to render. Default: all")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Parallel renders (default: half the CPUs)")
+    parser.add_argument("--nice", type=int, default=10, help="Niceness added to render processes (default: 10)")
+    parser.add_argument("--dry-run", action="store_true", help="List the programs that would be rendered")
+    args = parser.parse_args()
+
+    reciters = args.reciter or [settings.DEFAULT_RECITER]
+    nights = args.nights or list(range(1, settings.RAMADAN_TOTAL_NIGHTS + 1))
+
+    keys: dict[str, ProgramKey] = {}
+    for reciter in reciters:
+        for night in nights:
+            for room_type in ROOM_TYPES:
+                juz_number, juz_half = _get_juz_for_night(night, room_type["juz_per_night"])
+                key = ProgramKey(reciter, juz_number, juz_half, room_type["rakats"], room_type["juz_per_night"])
+                keys.setdefault(key.digest, key)
+
+    pending = [k for k in keys.values() if not is_program_rendered(k)]
+    print(f"Programs: {len(keys)} total, {len(keys) - len(pending)} cached, {len(pending)} to render")
+    if args.dry_run:
+        for key in pending:
+            print(f"  {key.digest}  {key}")
+        return
+    if not pending:
+        return
+
+    stale = remove_stale_renders()
+    if stale:
+        print(f"Removed {stale} unfinished renders from an earlier run")
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.nice,)) as pool:
+        futures = {pool.submit(_render, key): key for key in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            try:
+                future.result()
+                print(f"[{done}/{len(pending)}] {key.digest}  {key}")
+            except Exception as e:
+                failed += 1
+                logging.error(f"[{done}/{len(pending)}] {key.digest} failed: {e}")
+
+    if failed:
+        print(f"{failed} programs failed — run again to retry them")
+        sys.exit(1)
+    print("Done! Every program is cached; evening builds will be cache hits.")
+
+
+if __name__ == "__main__":
+    main()
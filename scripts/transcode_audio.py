@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Decode a reciter's ayahs and the misc/silence clips to gapless FLAC so
+program renders join them sample-exactly (set AUDIO_CODEC=flac afterwards).
+
+Only files whose MP3 is newer than the existing FLAC are transcoded.
+
+Usage:
+    python scripts/transcode_audio.py                       # default reciter + clips
+    python scripts/transcode_audio.py --reciter Alafasy_128kbps --workers 4
+    python scripts/transcode_audio.py --force               # transcode everything again
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+
+def main() -> None:
+    from config import get_settings
+    from services.audio.transcoder import transcode_library
+
+    parser = argparse.ArgumentParser(description="Pre-transcode the audio library to gapless FLAC")
+    parser.add_argument("--reciter", default=get_settings().DEFAULT_RECITER)
+    parser.add_argument("--workers", type=int, default=None, help="Parallel FFmpeg processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Transcode files even if the FLAC is up to date")
+    args = parser.parse_args()
+
+    failed = 0
+    for reciter in (None, args.reciter):
+        _, f = transcode_library(reciter, workers=args.workers, force=args.force)
+        failed += f
+
+    if failed:
+        print(f"{failed} files failed — programs will render from MP3 until they are fixed")
+        sys.exit(1)
+    print("Done! Set AUDIO_CODEC=flac to render programs from the gapless library.")
+
+
+if __name__ == "__main__":
+    main()